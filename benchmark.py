@@ -0,0 +1,201 @@
+"""
+Benchmarks the plotting functions and page scripts on synthetic, scaled data.
+
+A scaled copy of results/ is generated with `synthetic_data.py` and used as
+IML_RESULTS_DIR. Each plotting function and each page (through Streamlit's
+AppTest) is timed cold (loader and figure caches cleared) and warm (called again),
+and its peak Python memory is recorded with tracemalloc. Results are written
+as JSON; pass an earlier file with --compare to print the ratios.
+
+Usage:
+    python benchmark.py [--outlets 10] [--crises 10] [--months 30] [--out benchmark.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import synthetic_data
+
+PAGES = ["app.py", "pages/quantitative.py", "pages/qualitative.py"]
+
+
+def _plot_cases():
+    # (name, function, arguments) built from the data loaded at call time
+    from loaders import load_csv, load_records
+    from plots import (ASSOCIATION_CHARTS, FRAMING_CHARTS, SENTIMENT_TITLE, VICTIM_CAUSOR_CHARTS,
+                       plot_associations, plot_coverage, plot_coverage_by_disposition,
+                       plot_coverage_timeseries, plot_crisis_coverage_vs_urgency, plot_framing,
+                       plot_interactive_grouped_coverage_by_country, plot_monthly_crisis_coverage,
+                       plot_outlet_dendrogram, plot_outlet_similarity, plot_sentiment, plot_spider_chart,
+                       plot_urgency_sensitivity, plot_victim_causor)
+    from similarity import outlet_similarity
+
+    def spider():
+        df = load_csv("chart4_spider_chart.csv")
+        return df, df["matched_outlet"].iloc[0], "per_day"
+
+    def per_article(name):
+        return load_records(f"pillar2/{name}_per_article.json")
+
+    cases = [
+        ("plot_coverage", plot_coverage, lambda: (load_csv("chart1_overall_coverage_bar.csv"), "per_day")),
+        ("plot_interactive_grouped_coverage_by_country", plot_interactive_grouped_coverage_by_country,
+         lambda: (load_csv("chart2_coverage_by_country.csv"), "per_day")),
+        ("plot_monthly_crisis_coverage", plot_monthly_crisis_coverage, lambda: (load_csv("chart3_monthly_coverage.csv"),)),
+        ("plot_coverage_timeseries", plot_coverage_timeseries, lambda: (load_csv("chart3_monthly_coverage.csv"),)),
+        ("plot_spider_chart", plot_spider_chart, spider),
+        ("plot_crisis_coverage_vs_urgency", plot_crisis_coverage_vs_urgency,
+         lambda: (load_csv("chart5_attention_vs_urgency.csv"),)),
+        ("plot_urgency_sensitivity", plot_urgency_sensitivity, lambda: (load_csv("chart5_attention_vs_urgency.csv"),)),
+        ("plot_coverage_by_disposition", plot_coverage_by_disposition,
+         lambda: (load_csv("chart6_coverage_by_disposition.csv"), load_csv("outlets.csv"), "Left", "per_day")),
+        # Profiles, similarity matrix and clustering of every outlet, then the two figures
+        ("outlet_similarity", outlet_similarity, lambda: ()),
+        ("plot_outlet_similarity", plot_outlet_similarity, lambda: (outlet_similarity(), 4)),
+        ("plot_outlet_dendrogram", plot_outlet_dendrogram, lambda: (outlet_similarity(),)),
+    ]
+    for outlet in ("BBC", "All Outlets"):
+        cases += [
+            (f"plot_associations[{outlet}]", plot_associations,
+             lambda outlet=outlet: (per_article("associations"), *ASSOCIATION_CHARTS[0], outlet)),
+            (f"plot_framing[{outlet}]", plot_framing,
+             lambda outlet=outlet: (per_article("framing"), *FRAMING_CHARTS[0], outlet)),
+            (f"plot_sentiment[{outlet}]", plot_sentiment,
+             lambda outlet=outlet: (per_article("sentiment"), SENTIMENT_TITLE, outlet)),
+            (f"plot_victim_causor[{outlet}]", plot_victim_causor,
+             lambda outlet=outlet: (per_article("victim_causor"), *VICTIM_CAUSOR_CHARTS[0], outlet)),
+        ]
+    return cases
+
+
+def _clear_caches():
+    import loaders
+    import plots
+
+    loaders.clear_cache()
+    plots.clear_figure_cache()
+
+
+def _measure(run, prepare, repeat):
+    """
+    Times `run` cold (after `prepare` clears caches) and warm (immediately again).
+
+    Returns:
+        dict: Median cold and warm seconds and the peak traced memory of a cold run in MB.
+    """
+    cold, warm = [], []
+    for _ in range(repeat):
+        args = prepare()
+        started = time.perf_counter()
+        run(*args)
+        cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        run(*args)
+        warm.append(time.perf_counter() - started)
+
+    # Memory is traced in a separate cold run, since tracing slows everything down
+    args = prepare()
+    tracemalloc.start()
+    run(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cold_s": statistics.median(cold), "warm_s": statistics.median(warm), "peak_mb": peak / 2**20}
+
+
+def benchmark_plots(repeat):
+    results = {}
+    for name, func, build_args in _plot_cases():
+        def prepare(build_args=build_args):
+            # Inputs are loaded before the clock starts; only the plotting is timed
+            _clear_caches()
+            return build_args()
+
+        results[f"plots.{name}"] = _measure(func, prepare, repeat)
+    return results
+
+
+def benchmark_pages(repeat):
+    from streamlit.testing.v1 import AppTest
+
+    def render(page):
+        at = AppTest.from_file(page, default_timeout=600).run()
+        if at.exception:
+            raise RuntimeError(f"{page} raised: {[e.message for e in at.exception]}")
+
+    results = {}
+    for page in PAGES:
+        def prepare(page=page):
+            _clear_caches()
+            return (page,)
+
+        results[page] = _measure(render, prepare, repeat)
+    return results
+
+
+def run(outlets, crises, months, repeat, data_dir=None):
+    """Generates the scaled data and runs every benchmark against it."""
+    data_dir = data_dir or tempfile.mkdtemp(prefix="iml-benchmark-")
+    sizes = synthetic_data.generate(data_dir, outlets=outlets, crises=crises, months=months)
+
+    # loaders.py and bundle.py read these when first imported; the bundle is disabled
+    # so the pages build every view themselves
+    os.environ["IML_RESULTS_DIR"] = data_dir
+    os.environ["IML_BUNDLE_DIR"] = os.path.join(data_dir, "no-bundle")
+    # Import time is not part of any benchmark (see startup_report.py for that)
+    import plotly.express  # noqa: F401
+    benchmarks = dict(benchmark_plots(repeat), **benchmark_pages(repeat))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": {"outlets": outlets, "crises": crises, "months": months},
+        "repeat": repeat,
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+        "rows": sizes,
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(baseline, current, threshold=1.2):
+    """Prints current / baseline for every shared benchmark and returns the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':58} {'metric':8} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, metrics in current["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            continue
+        for metric, value in metrics.items():
+            ratio = value / previous[metric] if previous[metric] else float("inf")
+            flag = " <-- regression" if ratio > threshold else ""
+            if flag:
+                regressions.append(f"{name}:{metric}")
+            print(f"{name:58} {metric:8} {previous[metric]:10.4f} {value:10.4f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark plots.py and the pages on scaled synthetic data.")
+    parser.add_argument("--outlets", type=int, default=10, help="Outlet replication factor, e.g. 10 or 100")
+    parser.add_argument("--crises", type=int, default=10, help="Crisis replication factor")
+    parser.add_argument("--months", type=int, default=30, help="Monthly history length factor")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=None, help="Where to write the synthetic data (a temporary directory by default)")
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="An earlier benchmark JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Ratio above which a metric counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.outlets, args.crises, args.months, args.repeat, args.data_dir)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressed = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if regressed else 0)
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Rerun-time budgets, in seconds, for the sections of the pages that rerun on
+# their own (Streamlit fragments). A section that runs over its budget is logged;
+# `budget_info()` keeps per-section timings so the budgets can be checked and
+# tuned. Each budget can be overridden with IML_BUDGET_<NAME>, e.g. IML_BUDGET_STEP2=1.5.
+BUDGETS = {
+    "step1": 0.25,
+    "step2": 0.75,
+    "step3": 1.0,
+    "search": 0.1,
+    "similarity": 0.5,
+}
+
+logger = logging.getLogger(__name__)
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def budget_for(name):
+    return float(os.environ.get(f"IML_BUDGET_{name.upper()}", BUDGETS.get(name, float("inf"))))
+
+
+@contextmanager
+def rerun_budget(name):
+    """Times a section of a page and logs a warning if it runs over its budget."""
+    budget = budget_for(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _timings_lock:
+            stats = _timings.setdefault(name, {"runs": 0, "over_budget": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["runs"] += 1
+            stats["total_s"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+            stats["last_s"] = elapsed
+            if elapsed > budget:
+                stats["over_budget"] += 1
+        if elapsed > budget:
+            logger.warning("%s rerun took %.3fs, over its %.3fs budget", name, elapsed, budget)
+
+
+def budget_info():
+    """Returns runs, over-budget runs, last/mean/max seconds and the budget of every timed section."""
+    with _timings_lock:
+        return {
+            name: dict(stats, mean_s=stats["total_s"] / stats["runs"], budget_s=budget_for(name))
+            for name, stats in _timings.items()
+        }
+
+
+def clear_budget_info():
+    with _timings_lock:
+        _timings.clear()
@@ -0,0 +1,166 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+import loaders
+import snapshots
+
+# Pre-rendered figures and tables written by `prerender.py`. When a bundle is
+# present, the pages read each view from it instead of building it, so a click
+# costs a file read rather than pandas and Plotly work.
+#
+# The manifest records the content hash of every results file the bundle was
+# rendered from and a fingerprint of the code that rendered it; a bundle whose
+# inputs or code differ from this process's is not used.
+BUNDLE_DIR = os.environ.get("IML_BUNDLE_DIR", "bundle")
+MANIFEST_NAME = "manifest.json"
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Without snapshots, results files can change in place; their hashes are checked
+# against the manifest at most this often
+RECHECK_S = float(os.environ.get("IML_BUNDLE_RECHECK_S", 10))
+
+MISSING = object()
+
+# "valid": snapshot id (None without snapshots) -> (monotonic time checked, whether the bundle matches)
+_manifest = {"key": None, "views": {}, "inputs": {}, "code": None, "valid": {}}
+_code = {}
+_manifest_lock = threading.Lock()
+# path -> (stat signature, sha256), so unchanged files are not hashed again
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def view_key(view, **params):
+    """Returns the canonical bundle key for a view, e.g. "plot_coverage?normalization=per_day"."""
+    params = {name: ",".join(value) if isinstance(value, (list, tuple)) else value
+              for name, value in sorted(params.items())}
+    return f"{view}?{urlencode(params)}" if params else view
+
+
+def figure_key(func, *args, **kwargs):
+    """Returns the bundle key for a plotting call; frame arguments are not part of the key."""
+    import pandas as pd
+
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    params = {name: value for name, value in bound.arguments.items() if not isinstance(value, pd.DataFrame)}
+    return view_key(func.__name__, **params)
+
+
+def _file_hash(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    sha256 = snapshots.file_hash(path)
+    with _hashes_lock:
+        _hashes[path] = (signature, sha256)
+    return sha256
+
+
+def input_versions(names):
+    """Returns the content hash of each results file (None if missing), from the pinned snapshot if any."""
+    return {name: snapshots.content_hash(loaders.RESULTS_DIR, name) or _file_hash(loaders.results_path(name))
+            for name in names}
+
+
+def code_fingerprint():
+    """Returns a hash of the modules that render the views and of the interval settings they use."""
+    from confidence import METHOD, SAMPLES
+
+    digest = hashlib.sha256(f"{METHOD}:{SAMPLES}".encode("utf-8"))
+    for path in sorted(glob.glob(os.path.join(CODE_DIR, "*.py"))):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update((_file_hash(path) or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _process_code_fingerprint():
+    # The code of a process does not change while it runs, so it is hashed once
+    with _manifest_lock:
+        if "fingerprint" not in _code:
+            _code["fingerprint"] = code_fingerprint()
+        return _code["fingerprint"]
+
+
+def _matches(inputs, code):
+    # A bundle rendered from other results or by other code is stale for this run
+    return bool(inputs) and code == _process_code_fingerprint() and input_versions(inputs) == inputs
+
+
+def _views():
+    path = os.path.join(BUNDLE_DIR, MANIFEST_NAME)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    with _manifest_lock:
+        if _manifest["key"] != key:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            _manifest.update(views=manifest["views"], inputs=manifest.get("inputs", {}), code=manifest.get("code"),
+                             valid={})
+            _manifest["key"] = key
+        views, inputs, code, valid = _manifest["views"], _manifest["inputs"], _manifest["code"], _manifest["valid"]
+    # Checked once per snapshot; a snapshot's files never change
+    snapshot = snapshots.pinned_snapshot(loaders.RESULTS_DIR)
+    snapshot_id = snapshot.id if snapshot is not None else None
+    checked = valid.get(snapshot_id)
+    if checked is None or (snapshot_id is None and time.monotonic() - checked[0] > RECHECK_S):
+        checked = valid[snapshot_id] = (time.monotonic(), _matches(inputs, code))
+    return views if checked[1] else {}
+
+
+def _read(entry):
+    with open(os.path.join(BUNDLE_DIR, entry["json"]), "r") as f:
+        return json.load(f)
+
+
+def get_figure(key):
+    """Returns the pre-rendered figure (or None for an empty view), or MISSING if not bundled."""
+    entry = _views().get(key)
+    if entry is None:
+        return MISSING
+    if entry["empty"]:
+        return None
+    import plotly.graph_objects as go
+
+    # Bundled figures were validated when they were rendered
+    fig = go.Figure(_read(entry), _validate=False)
+    # Lets payloads.plotly_chart reuse its compacted payload; the path names the build
+    fig._figure_key = ("bundle", entry["json"])
+    return fig
+
+
+def get_tables(key):
+    """Returns the pre-rendered tables of a view as a dict of frames (or None), or MISSING."""
+    entry = _views().get(key)
+    if entry is None:
+        return MISSING
+    if entry["empty"]:
+        return None
+    import pandas as pd
+
+    return {name: pd.DataFrame(table["data"], columns=table["columns"]) for name, table in _read(entry).items()}
+
+
+def bundled_figure(func, *args, **kwargs):
+    """Serves a plotting call from the bundle, calling `func` only when the view is not bundled."""
+    fig = get_figure(figure_key(func, *args, **kwargs))
+    return func(*args, **kwargs) if fig is MISSING else fig
+
+
+def bundled_tables(build, view, **params):
+    """Serves a table view from the bundle, calling `build()` only when the view is not bundled."""
+    tables = get_tables(view_key(view, **params))
+    return build() if tables is MISSING else tables
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from confidence import ratio_intervals
+from dimensions import coverage_facts
+from loaders import derived
+
+# Columns of chart4_spider_chart.csv behind each normalization option
+NORMALIZATION_COLUMNS = {
+    "raw": "coverage_count",
+    "per_day": "coverage_per_day",
+    "per_funding": "coverage_per_funding",
+    "per_people": "coverage_per_people",
+}
+
+
+class CoverageMatrix:
+    """
+    Outlet x crisis coverage, one dense matrix per normalization.
+
+    An outlet without a row for some crisis has zero coverage of it. Every question
+    below is a handful of vectorized operations on one matrix, so any crisis pair,
+    threshold and normalization can be answered on each rerun.
+    """
+
+    def __init__(self, outlets, crises, matrices):
+        self.outlets = np.asarray(outlets, dtype=object)
+        self.crises = list(crises)
+        self.matrices = matrices
+        self._crisis_index = {crisis: i for i, crisis in enumerate(self.crises)}
+
+    @classmethod
+    def from_facts(cls, facts):
+        present = np.flatnonzero(np.diff(facts.offsets) > 0)
+        rows = np.searchsorted(present, facts.outlet_codes)
+        matrices = {}
+        for normalization, column in NORMALIZATION_COLUMNS.items():
+            if column not in facts.measures:
+                continue
+            matrix = np.zeros((len(present), len(facts.crises)))
+            np.add.at(matrix, (rows, facts.crisis_codes), facts.measures[column])
+            matrices[normalization] = matrix
+        return cls(facts.outlets.outlets[present], facts.crises, matrices)
+
+    @property
+    def nbytes(self):
+        return sum(matrix.nbytes for matrix in self.matrices.values())
+
+    def _column(self, matrix, crisis):
+        return matrix[:, self._crisis_index[crisis]]
+
+    def more_than(self, crisis, baseline, normalization="per_day"):
+        """Returns the outlets that covered `crisis` more than `baseline`."""
+        matrix = self.matrices[normalization]
+        return self.outlets[self._column(matrix, crisis) > self._column(matrix, baseline)].tolist()
+
+    def similar(self, crisis, baseline, threshold=0.05, normalization="per_day"):
+        """
+        Returns the outlets whose coverage of the two crises differs by at most
+        `threshold` (a fraction of the larger of the two); outlets that covered
+        neither are left out.
+        """
+        matrix = self.matrices[normalization]
+        a, b = self._column(matrix, crisis), self._column(matrix, baseline)
+        larger = np.maximum(a, b)
+        return self.outlets[(larger > 0) & (np.abs(a - b) <= threshold * larger)].tolist()
+
+    def other_crises_over(self, baseline, exclude=(), normalization="per_day"):
+        """
+        Finds outlets that covered some other crisis more than `baseline`.
+
+        Returns:
+            dict: outlet -> crises (other than `baseline` and `exclude`) it covered more than `baseline`.
+        """
+        matrix = self.matrices[normalization]
+        others = [i for i, crisis in enumerate(self.crises) if crisis != baseline and crisis not in exclude]
+        over = matrix[:, others] > self._column(matrix, baseline)[:, None]
+        crises = np.asarray(self.crises, dtype=object)[others]
+        return {self.outlets[row]: crises[over[row]].tolist() for row in np.flatnonzero(over.any(axis=1))}
+
+    def most_balanced(self, exclude=(), top=10, normalization="per_day"):
+        """Returns the `top` outlets with the most coverage of the crises not in `exclude`."""
+        matrix = self.matrices[normalization]
+        others = [i for i, crisis in enumerate(self.crises) if crisis not in exclude]
+        totals = matrix[:, others].sum(axis=1)
+        return self.outlets[np.argsort(-totals, kind="stable")[:top]].tolist()
+
+    def ratio_table(self, baseline, normalization="per_day"):
+        """
+        Compares the coverage of every crisis with `baseline`, over all outlets.
+
+        The normalizations divide each crisis' coverage by a per-crisis constant, so the
+        confidence interval of a ratio comes from the raw coverage counts behind it.
+
+        Returns:
+            pd.DataFrame: Crisis, Coverage, "<baseline> vs Crisis (X times more)" and the
+                ratio's confidence interval (CI Low, CI High), baseline first.
+        """
+        totals = self.matrices[normalization].sum(axis=0)
+        base = totals[self._crisis_index[baseline]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(totals > 0, base / totals, np.nan)
+        counts = self.matrices["raw"].sum(axis=0)
+        lower, upper = ratio_intervals(counts[self._crisis_index[baseline]], counts)
+        # The baseline compared with itself is exactly 1, not a ratio of two independent counts
+        is_base = np.arange(len(self.crises)) == self._crisis_index[baseline]
+        lower, upper = np.where(is_base, 1.0, lower), np.where(is_base, 1.0, upper)
+        table = pd.DataFrame({
+            "Crisis": self.crises,
+            "Coverage": totals,
+            f"{baseline} vs Crisis (X times more)": ratios,
+            "CI Low": ratios * lower,
+            "CI High": ratios * upper,
+        })
+        # Baseline first, then the rest in their usual (alphabetical) order
+        return table.iloc[np.argsort(table["Crisis"] != baseline, kind="stable")].reset_index(drop=True)
+
+
+def coverage_matrix(df):
+    """Returns the `CoverageMatrix` of chart4_spider_chart.csv, built once per version of the file."""
+    return derived("coverage_matrix", [df], lambda df: CoverageMatrix.from_facts(coverage_facts(df)))
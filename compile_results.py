@@ -0,0 +1,82 @@
+"""
+Compiles the JSON/CSV files under results/ into typed Arrow tables.
+
+The dashboard memory-maps the compiled tables through `loaders.py` and only
+falls back to parsing the text sources when no compiled table exists (or a
+source has been edited since the last compile).
+
+Usage:
+    python compile_results.py [--results-dir results]
+"""
+import argparse
+import json
+import os
+import time
+
+import pyarrow as pa
+
+import loaders
+import snapshots
+
+
+def _table_name(kind, name):
+    return f"{name.replace(os.sep, '__').replace('/', '__')}.{kind}.arrow"
+
+
+def _write_table(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = f"{path}.tmp"
+    # Uncompressed IPC files can be memory-mapped and read without copying
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table
+
+
+def compile_results(results_dir=loaders.RESULTS_DIR):
+    """
+    Compiles every table-shaped file under `results_dir` into results/compiled/.
+
+    Sources are read from `results_dir` itself, never through its current snapshot;
+    the snapshots, the compiled store and the search index under it are skipped.
+
+    Args:
+        results_dir (str): The results directory (or snapshot) to compile.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    out_dir = os.path.join(results_dir, loaders.COMPILED_DIRNAME)
+    os.makedirs(out_dir, exist_ok=True)
+
+    tables = {}
+    for name in snapshots.iter_files(results_dir):
+        source = os.path.join(results_dir, name)
+        source_stat = os.stat(source)
+        for kind in loaders.source_kinds(name, source):
+            started = time.perf_counter()
+            table_name = _table_name(kind, name)
+            table = _write_table(loaders.parse_source(kind, source), os.path.join(out_dir, table_name))
+            tables[f"{kind}:{name}"] = {
+                "table": table_name,
+                "rows": table.num_rows,
+                "schema": {field.name: str(field.type) for field in table.schema},
+                "source_size": source_stat.st_size,
+                "source_mtime_ns": source_stat.st_mtime_ns,
+            }
+            print(f"{kind:>16}  {name}  ({table.num_rows} rows, {time.perf_counter() - started:.2f}s)")
+
+    manifest = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "tables": tables}
+    manifest_path = os.path.join(out_dir, loaders.MANIFEST_NAME)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile results/ into memory-mappable Arrow tables.")
+    parser.add_argument("--results-dir", default=loaders.RESULTS_DIR)
+    args = parser.parse_args()
+    compile_results(args.results_dir)
@@ -0,0 +1,173 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from loaders import derived, load_records
+from rollups import FRAMING_FILE, article_counts
+
+# Confidence intervals for the mentions per article shown on the qualitative page
+# and for the "X times more" coverage ratios.
+#
+# Mentions of an item in an outlet's articles are treated as a Poisson count, so
+# the interval of a rate raw_count / article_count is the interval of its count
+# divided by the (fixed) article count. "bootstrap" resamples every count of a
+# file SAMPLES times in one (samples x cells) array and takes percentiles;
+# "analytic" uses Byar's approximation to the exact Poisson interval. Analytic is
+# the default: a percentile bootstrap is centred on the observed count and is too
+# narrow for small counts (for a count of 1 it gives [0, 3] against an exact
+# [0.03, 5.57]). A zero count can only resample to zero, so its upper bound always
+# comes from Byar's formula.
+CONFIDENCE = 0.95
+METHOD = os.environ.get("IML_CI_METHOD", "analytic")
+SAMPLES = int(os.environ.get("IML_CI_SAMPLES", 2000))
+SEED = 0
+# Bootstrap grids are drawn in chunks of at most this many values; grids of more
+# than one chunk are spread over a process pool of IML_CI_WORKERS processes
+CHUNK_DRAWS = 4_000_000
+WORKERS = int(os.environ.get("IML_CI_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _pool_executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the server process runs threads
+            import multiprocessing
+
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def byar_intervals(counts, confidence=CONFIDENCE):
+    """Returns Byar's approximate (lower, upper) bounds of the Poisson mean behind each count."""
+    k = np.asarray(counts, dtype=np.float64)
+    z = _z(confidence)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lower = np.where(k > 0, k * (1 - 1 / (9 * k) - z / (3 * np.sqrt(k))) ** 3, 0.0)
+    upper = (k + 1) * (1 - 1 / (9 * (k + 1)) + z / (3 * np.sqrt(k + 1))) ** 3
+    return np.maximum(lower, 0.0), upper
+
+
+def _bootstrap_chunk(counts, samples, confidence, seed):
+    # Percentiles of `samples` Poisson resamples of every count, drawn as one array
+    rng = np.random.default_rng(seed)
+    draws = rng.poisson(counts, size=(samples, len(counts)))
+    alpha = 1 - confidence
+    return np.quantile(draws, [alpha / 2, 1 - alpha / 2], axis=0)
+
+
+def count_intervals(counts, method=METHOD, confidence=CONFIDENCE, samples=SAMPLES, seed=SEED):
+    """
+    Returns (lower, upper) bounds of the Poisson mean behind each count.
+
+    Args:
+        counts (array-like): Observed counts.
+        method (str): "bootstrap" or "analytic".
+        confidence (float): Coverage of the intervals.
+        samples (int): Bootstrap resamples per count.
+        seed (int): Seed of the resampling; results do not depend on how the grid is split.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    lower, upper = byar_intervals(counts, confidence)
+    if method == "analytic" or not len(counts):
+        return lower, upper
+    if method != "bootstrap":
+        raise ValueError(f"Invalid interval method '{method}'")
+
+    chunk = max(CHUNK_DRAWS // samples, 1)
+    starts = range(0, len(counts), chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    args = [(counts[start:start + chunk], samples, confidence, s) for start, s in zip(starts, seeds)]
+    if len(args) > 1 and WORKERS > 1:
+        parts = list(_pool_executor().map(_bootstrap_chunk, *zip(*args)))
+    else:
+        parts = [_bootstrap_chunk(*a) for a in args]
+    bootstrap = np.concatenate(parts, axis=1)
+    return bootstrap[0], np.where(counts > 0, bootstrap[1], upper)
+
+
+def rate_intervals(raw_count, article_count, **kwargs):
+    """Returns (lower, upper) bounds of raw_count / article_count; NaN where there are no articles."""
+    articles = np.asarray(article_count, dtype=np.float64)
+    lower, upper = count_intervals(raw_count, **kwargs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.where(articles > 0, lower / articles, np.nan),
+                np.where(articles > 0, upper / articles, np.nan))
+
+
+def ratio_intervals(base_count, counts, method=METHOD, confidence=CONFIDENCE, samples=SAMPLES, seed=SEED):
+    """
+    Returns (lower, upper) factors bounding the ratio of two Poisson rates.
+
+    The ratio of `base_count` to each of `counts` (each rate scaled by a fixed
+    divisor, such as the crisis days) lies within these factors of its point value.
+    NaN where either count is zero.
+
+    Args:
+        base_count (float): Count of the baseline.
+        counts (array-like): Counts compared with the baseline.
+        method (str): "bootstrap" resamples both counts together; "analytic" uses
+            the normal approximation of the log ratio.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    valid = (counts > 0) & (base_count > 0)
+    if method == "analytic":
+        with np.errstate(divide="ignore"):
+            spread = _z(confidence) * np.sqrt(1 / base_count + 1 / counts)
+        lower, upper = np.exp(-spread), np.exp(spread)
+    elif method == "bootstrap":
+        rng = np.random.default_rng(seed)
+        draws = rng.poisson(np.append(counts, base_count), size=(samples, len(counts) + 1)).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factors = (draws[:, -1:] / base_count) / (draws[:, :-1] / counts)
+        alpha = 1 - confidence
+        lower, upper = np.quantile(factors, [alpha / 2, 1 - alpha / 2], axis=0)
+    else:
+        raise ValueError(f"Invalid interval method '{method}'")
+    return np.where(valid, lower, np.nan), np.where(valid, upper, np.nan)
+
+
+def with_intervals(df, **kwargs):
+    """Adds ci_lower and ci_upper columns to a frame with raw_count and article_count."""
+    lower, upper = rate_intervals(df["raw_count"].to_numpy(), df["article_count"].to_numpy(), **kwargs)
+    return df.assign(ci_lower=lower, ci_upper=upper)
+
+
+def rate_table(df, dataset):
+    """
+    Returns a per-article file with article_count, ci_lower and ci_upper for every row.
+
+    All rows (every outlet and item) are computed together, once per version of the
+    file, and shared across sessions.
+
+    Args:
+        df (pd.DataFrame): The per-article file.
+        dataset (str): Which one it is, e.g. "associations" (as in `rollups.ITEM_DIMENSIONS`).
+    """
+    framing_df = load_records(FRAMING_FILE)
+
+    def build(df, framing_df):
+        fallback = framing_df.groupby(["outlet", "crisis_name"])["article_count"].max()
+        counts = article_counts(df, fallback)
+        if "article_count" not in df.columns:
+            df = df.join(counts.rename("article_count"), on=["outlet", "crisis_name"])
+        return with_intervals(df)
+
+    return derived(f"rate_table:{dataset}", [df, framing_df], build)
+
+
+def error_bars(df):
+    """Returns the distances from mentions_per_article to ci_upper and ci_lower, for `error_y`."""
+    mentions = df["mentions_per_article"].to_numpy()
+    return (np.clip(df["ci_upper"].to_numpy() - mentions, 0, None),
+            np.clip(mentions - df["ci_lower"].to_numpy(), 0, None))
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from loaders import derived, load_csv, source_name
+
+# Measure columns of the per-outlet coverage files (chart4, chart6)
+MEASURES = ["coverage_count", "coverage_per_day", "coverage_per_funding", "coverage_per_people"]
+
+UNKNOWN = "Unknown"
+
+
+class OutletDimension:
+    """
+    Outlets with integer codes, ordered by (disposition, outlet).
+
+    Because codes follow the disposition order, the outlets of one disposition
+    are the contiguous code range `disposition_ranges[disposition]`.
+    """
+
+    def __init__(self, outlets, dispositions, countries):
+        self.outlets = np.asarray(outlets, dtype=object)
+        self.dispositions = np.asarray(dispositions, dtype=object)
+        self.countries = np.asarray(countries, dtype=object)
+        self.codes = pd.Index(self.outlets)
+        bounds = np.flatnonzero(np.r_[True, self.dispositions[1:] != self.dispositions[:-1], True])
+        self.disposition_ranges = {self.dispositions[lo]: (int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:])}
+
+    @classmethod
+    def from_frame(cls, outlets_df, extra_outlets=()):
+        """
+        Builds the dimension from `outlets.csv`.
+
+        Args:
+            outlets_df (pd.DataFrame): outlets.csv; an outlet listed twice keeps its first row.
+            extra_outlets (iterable): Outlets found in fact tables but not in outlets.csv; their
+                disposition and country are "Unknown".
+        """
+        rows = outlets_df.drop_duplicates("outlet_name")[["outlet_name", "disposition", "country"]]
+        missing = sorted(set(extra_outlets) - set(rows["outlet_name"]))
+        rows = pd.concat([rows, pd.DataFrame({"outlet_name": missing, "disposition": UNKNOWN, "country": UNKNOWN})])
+        rows = rows.sort_values(["disposition", "outlet_name"], kind="stable")
+        return cls(rows["outlet_name"], rows["disposition"], rows["country"])
+
+    def __len__(self):
+        return len(self.outlets)
+
+    def code(self, outlet):
+        """Returns the code of an outlet, or -1 if it is unknown."""
+        return int(self.codes.get_indexer([outlet])[0])
+
+
+class CoverageFacts:
+    """
+    A per-outlet coverage file (chart4/chart6) as int32 keys and float32 measures.
+
+    Rows are sorted by (outlet code, crisis code), so the rows of outlet code `o`
+    are `offsets[o]:offsets[o + 1]`, and those of a disposition, whose outlets have
+    consecutive codes, are a single contiguous range as well.
+    """
+
+    def __init__(self, outlets, crises, outlet_codes, crisis_codes, measures):
+        self.outlets = outlets
+        self.crises = np.asarray(crises, dtype=object)
+        self.outlet_codes = outlet_codes
+        self.crisis_codes = crisis_codes
+        self.measures = measures
+        self.offsets = np.searchsorted(outlet_codes, np.arange(len(outlets) + 1)).astype(np.int64)
+
+    @classmethod
+    def from_frame(cls, df, outlets_df):
+        outlets = OutletDimension.from_frame(outlets_df, df["matched_outlet"].unique())
+        crisis_codes, crises = pd.factorize(df["crisis_name"], sort=True)
+        outlet_codes = outlets.codes.get_indexer(df["matched_outlet"])
+        order = np.lexsort((crisis_codes, outlet_codes))
+        measures = {column: df[column].to_numpy(dtype=np.float32)[order] for column in MEASURES if column in df.columns}
+        return cls(outlets, crises, outlet_codes[order].astype(np.int32), crisis_codes[order].astype(np.int32), measures)
+
+    @property
+    def nbytes(self):
+        return (self.outlet_codes.nbytes + self.crisis_codes.nbytes + self.offsets.nbytes
+                + sum(values.nbytes for values in self.measures.values()))
+
+    def outlet_rows(self, outlet):
+        """Returns the row slice of one outlet (empty for an unknown outlet)."""
+        code = self.outlets.code(outlet)
+        if code < 0:
+            return slice(0, 0)
+        return slice(self.offsets[code], self.offsets[code + 1])
+
+    def disposition_rows(self, disposition):
+        """Returns the row slice of every outlet with a disposition (empty for an unknown one)."""
+        lo, hi = self.outlets.disposition_ranges.get(disposition, (0, 0))
+        return slice(self.offsets[lo], self.offsets[hi])
+
+    def values(self, column, rows):
+        """Returns a measure over a row slice as float64, at the precision it was stored with."""
+        # Going through the shortest float32 repr keeps e.g. 0.33566433 from being
+        # displayed as 0.3356643319129944
+        return self.measures[column][rows].astype(str).astype(np.float64)
+
+    def crisis_totals(self, rows, column):
+        """
+        Sums a measure per crisis over a row slice.
+
+        Returns:
+            pd.DataFrame: crisis_name and `column`, one row per crisis present in the slice.
+        """
+        codes = self.crisis_codes[rows]
+        totals = np.bincount(codes, weights=self.measures[column][rows], minlength=len(self.crises))
+        present = np.bincount(codes, minlength=len(self.crises)) > 0
+        return pd.DataFrame({"crisis_name": self.crises[present], column: totals[present]})
+
+
+def coverage_facts(df, outlets_df=None):
+    """Returns the `CoverageFacts` of chart4/chart6, built once per version of the file and outlets.csv."""
+    if outlets_df is None:
+        outlets_df = load_csv("outlets.csv")
+    # Named per file, so the facts of chart4 and chart6 are cached side by side
+    return derived(f"coverage_facts:{source_name(df)}", [df, outlets_df], CoverageFacts.from_frame)
@@ -0,0 +1,244 @@
+"""
+Sharded, resumable extraction of frame attributes into the *_frame_results*.json files.
+
+Articles (CSV or JSON lines with crisis_name, outlet and text columns) are
+split into fixed-size shards in input order. Each shard is run through the
+extractor in a process pool and its partial counts are written atomically to
+the state directory as soon as it finishes, so an interrupted run resumes by
+skipping every shard that already has a partial file. The partials are then
+merged into the existing raw_counts / mentions_per_article layout, per outlet
+(including "All Outlets") and global.
+
+The bundled extractor is a lexicon matcher seeded from the current results;
+any picklable object with an `attributes` list and an `extract(text)` method
+returning {attribute: [item, ...]} can take its place.
+
+Usage:
+    python frame_extraction.py articles.jsonl [--state-dir extraction_state] [--out results]
+"""
+import argparse
+import glob
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import loaders
+from frame_table import FRAME_FILES
+from keyword_counter import KeywordAutomaton, read_articles
+from keywords import ALL_OUTLETS
+
+RUN_FILE = "run.json"
+SHARD_PATTERN = "shard-{:06d}.json"
+
+
+class LexiconExtractor:
+    """
+    Stub extractor that reports every lexicon term found in the text.
+
+    Args:
+        lexicon (dict): attribute (e.g. "humanitarian.victim") -> list of item strings.
+    """
+
+    def __init__(self, lexicon):
+        self.attributes = list(lexicon)
+        self.terms = []
+        seen = set()
+        for attribute, items in lexicon.items():
+            for item in items:
+                if (attribute, item.lower()) not in seen:
+                    seen.add((attribute, item.lower()))
+                    self.terms.append((attribute, item))
+        self.automaton = KeywordAutomaton([item for _, item in self.terms])
+
+    def extract(self, text):
+        counts = self.automaton.count(text)
+        found = {}
+        for index in counts.nonzero()[0]:
+            attribute, item = self.terms[index]
+            found.setdefault(attribute, []).extend([item] * int(counts[index]))
+        return found
+
+
+def lexicon_from_results(frames=FRAME_FILES, top_k=50):
+    """Builds a stub lexicon from the most frequent items of the existing global frame results."""
+    lexicon = {}
+    for path in frames.values():
+        results = loaders.load_json(path.replace("_outlets", ""))
+        for attributes in results.values():
+            for attribute, values in attributes.items():
+                items = sorted(values["raw_counts"].items(), key=lambda item: -item[1])[:top_k]
+                lexicon.setdefault(attribute, []).extend(item for item, _ in items)
+    return lexicon
+
+
+_extractor = None
+
+
+def _init_worker(extractor):
+    global _extractor
+    _extractor = extractor
+
+
+def _write_json(path, data, indent=None):
+    # Write next to the target and swap it in, so a crash never leaves a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def _extract_shard(shard_dir, index, records):
+    # Partial counts: {outlet: {crisis: {"articles": n, "counts": {attribute: {item: count}}}}}
+    partial = {}
+    for crisis, outlet, text in records:
+        entry = partial.setdefault(outlet, {}).setdefault(crisis, {"articles": 0, "counts": {}})
+        entry["articles"] += 1
+        for attribute, items in _extractor.extract(text if isinstance(text, str) else "").items():
+            counts = entry["counts"].setdefault(attribute, {})
+            for item in items:
+                counts[item] = counts.get(item, 0) + 1
+    _write_json(os.path.join(shard_dir, SHARD_PATTERN.format(index)), partial)
+    return index
+
+
+def _check_run(state_dir, paths, shard_size):
+    # Partials are only reusable if the shards are cut from the same inputs the same way
+    run = {
+        "shard_size": shard_size,
+        "inputs": [{"path": os.path.abspath(path), "size": os.stat(path).st_size,
+                    "mtime_ns": os.stat(path).st_mtime_ns} for path in paths],
+    }
+    run_path = os.path.join(state_dir, RUN_FILE)
+    if os.path.exists(run_path):
+        with open(run_path, "r") as f:
+            previous = json.load(f)
+        if previous != run:
+            raise ValueError(f"{state_dir} holds shards of a different run; use a new --state-dir or --restart")
+    else:
+        _write_json(run_path, run, indent=4)
+
+
+def completed_shards(state_dir):
+    """Returns the indices of shards that already have a partial file."""
+    return {int(os.path.basename(path)[6:12]) for path in glob.glob(os.path.join(state_dir, "shard-*.json"))}
+
+
+def run_extraction(paths, extractor, state_dir, shard_size=1_000, workers=None):
+    """
+    Extracts frame attributes shard by shard, skipping shards completed by an earlier run.
+
+    Args:
+        paths (list[str]): Article files, read in order.
+        extractor: Object with `attributes` and `extract(text)`, pickled to each worker.
+        state_dir (str): Directory holding the run description and per-shard partials.
+        shard_size (int): Articles per shard.
+        workers (int): Number of worker processes (defaults to the CPU count).
+
+    Returns:
+        int: Number of shards extracted by this call.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    _check_run(state_dir, paths, shard_size)
+    done = completed_shards(state_dir)
+    workers = workers or os.cpu_count() or 1
+
+    index = extracted = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(extractor,)) as pool:
+        # Keep at most two shards per worker in flight to bound memory
+        pending = deque()
+        for path in paths:
+            for records in read_articles(path, shard_size):
+                if index not in done:
+                    pending.append(pool.submit(_extract_shard, state_dir, index, records))
+                    if len(pending) >= 2 * workers:
+                        pending.popleft().result()
+                        extracted += 1
+                index += 1
+        while pending:
+            pending.popleft().result()
+            extracted += 1
+
+    print(f"Extracted {extracted} shards ({len(done)} reused from an earlier run)")
+    return extracted
+
+
+def _add_counts(target, counts):
+    for attribute, items in counts.items():
+        merged = target.setdefault(attribute, {})
+        for item, count in items.items():
+            merged[item] = merged.get(item, 0) + count
+
+
+def _results_layout(articles, counts, attributes):
+    layout = {}
+    for attribute in attributes:
+        raw_counts = dict(sorted(counts.get(attribute, {}).items(), key=lambda item: -item[1]))
+        layout[attribute] = {
+            "raw_counts": raw_counts,
+            "mentions_per_article": {item: count / articles for item, count in raw_counts.items()},
+        }
+    return layout
+
+
+def merge_shards(state_dir, attributes):
+    """
+    Merges every shard partial into the frame results layouts.
+
+    Returns:
+        tuple: ({outlet: {crisis: {attribute: {...}}}} including "All Outlets", {crisis: {attribute: {...}}}).
+    """
+    totals = {}
+    for path in sorted(glob.glob(os.path.join(state_dir, "shard-*.json"))):
+        with open(path, "r") as f:
+            partial = json.load(f)
+        for outlet, crises in partial.items():
+            for crisis, entry in crises.items():
+                for key in (outlet, ALL_OUTLETS):
+                    merged = totals.setdefault(key, {}).setdefault(crisis, {"articles": 0, "counts": {}})
+                    merged["articles"] += entry["articles"]
+                    _add_counts(merged["counts"], entry["counts"])
+
+    outlets = {
+        outlet: {crisis: _results_layout(entry["articles"], entry["counts"], attributes) for crisis, entry in crises.items()}
+        for outlet, crises in totals.items() if outlet != ALL_OUTLETS
+    }
+    overall = outlets[ALL_OUTLETS] = {
+        crisis: _results_layout(entry["articles"], entry["counts"], attributes)
+        for crisis, entry in totals.get(ALL_OUTLETS, {}).items()
+    }
+    return outlets, overall
+
+
+def write_frame_results(outlets, overall, out_dir, frames=FRAME_FILES):
+    """Splits the merged results by frame and writes the per-outlet and global files of each."""
+    for frame, path in frames.items():
+        def select(crises):
+            return {crisis: {attribute: values for attribute, values in attributes.items()
+                             if attribute.split(".")[0] == frame}
+                    for crisis, attributes in crises.items()}
+
+        outlet_path = os.path.join(out_dir, path)
+        os.makedirs(os.path.dirname(outlet_path), exist_ok=True)
+        _write_json(outlet_path, {outlet: select(crises) for outlet, crises in outlets.items()}, indent=4)
+        _write_json(os.path.join(out_dir, path.replace("_outlets", "")), select(overall), indent=4)
+        print(f"Wrote {path} and its global counterpart")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract frame attributes from article texts, resumably.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSON lines files with crisis_name, outlet and text columns")
+    parser.add_argument("--state-dir", default="extraction_state")
+    parser.add_argument("--out", default=loaders.RESULTS_DIR)
+    parser.add_argument("--shard-size", type=int, default=1_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--restart", action="store_true", help="Discard the partials of an earlier run")
+    args = parser.parse_args()
+
+    if args.restart:
+        for stale in glob.glob(os.path.join(args.state_dir, "*.json")):
+            os.remove(stale)
+
+    extractor = LexiconExtractor(lexicon_from_results())
+    run_extraction(args.paths, extractor, args.state_dir, args.shard_size, args.workers)
+    write_frame_results(*merge_shards(args.state_dir, extractor.attributes), args.out)
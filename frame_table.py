@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from loaders import derived, load_frame_results
+
+# The four per-outlet frame result files, keyed by the frame name used in the table
+FRAME_FILES = {
+    "humanitarian": "pillar2/humanitarian_frame_results_outlets.json",
+    "political": "pillar2/political_accountability_frame_results_outlets.json",
+    "geopolitics": "pillar2/geopolitics_frame_results_outlets.json",
+    "historical": "pillar2/historical_legacy_frame_results_outlets.json",
+}
+
+INDEX = ["outlet", "crisis_name", "attribute"]
+
+
+def format_percentages(mentions):
+    """Formats mentions per article as a percentage of articles, e.g. 0.2329 -> "23.3%"."""
+    percentages = (mentions * 100).round(1).astype(str) + "%"
+    return percentages.where(mentions.notna(), "0%")
+
+
+class FrameTable:
+    """
+    All frame results in one long-form table, indexed by (outlet, crisis_name, attribute).
+
+    Rows are sorted by the index and, within each index key, by mentions per article
+    (descending), so every (outlet, crisis, attribute) slice is a contiguous block
+    whose offsets are looked up in a dict.
+    """
+
+    def __init__(self, data, missing_frames=()):
+        self.data = data
+        self.missing_frames = tuple(missing_frames)
+
+        codes = [data.index.codes[level] for level in range(len(INDEX))]
+        if len(data):
+            changes = np.flatnonzero(np.any([np.diff(c) != 0 for c in codes], axis=0)) + 1
+        else:
+            changes = np.array([], dtype=int)
+        starts = np.concatenate([[0], changes]).astype(int)
+        stops = np.concatenate([changes, [len(data)]]).astype(int)
+        keys = data.index[starts] if len(data) else []
+        self._offsets = {key: (start, stop) for key, start, stop in zip(keys, starts, stops)}
+
+        frame_outlets = data.groupby(["frame", data.index.get_level_values("outlet")], observed=True).size().index
+        self._frame_outlets = set(frame_outlets)
+
+    @property
+    def nbytes(self):
+        return int(self.data.memory_usage(index=True, deep=True).sum())
+
+    def has_outlet(self, frame, outlet):
+        return (frame, outlet) in self._frame_outlets
+
+    def items(self, outlet, crisis, attribute):
+        """Returns the item rows for one (outlet, crisis, attribute), most mentioned first."""
+        start, stop = self._offsets.get((outlet, crisis, attribute), (0, 0))
+        return self.data.iloc[start:stop]
+
+    def percentages(self, outlet, crisis, attribute):
+        """Returns an Item / Percentage of Articles table for display."""
+        rows = self.items(outlet, crisis, attribute)
+        return pd.DataFrame({
+            "Item": rows["item"].to_numpy(),
+            "Percentage of Articles": format_percentages(rows["mentions_per_article"]).to_numpy(),
+        })
+
+
+def build_frame_table(frames):
+    """
+    Combines per-frame results into one indexed table.
+
+    Args:
+        frames (dict): Frame name -> frame results frame as returned by `load_frame_results`.
+
+    Returns:
+        pd.DataFrame: Columns frame, item, raw_count and mentions_per_article with a
+        categorical (outlet, crisis_name, attribute) multi-index.
+    """
+    parts = [df.assign(frame=frame) for frame, df in frames.items()]
+    if parts:
+        data = pd.concat(parts, ignore_index=True)
+    else:
+        data = pd.DataFrame(columns=INDEX + ["item", "raw_count", "mentions_per_article", "frame"])
+    for column in INDEX + ["frame", "item"]:
+        data[column] = data[column].astype("category")
+    data["raw_count"] = data["raw_count"].astype("int32")
+
+    data = data.sort_values(INDEX + ["mentions_per_article"], ascending=[True] * len(INDEX) + [False], kind="stable")
+    data = data.set_index(INDEX)
+    return data[["frame", "item", "raw_count", "mentions_per_article"]]
+
+
+def load_frame_table():
+    """Loads the four frame result files as a `FrameTable`, built once per version of the files."""
+    frames, missing = {}, []
+    for frame, name in FRAME_FILES.items():
+        try:
+            frames[frame] = load_frame_results(name)
+        except FileNotFoundError:
+            missing.append(frame)
+
+    def build(*inputs):
+        return FrameTable(build_frame_table(dict(zip(frames, inputs))), missing)
+
+    return derived(f"frame_table:{','.join(frames)}", list(frames.values()), build)
@@ -0,0 +1,219 @@
+"""
+Incremental ingestion of article records into the results/chart*.csv files.
+
+Article files (CSV or JSON lines with crisis_name, outlet and date columns)
+are streamed in chunks and folded into running counts per (crisis, outlet,
+country, month), which are kept in a state directory together with the list
+of files already ingested. Re-running with a new month of articles only reads
+the new file; the charts are then rebuilt from the running counts and the
+crisis metadata (start date, funding required, people affected, crisis days).
+
+Usage:
+    python ingest.py articles/2025-03.csv [...] [--state-dir ingest_state] [--out results]
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+
+import loaders
+from loaders import load_csv
+
+KEY = ["crisis_name", "outlet", "country", "year_month"]
+METADATA_COLUMNS = ["crisis_name", "start_date", "fund_required", "people_affected", "crisis_days"]
+COUNTS_FILE = "counts.csv"
+INGESTED_FILE = "ingested.json"
+# Counts per (crisis, outlet, country, month), which the date-range filter of the
+# quantitative page reads for exact per-outlet and per-country windows
+MONTHLY_OUTLET_FILE = "monthly_outlet_coverage.csv"
+
+
+def read_articles(path, chunksize=100_000):
+    """Yields chunks of article records from a CSV or JSON lines file."""
+    if path.endswith((".jsonl", ".json")):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        reader = pd.read_csv(path, usecols=["crisis_name", "outlet", "date"], chunksize=chunksize)
+    with reader:
+        yield from reader
+
+
+def count_chunk(chunk, outlet_countries):
+    """
+    Counts articles per (crisis, outlet, country, month) in one chunk.
+
+    Returns:
+        tuple: (pd.Series of counts indexed by KEY, number of rows skipped for an unparseable date).
+    """
+    dates = pd.to_datetime(chunk["date"], errors="coerce", format="mixed")
+    valid = dates.notna()
+    chunk = chunk[valid]
+    keys = pd.DataFrame({
+        "crisis_name": chunk["crisis_name"],
+        "outlet": chunk["outlet"],
+        "country": chunk["outlet"].map(outlet_countries).fillna("Other"),
+        "year_month": dates[valid].dt.strftime("%Y-%m"),
+    })
+    return keys.groupby(KEY).size(), int((~valid).sum())
+
+
+def load_state(state_dir):
+    counts_path = os.path.join(state_dir, COUNTS_FILE)
+    if os.path.exists(counts_path):
+        counts = pd.read_csv(counts_path).set_index(KEY)["article_count"]
+    else:
+        counts = pd.Series(dtype="int64", index=pd.MultiIndex.from_tuples([], names=KEY), name="article_count")
+    ingested_path = os.path.join(state_dir, INGESTED_FILE)
+    ingested = {}
+    if os.path.exists(ingested_path):
+        with open(ingested_path, "r") as f:
+            ingested = json.load(f)
+    return counts, ingested
+
+
+def _replace(path, write):
+    # Write next to the target and swap it in, so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_state(state_dir, counts, ingested):
+    os.makedirs(state_dir, exist_ok=True)
+    frame = counts.rename("article_count").astype("int64").reset_index()
+    _replace(os.path.join(state_dir, COUNTS_FILE), lambda p: frame.to_csv(p, index=False))
+
+    def write_ingested(p):
+        with open(p, "w") as f:
+            json.dump(ingested, f, indent=4)
+
+    _replace(os.path.join(state_dir, INGESTED_FILE), write_ingested)
+
+
+def ingest(paths, state_dir, chunksize=100_000):
+    """
+    Folds new article files into the running counts.
+
+    Files that were already ingested with the same size and modification time are skipped.
+
+    Returns:
+        pd.Series: The updated counts indexed by (crisis_name, outlet, country, year_month).
+    """
+    counts, ingested = load_state(state_dir)
+    outlets_df = load_csv("outlets.csv")
+    outlet_countries = outlets_df.drop_duplicates("outlet_name").set_index("outlet_name")["country"]
+
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if ingested.get(os.path.abspath(path), {}).get("fingerprint") == fingerprint:
+            print(f"Skipping {path} (already ingested)")
+            continue
+
+        rows = skipped = 0
+        for chunk in read_articles(path, chunksize):
+            chunk_counts, chunk_skipped = count_chunk(chunk, outlet_countries)
+            counts = counts.add(chunk_counts, fill_value=0)
+            rows += len(chunk)
+            skipped += chunk_skipped
+        ingested[os.path.abspath(path)] = {"fingerprint": fingerprint, "rows": rows, "skipped": skipped}
+        print(f"Ingested {path}: {rows} rows ({skipped} skipped for an unparseable date)")
+        # Checkpoint after each file so an interrupted run resumes from the next one
+        save_state(state_dir, counts, ingested)
+
+    return counts.astype("int64")
+
+
+def normalize_coverage(df, count_column, metadata):
+    """Joins crisis metadata onto coverage counts and adds the per-day/per-funding/per-people columns."""
+    df = df.merge(metadata, on="crisis_name", how="inner")
+    df["coverage_per_day"] = df[count_column] / df["crisis_days"]
+    df["coverage_per_funding"] = df[count_column] / df["fund_required"]
+    df["coverage_per_people"] = df[count_column] / df["people_affected"]
+    return df
+
+
+def outlet_listings(outlets_df):
+    """
+    Returns the number of outlets.csv rows (country and disposition listings) of every outlet name.
+
+    chart6 counts an outlet's coverage once per listing, e.g. twice for "ABC News",
+    which is listed for both the United States and Australia.
+    """
+    return outlets_df.groupby("outlet_name").size()
+
+
+def build_charts(counts, metadata, as_of=None, outlets_df=None):
+    """
+    Builds chart1-chart6 from running counts.
+
+    Args:
+        counts (pd.Series): Counts indexed by (crisis_name, outlet, country, year_month).
+        metadata (pd.DataFrame): One row per crisis with METADATA_COLUMNS.
+        as_of (str): If given, crisis_days is recomputed as the days from start_date to this date.
+        outlets_df (pd.DataFrame): outlets.csv, for chart6 (loaded from the results directory by default).
+
+    Returns:
+        dict: File name -> DataFrame, in the layout of the existing results/chart*.csv files.
+    """
+    metadata = metadata[METADATA_COLUMNS].drop_duplicates("crisis_name")
+    if as_of is not None:
+        start_dates = pd.to_datetime(metadata["start_date"], format="%m/%d/%Y")
+        metadata = metadata.assign(crisis_days=(pd.Timestamp(as_of) - start_dates).dt.days)
+
+    counts = counts.rename("coverage_count").reset_index()
+    counts = counts[counts["crisis_name"].isin(metadata["crisis_name"])]
+
+    by_crisis = counts.groupby("crisis_name", as_index=False)["coverage_count"].sum()
+    by_country = counts.groupby(["crisis_name", "country"], as_index=False)["coverage_count"].sum()
+    by_month = counts.groupby(["crisis_name", "year_month"], as_index=False)["coverage_count"].sum()
+    by_outlet = counts.groupby(["crisis_name", "outlet"], as_index=False)["coverage_count"].sum()
+    by_outlet = by_outlet.rename(columns={"outlet": "matched_outlet"})
+
+    chart1 = normalize_coverage(by_crisis.rename(columns={"coverage_count": "raw_coverage"}), "raw_coverage", metadata)
+    chart2 = normalize_coverage(by_country.rename(columns={"coverage_count": "raw_coverage"}), "raw_coverage", metadata)
+    chart4 = normalize_coverage(by_outlet, "coverage_count", metadata)
+    # One row per outlet, its coverage summed over the outlet's listings in outlets.csv
+    # (outlets that are not listed count once)
+    if outlets_df is None:
+        outlets_df = load_csv("outlets.csv")
+    listings = by_outlet["matched_outlet"].map(outlet_listings(outlets_df)).fillna(1).astype("int64")
+    chart6 = normalize_coverage(by_outlet.assign(coverage_count=by_outlet["coverage_count"] * listings),
+                                "coverage_count", metadata)
+    chart5 = by_crisis.merge(metadata, on="crisis_name", how="inner")
+
+    return {
+        "chart1_overall_coverage_bar.csv": chart1,
+        "chart2_coverage_by_country.csv": chart2,
+        "chart3_monthly_coverage.csv": by_month,
+        "chart4_spider_chart.csv": chart4,
+        "chart5_attention_vs_urgency.csv": chart5,
+        "chart6_coverage_by_disposition.csv": chart6,
+        MONTHLY_OUTLET_FILE: counts,
+    }
+
+
+def write_charts(charts, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in charts.items():
+        # chart6 has always been written with its index as the first column
+        index = name.startswith("chart6_")
+        _replace(os.path.join(out_dir, name), lambda p: df.to_csv(p, index=index))
+        print(f"Wrote {name} ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest article records into results/chart*.csv.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSON lines files with crisis_name, outlet and date columns")
+    parser.add_argument("--state-dir", default="ingest_state")
+    parser.add_argument("--out", default=loaders.RESULTS_DIR)
+    parser.add_argument("--metadata", default="chart1_overall_coverage_bar.csv",
+                        help="File in the results directory holding the crisis metadata")
+    parser.add_argument("--as-of", default=None, help="Recompute crisis_days up to this date (YYYY-MM-DD)")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    args = parser.parse_args()
+
+    metadata = load_csv(args.metadata)
+    counts = ingest(args.paths, args.state_dir, args.chunksize)
+    write_charts(build_charts(counts, metadata, args.as_of), args.out)
@@ -0,0 +1,200 @@
+"""
+Counts the tracked keywords in article texts and writes the keyword summaries.
+
+Every article is scanned once by a word-level Aho-Corasick automaton that
+matches all (multi-word) keywords at the same time. Articles are streamed in
+chunks to a process pool with a bounded number of chunks in flight, so memory
+stays flat however large the input is. The output has the layout of
+results/pillar2/crisis_keyword_summary_with_outlets.csv (including the
+"All Outlets" rows) and crisis_keyword_summary.csv.
+
+Usage:
+    python keyword_counter.py articles.jsonl [--keywords extra_keywords.txt] [--out results/pillar2]
+"""
+import argparse
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from keywords import ALL_OUTLETS, KEYWORDS
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over word tokens.
+
+    Keywords are split into lower-case word tokens, so a keyword only matches on
+    whole-word boundaries ("victim" does not match "victims") and multi-word
+    keywords match across any whitespace or punctuation between their words.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for token in TOKEN_RE.findall(keyword.lower()):
+                if token not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][token] = len(self.goto) - 1
+                state = self.goto[state][token]
+            self.output[state].append(index)
+
+        # Breadth-first pass to set failure links and merge outputs along them;
+        # children of the root keep the root as their failure link
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def count(self, text):
+        """Returns the number of occurrences of each keyword in `text`."""
+        counts = np.zeros(len(self.keywords), dtype=np.int64)
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for token in TOKEN_RE.findall(text.lower()):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for index in output[state]:
+                counts[index] += 1
+        return counts
+
+
+_automaton = None
+
+
+def _init_worker(keywords):
+    global _automaton
+    _automaton = KeywordAutomaton(keywords)
+
+
+def _count_chunk(records):
+    # Returns {(crisis_name, outlet): [article_count, keyword counts]} for one chunk
+    totals = {}
+    for crisis, outlet, text in records:
+        entry = totals.setdefault((crisis, outlet), [0, np.zeros(len(_automaton.keywords), dtype=np.int64)])
+        entry[0] += 1
+        entry[1] += _automaton.count(text if isinstance(text, str) else "")
+    return totals
+
+
+def read_articles(path, chunksize=2_000):
+    """Yields lists of (crisis_name, outlet, text) from a CSV or JSON lines file."""
+    if path.endswith((".jsonl", ".json")):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        reader = pd.read_csv(path, usecols=["crisis_name", "outlet", "text"], chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield list(zip(chunk["crisis_name"], chunk["outlet"], chunk["text"]))
+
+
+def count_keywords(paths, keywords=KEYWORDS, workers=None, chunksize=2_000):
+    """
+    Counts keywords across article files in a process pool.
+
+    Returns:
+        dict: (crisis_name, outlet) -> (article_count, np.ndarray of keyword counts).
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {}
+
+    def merge(chunk_totals):
+        for key, (articles, counts) in chunk_totals.items():
+            entry = totals.setdefault(key, [0, np.zeros(len(keywords), dtype=np.int64)])
+            entry[0] += articles
+            entry[1] += counts
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(list(keywords),)) as pool:
+        # Keep at most two chunks per worker in flight to bound memory
+        pending = deque()
+        for path in paths:
+            for records in read_articles(path, chunksize):
+                pending.append(pool.submit(_count_chunk, records))
+                if len(pending) >= 2 * workers:
+                    merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+
+    return {key: (articles, counts) for key, (articles, counts) in totals.items()}
+
+
+def _summary_row(crisis, articles, counts, keywords, top_k):
+    order = np.argsort(-counts, kind="stable")
+    top_by_total = {keywords[i]: int(counts[i]) for i in order}
+    averages = counts / articles if articles else np.zeros(len(counts))
+    top_by_average = {keywords[i]: float(averages[i]) for i in np.argsort(-averages, kind="stable")[:top_k]}
+    return {
+        "crisis_name": crisis,
+        "article_count": articles,
+        "top_by_total": json.dumps(top_by_total),
+        "top_by_average": json.dumps(top_by_average),
+    }
+
+
+def build_summaries(totals, keywords=KEYWORDS, top_k=10):
+    """
+    Builds the keyword summary tables from counted totals.
+
+    Returns:
+        tuple: (summary with outlets including "All Outlets" rows, summary per crisis).
+    """
+    keywords = list(keywords)
+    rows = []
+    by_crisis = {}
+    for (crisis, outlet), (articles, counts) in sorted(totals.items(), key=lambda item: (item[0][1], item[0][0])):
+        rows.append(dict(_summary_row(crisis, articles, counts, keywords, top_k), outlet=outlet))
+        entry = by_crisis.setdefault(crisis, [0, np.zeros(len(keywords), dtype=np.int64)])
+        entry[0] += articles
+        entry[1] += counts
+
+    crisis_rows = [_summary_row(crisis, articles, counts, keywords, top_k)
+                   for crisis, (articles, counts) in sorted(by_crisis.items())]
+    rows += [dict(row, outlet=ALL_OUTLETS) for row in crisis_rows]
+    return pd.DataFrame(rows), pd.DataFrame(crisis_rows)
+
+
+def read_keywords(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count tracked keywords in article texts.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSON lines files with crisis_name, outlet and text columns")
+    parser.add_argument("--keywords", default=None, help="File with additional keywords, one per line")
+    parser.add_argument("--out", default=os.path.join("results", "pillar2"))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=2_000)
+    args = parser.parse_args()
+
+    vocabulary = list(KEYWORDS)
+    if args.keywords:
+        vocabulary += [keyword for keyword in read_keywords(args.keywords) if keyword not in vocabulary]
+
+    totals = count_keywords(args.paths, vocabulary, args.workers, args.chunksize)
+    with_outlets, per_crisis = build_summaries(totals, vocabulary)
+    os.makedirs(args.out, exist_ok=True)
+    with_outlets.to_csv(os.path.join(args.out, "crisis_keyword_summary_with_outlets.csv"), index=False)
+    per_crisis.to_csv(os.path.join(args.out, "crisis_keyword_summary.csv"), index=False)
+    print(f"Counted {sum(articles for articles, _ in totals.values())} articles "
+          f"across {len(totals)} (crisis, outlet) pairs")
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from loaders import derived
+
+ALL_OUTLETS = "All Outlets"
+
+# The tracked keyword vocabulary; each keyword is a fixed column of the count matrix
+KEYWORDS = (
+    "aggressor", "casualties", "ceasefire", "civilian impact", "disinformation",
+    "displacement", "economic impact", "energy security", "ethnic cleansing", "genocide",
+    "global condemnation", "human rights", "humanitarian aid", "humanitarian crisis",
+    "international intervention", "military strategy", "occupation", "peace negotiations",
+    "peace talks", "political consequences", "propaganda", "refugees", "sanctions",
+    "security implications", "sovereignty", "terrorism", "victim", "war crimes",
+)
+
+
+class KeywordMatrix:
+    """
+    Keyword counts as an (outlet, crisis) x keyword matrix.
+
+    Row i holds the counts of outlet `outlets[outlet_codes[i]]` for crisis
+    `crises[crisis_codes[i]]`, so totals and per-article averages for any subset
+    of outlets are reductions over a row mask.
+    """
+
+    def __init__(self, outlets, crises, keywords, outlet_codes, crisis_codes, article_counts, counts):
+        self.outlets = list(outlets)
+        self.crises = list(crises)
+        self.keywords = list(keywords)
+        self.outlet_codes = outlet_codes
+        self.crisis_codes = crisis_codes
+        self.article_counts = article_counts
+        self.counts = counts
+        self._outlet_index = {outlet: code for code, outlet in enumerate(self.outlets)}
+
+    @classmethod
+    def from_summary(cls, keywords):
+        """Builds the matrix from the long-form table returned by `load_keyword_summary`."""
+        # "All Outlets" rows are the sum of the per-outlet rows, so they are derived instead of stored
+        per_outlet = keywords[keywords['outlet'] != ALL_OUTLETS]
+        vocabulary = list(KEYWORDS) + sorted(set(per_outlet['keyword'].unique()) - set(KEYWORDS))
+
+        rows = per_outlet[['outlet', 'crisis_name']].drop_duplicates()
+        outlet_codes, outlets = pd.factorize(rows['outlet'], sort=True)
+        crisis_codes, crises = pd.factorize(rows['crisis_name'], sort=True)
+        row_index = pd.MultiIndex.from_frame(rows)
+
+        row_positions = row_index.get_indexer(pd.MultiIndex.from_frame(per_outlet[['outlet', 'crisis_name']]))
+        keyword_positions = pd.Index(vocabulary).get_indexer(per_outlet['keyword'])
+        counts = np.zeros((len(rows), len(vocabulary)), dtype=np.int64)
+        np.add.at(counts, (row_positions, keyword_positions), per_outlet['total_count'].to_numpy())
+
+        article_counts = np.zeros(len(rows), dtype=np.int64)
+        article_counts[row_positions] = per_outlet['article_count'].to_numpy()
+
+        return cls(outlets, crises, vocabulary, outlet_codes.astype(np.int32), crisis_codes.astype(np.int32),
+                   article_counts, counts)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.article_counts.nbytes + self.outlet_codes.nbytes + self.crisis_codes.nbytes
+
+    def _row_mask(self, outlets):
+        if outlets is None:
+            return np.ones(len(self.outlet_codes), dtype=bool)
+        codes = [self._outlet_index[outlet] for outlet in outlets if outlet in self._outlet_index]
+        return np.isin(self.outlet_codes, codes)
+
+    def totals(self, outlets=None):
+        """
+        Sums keyword counts and article counts per crisis over a subset of outlets.
+
+        Args:
+            outlets (list[str]): Outlets to include; None for all outlets.
+
+        Returns:
+            tuple: (crisis x keyword count matrix, article count per crisis).
+        """
+        mask = self._row_mask(outlets)
+        codes = self.crisis_codes[mask]
+        # Unbuffered sums per crisis code: O(rows x keywords), with no crisis x row temporary
+        totals = np.zeros((len(self.crises), len(self.keywords)), dtype=np.int64)
+        np.add.at(totals, codes, self.counts[mask])
+        articles = np.bincount(codes, weights=self.article_counts[mask], minlength=len(self.crises))
+        return totals, articles.astype(np.int64)
+
+    def averages(self, outlets=None):
+        """Returns the crisis x keyword matrix of counts per article over a subset of outlets."""
+        totals, articles = self.totals(outlets)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(articles[:, None] > 0, totals / articles[:, None], 0.0)
+
+    def to_frame(self, outlets=None):
+        """Returns the totals over a subset of outlets as one row per (crisis_name, keyword)."""
+        totals, articles = self.totals(outlets)
+        present = articles > 0
+        totals, articles = totals[present], articles[present]
+        n_keywords = len(self.keywords)
+        return pd.DataFrame({
+            'crisis_name': np.repeat(np.asarray(self.crises, dtype=object)[present], n_keywords),
+            'keyword': np.tile(np.asarray(self.keywords, dtype=object), len(articles)),
+            'article_count': np.repeat(articles, n_keywords),
+            'total_count': totals.ravel(),
+            'average_count': (totals / articles[:, None]).ravel(),
+        })
+
+
+def keyword_matrix(keywords):
+    """Returns the `KeywordMatrix` for a keyword summary, built once per version of the file."""
+    return derived("keyword_matrix", [keywords], KeywordMatrix.from_summary)
+
+
+def outlet_keywords(keywords, outlet):
+    """
+    Selects the keyword counts for one outlet, or for all outlets combined.
+
+    Args:
+        keywords (pd.DataFrame): The long-form table from `load_keyword_summary`.
+        outlet (str): An outlet name or "All Outlets".
+
+    Returns:
+        pd.DataFrame: One row per (crisis_name, keyword) with total_count, article_count and average_count.
+    """
+    return keyword_matrix(keywords).to_frame(None if outlet == ALL_OUTLETS else [outlet])
+
+
+def keyword_tables(selected, crisis, top_k=10):
+    """
+    Builds the Step 1 display tables for one crisis.
+
+    Returns:
+        dict: "total" (all keywords by total count) and "average" (top `top_k` keywords by
+        average count per article), or None if there is no data for the crisis.
+    """
+    crisis_data = selected[selected['crisis_name'] == crisis]
+    if crisis_data.empty:
+        return None
+
+    total_df = crisis_data[['keyword', 'total_count']].sort_values(by='total_count', ascending=False).reset_index(drop=True)
+    total_df.columns = ['Keyword', 'Total Count']
+
+    average_df = crisis_data[['keyword', 'average_count']].sort_values(by='average_count', ascending=False).head(top_k).reset_index(drop=True)
+    average_df.columns = ['Keyword', 'Average Count']
+    return {'total': total_df, 'average': average_df}
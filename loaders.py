@@ -0,0 +1,506 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+import shared_store
+import snapshots
+
+# Every results/ file used by the pages and plots.py is read through this module.
+# Each file is parsed once per process, keyed on its path and modification time,
+# and shared between sessions as a read-only object.
+#
+# When `compile_results.py` has been run, files are read from the compiled Arrow
+# store under results/compiled/ instead of the JSON/CSV sources, and the compiled
+# tables are mapped from their shared-memory copy (see shared_store.py) so that
+# every worker process on the host shares one copy of them.
+#
+# When results are published as snapshots (see snapshots.py), files are read from
+# the snapshot pinned for the current script run and keyed on their content hash,
+# so a new snapshot only reloads the files that changed.
+RESULTS_DIR = os.environ.get("IML_RESULTS_DIR", "results")
+COMPILED_DIRNAME = "compiled"
+MANIFEST_NAME = "manifest.json"
+CACHE_MAX_BYTES = int(os.environ.get("IML_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+PREFETCH_WORKERS = int(os.environ.get("IML_PREFETCH_WORKERS", 4))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Keys being built right now; other threads asking for them wait instead of parsing again
+_inflight = {}
+# Seconds spent parsing each file, for the startup timing report
+_timings = OrderedDict()
+_prefetch_pool = None
+_manifest = {"key": None, "entries": {}}
+
+
+def results_path(name):
+    """Resolves a file name relative to the results directory (or its pinned snapshot)."""
+    return os.path.join(snapshots.results_dir(RESULTS_DIR), name)
+
+
+def compiled_dir():
+    return results_path(COMPILED_DIRNAME)
+
+
+def _read_frame_results(path):
+    # Flattens {outlet: {crisis: {attribute: {"raw_counts": ..., "mentions_per_article": ...}}}}
+    # (or the same without the outlet level) into one row per item.
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    per_outlet = path.endswith("_outlets.json")
+    outlets = data.items() if per_outlet else [(None, data)]
+    rows = []
+    for outlet, crises in outlets:
+        for crisis, attributes in crises.items():
+            for attribute, counts in attributes.items():
+                raw_counts = counts.get("raw_counts", {})
+                mentions = counts.get("mentions_per_article", {})
+                for item in dict.fromkeys([*raw_counts, *mentions]):
+                    rows.append((outlet, crisis, attribute, item,
+                                 raw_counts.get(item, 0), mentions.get(item, 0.0)))
+
+    columns = ["outlet", "crisis_name", "attribute", "item", "raw_count", "mentions_per_article"]
+    df = pd.DataFrame(rows, columns=columns)
+    df["raw_count"] = df["raw_count"].astype("int64")
+    df["mentions_per_article"] = df["mentions_per_article"].astype("float64")
+    return df if per_outlet else df.drop(columns="outlet")
+
+
+def _read_keyword_summary(path):
+    # Expands the JSON `top_by_total` cells into one row per (crisis, outlet, keyword).
+    # Averages are recomputed from the totals because `top_by_average` only keeps the top 10.
+    summary = pd.read_csv(path)
+    rows = []
+    for record in summary.to_dict("records"):
+        for keyword, total in json.loads(record["top_by_total"]).items():
+            rows.append((record["crisis_name"], record.get("outlet"), record["article_count"], keyword, total))
+
+    columns = ["crisis_name", "outlet", "article_count", "keyword", "total_count"]
+    df = pd.DataFrame(rows, columns=columns)
+    df["article_count"] = df["article_count"].astype("int64")
+    df["total_count"] = df["total_count"].astype("int64")
+    df["average_count"] = df["total_count"] / df["article_count"]
+    return df if "outlet" in summary.columns else df.drop(columns="outlet")
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+_PARSERS = {
+    "csv": pd.read_csv,
+    "records": pd.read_json,
+    "json": _read_json,
+    "frame_results": _read_frame_results,
+    "keyword_summary": _read_keyword_summary,
+}
+
+
+def parse_source(kind, path):
+    """Parses a source file the way `load_<kind>` returns it."""
+    return _PARSERS[kind](path)
+
+
+def source_kinds(name, path=None):
+    """
+    Returns the loader kinds that can be compiled into tables for a results file.
+
+    Args:
+        name (str): Path relative to the results directory.
+        path (str): The file itself, if not `name` under the results directory.
+
+    Returns:
+        list[str]: e.g. ["csv", "keyword_summary"]; empty for files that stay as JSON.
+    """
+    base = os.path.basename(name)
+    if base.endswith(".csv"):
+        if base.startswith("crisis_keyword_summary"):
+            return ["csv", "keyword_summary"]
+        return ["csv"]
+    if base.endswith("_frame_results.json") or base.endswith("_frame_results_outlets.json"):
+        return ["frame_results"]
+    if base.endswith(".json"):
+        with open(path or results_path(name), "r") as f:
+            first = f.read(64).lstrip()
+        # Lists of records become tables; other JSON documents stay as JSON
+        if first.startswith("["):
+            return ["records"]
+    return []
+
+
+def _compiled_entries():
+    path = os.path.join(compiled_dir(), MANIFEST_NAME)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    if _manifest["key"] != key:
+        with open(path, "r") as f:
+            _manifest["entries"] = json.load(f)["tables"]
+        _manifest["key"] = key
+    return _manifest["entries"]
+
+
+def _compiled_table(kind, name, source_stat):
+    entry = _compiled_entries().get(f"{kind}:{name}")
+    if entry is None:
+        return None
+    # A source edited after the last compile takes precedence over the stale table
+    if source_stat is not None and (source_stat.st_size != entry["source_size"]
+                                    or source_stat.st_mtime_ns != entry["source_mtime_ns"]):
+        return None
+    return os.path.join(compiled_dir(), entry["table"])
+
+
+def _read_compiled(path):
+    import pyarrow as pa
+
+    # The memory map stays open for as long as the frame references its buffers;
+    # numeric columns without nulls are converted without copying.
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _freeze_frame(df):
+    # Rebuild the frame from read-only column arrays so an accidental in-place
+    # write raises instead of corrupting the copy shared by every session.
+    columns = {}
+    for column in df.columns:
+        values = df[column].array
+        if isinstance(df[column].dtype, np.dtype):
+            values = df[column].to_numpy()
+            values.setflags(write=False)
+        columns[column] = values
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.columns = df.columns
+    return frozen
+
+
+def _freeze_json(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze_json(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze_json(v) for v in obj)
+    return obj
+
+
+def _sizeof(obj):
+    if isinstance(obj, pd.DataFrame):
+        try:
+            return int(obj.memory_usage(index=True, deep=True).sum())
+        except ValueError:
+            # Frames built on read-only object arrays can only be measured shallowly
+            return int(obj.memory_usage(index=True).sum())
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_sizeof(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def _freeze(obj):
+    if isinstance(obj, pd.DataFrame):
+        return _freeze_frame(obj)
+    return _freeze_json(obj)
+
+
+def _evict(max_bytes):
+    total = sum(size for _, size in _cache.values())
+    # Always keep the most recently used entry, even if it alone exceeds the limit
+    while total > max_bytes and len(_cache) > 1:
+        _, (_, size) = _cache.popitem(last=False)
+        total -= size
+        _stats["evictions"] += 1
+
+
+def _load(kind, name, options=()):
+    source = results_path(name)
+    try:
+        source_stat = os.stat(source)
+    except FileNotFoundError:
+        source_stat = None
+
+    # Custom read options are not compiled, so they always go to the source file
+    compiled = None if options else _compiled_table(kind, name, source_stat)
+    if compiled is not None:
+        path, parse = shared_store.shared_path(compiled_dir(), compiled, MANIFEST_NAME), _read_compiled
+    elif source_stat is not None:
+        path = source
+        parse = lambda p: _PARSERS[kind](p, **dict(options))  # noqa: E731
+    else:
+        raise FileNotFoundError(f"{source} not found")
+
+    content_hash = snapshots.content_hash(RESULTS_DIR, name)
+    if content_hash is not None:
+        # The same content in another snapshot is the same entry
+        key, version = (kind, name, content_hash, options), snapshots.version(name, content_hash)
+    else:
+        mtime_ns = os.stat(path).st_mtime_ns
+        key, version = (kind, os.path.abspath(path), mtime_ns, options), f"{name}@{mtime_ns}"
+
+    def build():
+        started = time.perf_counter()
+        parsed = parse(path)
+        # Measure before freezing; pandas cannot deep-measure read-only object arrays
+        size = _sizeof(parsed)
+        value = _freeze(parsed)
+        if isinstance(value, pd.DataFrame):
+            # Lets derived datasets and figures key their own caches on the input version;
+            # the row count tells the whole file apart from subsets, which keep the tag
+            value.attrs["version"] = version
+            value.attrs["rows"] = len(value)
+        _timings[name] = time.perf_counter() - started
+        return value, size
+
+    return _cached(key, build)
+
+
+def _split_tag(tag):
+    # "name@version[window]" -> ("name", "[window]")
+    source, bracket, window = tag.partition("[")
+    return source.rpartition("@")[0], bracket + window
+
+
+def source_name(df):
+    """Returns the results file a loaded frame (or a window or subset of it) comes from, or None."""
+    tag = df.attrs.get("version")
+    return _split_tag(tag)[0] if isinstance(tag, str) else None
+
+
+def _input_identity(part):
+    # The file (and window) a frame was loaded from, whatever its version; a subset is
+    # also identified by its rows, so it is never taken for another version of a file
+    tag = part[0]
+    if not isinstance(tag, str):
+        return part
+    return _split_tag(tag) + tuple(part[1:] if len(part) > 2 else ())
+
+
+def _identity(key):
+    # What a cache entry is of: a file and its parse options, or a derived name and its inputs
+    if key[0] == "derived":
+        return (key[0], key[1], tuple(_input_identity(part) for part in key[2]))
+    return (key[0], key[1], key[3])
+
+
+def _cached(key, build):
+    while True:
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is not None:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return entry[0]
+            building = _inflight.get(key)
+            if building is None:
+                _stats["misses"] += 1
+                building = _inflight[key] = threading.Event()
+                break
+        # Another thread (e.g. a prefetch) is building this entry; use its result
+        building.wait()
+
+    try:
+        value, size = build()
+        with _cache_lock:
+            # Drop entries for older versions of the same input; entries of other inputs
+            # (other files, subsets or windows) are left to the LRU bound and `invalidate()`
+            identity = _identity(key)
+            for stale in [k for k in _cache if k != key and _identity(k) == identity]:
+                del _cache[stale]
+            _cache[key] = (value, size)
+            _evict(CACHE_MAX_BYTES)
+        return value
+    finally:
+        with _cache_lock:
+            del _inflight[key]
+        building.set()
+
+
+def frame_key(df):
+    """
+    Identifies the rows of a frame, for caches of what is derived from it.
+
+    A frame as tagged by the loader (or the coverage window code) is identified by its
+    version tag alone. Subsets keep their source's tag, so any other frame is also
+    identified by a hash of its index and content.
+    """
+    version, index = df.attrs.get("version"), df.index
+    if (version is not None and df.attrs.get("rows") == len(df) and isinstance(index, pd.RangeIndex)
+            and index.start == 0 and index.step == 1):
+        return (version, len(df))
+    try:
+        content = int(pd.util.hash_pandas_object(df, index=True).sum())
+    except TypeError:
+        # Columns of lists or dicts cannot be hashed; the index still tells filtered subsets apart
+        content = int(pd.util.hash_pandas_object(index).sum())
+    return (version, len(df), tuple(df.columns), content)
+
+
+def derived(name, inputs, build):
+    """
+    Builds a dataset derived from loaded frames once per version of its inputs.
+
+    Args:
+        name (str): A unique name for the derived dataset.
+        inputs (list[pd.DataFrame]): Frames returned by the `load_*` functions.
+        build (callable): Called with `inputs` on a cache miss; must not mutate them.
+
+    Returns:
+        The cached result of `build(*inputs)`, shared across sessions.
+    """
+    key = ("derived", name, tuple(frame_key(df) for df in inputs), ())
+
+    def build_entry():
+        value = build(*inputs)
+        return value, _sizeof(value)
+
+    return _cached(key, build_entry)
+
+
+def _hand_out(df):
+    # A shallow copy lets callers add or replace columns without touching the
+    # cached frame; the underlying arrays stay shared and read-only.
+    return df.copy(deep=False)
+
+
+def load_csv(name, **read_kwargs):
+    """
+    Loads a CSV file from the results directory.
+
+    Args:
+        name (str): Path relative to the results directory.
+        **read_kwargs: Extra keyword arguments passed to `pd.read_csv`; these bypass the compiled store.
+
+    Returns:
+        pd.DataFrame: A frame backed by read-only arrays shared across sessions.
+    """
+    return _hand_out(_load("csv", name, tuple(sorted(read_kwargs.items()))))
+
+
+def load_records(name):
+    """Loads a JSON list of records (e.g. `pillar2/*_per_article.json`) as a read-only frame."""
+    return _hand_out(_load("records", name))
+
+
+def load_frame_results(name):
+    """Loads a `*_frame_results*.json` file as one row per (outlet, crisis, attribute, item)."""
+    return _hand_out(_load("frame_results", name))
+
+
+def load_keyword_summary(name):
+    """Loads a `crisis_keyword_summary*.csv` file as one row per (crisis, outlet, keyword)."""
+    return _hand_out(_load("keyword_summary", name))
+
+
+def load_json(name):
+    """Loads a JSON document as nested read-only mappings and tuples."""
+    return _load("json", name)
+
+
+def prefetch(loader, *names):
+    """
+    Starts loading files in background threads.
+
+    A later `loader(name)` call returns the prefetched frame, waiting for it if the
+    load is still running. Errors are left for that call to raise.
+
+    Args:
+        loader (callable): One of the `load_*` functions.
+        *names (str): Paths relative to the results directory.
+
+    Returns:
+        list[concurrent.futures.Future]: One future per name.
+    """
+    # Each load runs in a copy of the caller's context, so it reads the caller's pinned snapshot
+    return [_prefetch_pool_executor().submit(contextvars.copy_context().run, loader, name) for name in names]
+
+
+def _prefetch_pool_executor():
+    global _prefetch_pool
+    with _cache_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    return _prefetch_pool
+
+
+def load_timings():
+    """Returns the seconds spent parsing each file loaded by this process, in load order."""
+    with _cache_lock:
+        return dict(_timings)
+
+
+def cache_info():
+    """Returns hit/miss/eviction counters and the current cache footprint."""
+    with _cache_lock:
+        return dict(
+            _stats,
+            entries=len(_cache),
+            bytes=sum(size for _, size in _cache.values()),
+            max_bytes=CACHE_MAX_BYTES,
+        )
+
+
+def invalidate(stale):
+    """
+    Drops the cached files, and the datasets derived from them, whose version is in `stale`.
+
+    Args:
+        stale (set): Version tags, as in `df.attrs["version"]`.
+
+    Returns:
+        int: The number of entries dropped.
+    """
+    with _cache_lock:
+        dropped = []
+        for key, (value, _) in _cache.items():
+            if key[0] == "derived":
+                if any(snapshots.is_stale(part[0], stale) for part in key[2]):
+                    dropped.append(key)
+            elif isinstance(value, pd.DataFrame) and snapshots.is_stale(value.attrs.get("version"), stale):
+                dropped.append(key)
+        for key in dropped:
+            del _cache[key]
+        return len(dropped)
+
+
+def _on_snapshot_swap(changed, old, new):
+    # Loads the new version of every changed file this process had loaded, in the
+    # background and once, so sessions moving to the new snapshot find it parsed;
+    # then drops the old versions and what was derived from them
+    with _cache_lock:
+        loaded = [(key[0], key[1], key[3]) for key in _cache
+                  if key[0] != "derived" and key[1] in changed and new.content_hash(key[1]) is not None]
+
+    def warm():
+        snapshots.pin(new)
+        for kind, name, options in loaded:
+            try:
+                _load(kind, name, options)
+            except Exception:
+                # Left for the page that needs the file to report
+                pass
+        invalidate(snapshots.stale_versions(changed, old))
+
+    _prefetch_pool_executor().submit(contextvars.Context().run, warm)
+
+
+snapshots.add_listener(_on_snapshot_swap)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
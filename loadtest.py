@@ -0,0 +1,378 @@
+"""
+Load-tests the dashboard pages with many concurrent simulated sessions.
+
+Each simulated user opens the pages (in random order) in their own Streamlit
+session, driven through Streamlit's AppTest in this process, and changes the
+pages' widgets the way a visitor does: the normalization, coverage period, outlet
+and disposition on the quantitative page and the search box and the outlet (and
+cluster count) of each step on the qualitative page, with a random think time
+between clicks. All sessions share this process's caches, as the sessions of one
+Streamlit worker do.
+
+Every rerun is timed; the report gives p50/p95/p99 latency overall and per
+action, throughput, errors, and the worker's memory over time (sampled with
+`shared_store.process_memory`). Results are written as JSON.
+
+AppTest reruns the whole script on every widget change. A browser session only
+reruns the fragment the widget is in, so the latencies of the qualitative page's
+actions (its steps and the search box are fragments) are full-page reruns and
+overstate what a visitor waits for; size from the quantitative page's actions and
+the page opens, or measure fragments with budgets.py on a real server.
+
+The harness replaces a few private Streamlit internals to run sessions side by
+side (see `_shared_test_runtime`) and refuses to run on a Streamlit version other
+than the one it was checked against (TESTED_STREAMLIT).
+
+Usage:
+    python loadtest.py [--users 200] [--concurrency 200] [--actions 5] [--think 0.5] [--ramp 10]
+                       [--outlets 10 --crises 10 --months 30] [--out loadtest.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+PAGES = ["pages/quantitative.py", "pages/qualitative.py"]
+
+# Widgets a visitor changes on each page, by key or label, with how often they
+# are picked relative to each other
+ACTIONS = {
+    "pages/quantitative.py": [
+        ("selectbox", "Select normalization method:", 3),
+        ("select_slider", "Coverage period:", 2),
+        ("selectbox", "Select an outlet:", 2),
+        ("selectbox", "Select a disposition:", 1),
+    ],
+    "pages/qualitative.py": [
+        ("text_input", "search_query", 2),
+        ("selectbox", "outlet_step1", 2),
+        ("selectbox", "outlet_step2", 2),
+        ("selectbox", "outlet_step3", 3),
+        ("slider", "similarity_clusters", 1),
+        ("selectbox", "outlet_step4", 1),
+    ],
+}
+# What visitors type into the search box
+SEARCH_QUERIES = ["Ukrainian civilians", "NATO", "sanctions", "refugees", "famine", "ceasefire", "aid convoy"]
+PERCENTILES = (50, 95, 99)
+# Streamlit release whose private internals `_shared_test_runtime` was checked against
+TESTED_STREAMLIT = "1.42."
+# Shown with every report
+FULL_RERUN_NOTE = ("AppTest reruns the whole page on every change; qualitative-page actions are fragment "
+                   "reruns in a browser, so their latencies here are upper bounds.")
+
+
+class Recorder:
+    """Collects rerun timings and errors from every session thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.reruns = []
+        self.errors = []
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def record(self, page, action, started, latency, error=None):
+        with self.lock:
+            self.reruns.append({"t": started - self.started, "page": page, "action": action,
+                                "latency_s": latency, "ok": error is None})
+            if error is not None:
+                self.errors.append({"page": page, "action": action, "error": error})
+
+    def session(self, delta):
+        with self.lock:
+            self.active += delta
+
+
+def _widget(at, kind, name):
+    matches = [w for w in getattr(at, kind) if w.key == name or w.label == name]
+    return matches[0] if matches else None
+
+
+def _next_value(widget, kind, rng):
+    # A value other than the current one, as a visitor would pick it
+    if kind == "text_input":
+        return rng.choice([query for query in SEARCH_QUERIES if query != widget.value])
+    if kind == "slider":
+        # The proto holds the bounds as floats
+        values = [v for v in range(int(widget.min), int(widget.max) + 1, int(widget.step or 1)) if v != widget.value]
+        return rng.choice(values) if values else widget.value
+    if kind == "select_slider" and isinstance(widget.value, (list, tuple)):
+        # A range: two ends, in order
+        first, last = sorted(rng.sample(range(len(widget.options)), 2))
+        return widget.options[first], widget.options[last]
+    options = [option for option in widget.options if option != widget.value] or list(widget.options)
+    return rng.choice(options)
+
+
+def _timed_run(recorder, page, action, run):
+    started = time.perf_counter()
+    try:
+        at = run()
+    except Exception as e:
+        recorder.record(page, action, started, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+        return None
+    latency = time.perf_counter() - started
+    error = "; ".join(e.message for e in at.exception) if at.exception else None
+    recorder.record(page, action, started, latency, error)
+    return None if error else at
+
+
+def simulate_user(user, recorder, actions, think, timeout, seed):
+    """Opens every page in one session each and makes `actions` widget changes on it."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 100_003 + user)
+    recorder.session(1)
+    try:
+        for page in rng.sample(PAGES, len(PAGES)):
+            at = _timed_run(recorder, page, "open", lambda: AppTest.from_file(page, default_timeout=timeout).run())
+            if at is None:
+                continue
+            choices = ACTIONS[page]
+            for _ in range(actions):
+                if think > 0:
+                    time.sleep(rng.expovariate(1 / think))
+                kind, name, _ = rng.choices(choices, weights=[w for _, _, w in choices])[0]
+                widget = _widget(at, kind, name)
+                if widget is None:
+                    recorder.record(page, name, time.perf_counter(), 0.0, "widget not found")
+                    continue
+                value = _next_value(widget, kind, rng)
+                at = _timed_run(recorder, page, name, lambda: widget.set_value(value).run()) or at
+    finally:
+        recorder.session(-1)
+
+
+def check_streamlit():
+    """Raises RuntimeError unless the Streamlit internals the harness replaces are as it expects."""
+    import streamlit
+    from streamlit import source_util
+    from streamlit.testing.v1 import local_script_runner
+
+    if not streamlit.__version__.startswith(TESTED_STREAMLIT):
+        raise RuntimeError(f"loadtest.py was checked against Streamlit {TESTED_STREAMLIT}x, not "
+                           f"{streamlit.__version__}; review _shared_test_runtime and update TESTED_STREAMLIT")
+    missing = [f"source_util.{name}" for name in ("_pages_cache_lock", "_cached_pages", "get_pages")
+               if not hasattr(source_util, name)]
+    if not hasattr(local_script_runner, "ScriptCache"):
+        missing.append("testing.v1.local_script_runner.ScriptCache")
+    if missing:
+        raise RuntimeError(f"Streamlit no longer has {', '.join(missing)}; review _shared_test_runtime")
+
+
+@contextmanager
+def _shared_test_runtime():
+    # Private Streamlit internals replaced for the whole test (check_streamlit
+    # guards their names):
+    # - AppTest installs a stand-in Runtime and its config overrides for each run and
+    #   removes them when the run ends, under the sessions still running (widgets,
+    #   forms and caches check `Runtime.exists()`); one stand-in and one set of
+    #   overrides serve them all.
+    # - Streamlit caches the pages of the one main script a server has, so sessions
+    #   of different pages would run each other's scripts; the cache is kept per page.
+    # - Each run compiles its page into a fresh script cache, and Python 3.11's
+    #   compiler is not safe to run from several threads at once ("AST constructor
+    #   recursion depth mismatch"); runs share one cache, as a server's sessions do.
+    from unittest.mock import MagicMock, patch
+
+    from streamlit import source_util
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    script_cache = ScriptCache()
+
+    pages, get_pages = {}, source_util.get_pages
+
+    def pages_of(main_script_path):
+        with source_util._pages_cache_lock:
+            if main_script_path not in pages:
+                source_util._cached_pages = None
+                pages[main_script_path] = get_pages(main_script_path)
+            return pages[main_script_path]
+
+    with patch.object(Runtime, "instance", classmethod(lambda cls: cls._instance or runtime)), \
+            patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+            patch.object(source_util, "get_pages", pages_of), \
+            patch.object(local_script_runner, "ScriptCache", lambda: script_cache), \
+            patch_config_options({"global.appTest": True}):
+        yield
+
+
+def _sample_memory(recorder, interval, stop, timeline):
+    from shared_store import process_memory
+
+    while True:
+        with recorder.lock:
+            completed, active = len(recorder.reruns), recorder.active
+        timeline.append(dict(process_memory(), t=recorder.elapsed(), active_sessions=active, reruns=completed))
+        if stop.wait(interval):
+            return
+
+
+def _latency_stats(latencies):
+    latencies = np.asarray(latencies)
+    if not len(latencies):
+        return {"count": 0}
+    stats = {"count": int(len(latencies)), "mean_s": float(latencies.mean()), "max_s": float(latencies.max())}
+    for p in PERCENTILES:
+        stats[f"p{p}_s"] = float(np.percentile(latencies, p))
+    return stats
+
+
+def summarize(recorder, timeline, wall_s):
+    """Returns latency percentiles (overall, per page and per action), throughput and memory."""
+    ok = [r for r in recorder.reruns if r["ok"]]
+    by_action = {}
+    for r in ok:
+        by_action.setdefault(f"{r['page']}:{r['action']}", []).append(r["latency_s"])
+    by_page = {}
+    for r in ok:
+        by_page.setdefault(r["page"], []).append(r["latency_s"])
+
+    # Reruns completed in each second of the test
+    finished = np.array([r["t"] + r["latency_s"] for r in recorder.reruns])
+    per_second = np.bincount(finished.astype(int)).tolist() if len(finished) else []
+    rss = [sample["rss"] for sample in timeline]
+    return {
+        "wall_s": wall_s,
+        "reruns": len(recorder.reruns),
+        "errors": len(recorder.errors),
+        "throughput_per_s": len(recorder.reruns) / wall_s if wall_s else 0.0,
+        "reruns_per_second": per_second,
+        "latency": _latency_stats([r["latency_s"] for r in ok]),
+        "pages": {page: _latency_stats(latencies) for page, latencies in sorted(by_page.items())},
+        "actions": {action: _latency_stats(latencies) for action, latencies in sorted(by_action.items())},
+        "memory": {
+            "start_rss": rss[0] if rss else 0,
+            "peak_rss": max(rss) if rss else 0,
+            "end_rss": rss[-1] if rss else 0,
+        },
+    }
+
+
+def run(users, concurrency, actions, think, ramp, timeout=600, seed=0, sample_interval=1.0):
+    """
+    Runs the load test in this process.
+
+    Args:
+        users (int): Simulated users; each opens every page and makes `actions` changes on it.
+        concurrency (int): Users active at the same time.
+        actions (int): Widget changes per page and user.
+        think (float): Mean think time between changes, in seconds (exponentially distributed).
+        ramp (float): Seconds over which users start.
+        timeout (float): Seconds a single rerun may take before AppTest gives up.
+        seed (int): Seed of the users' choices.
+        sample_interval (float): Seconds between memory samples.
+
+    Returns:
+        dict: The summary, the memory timeline and the first errors.
+    """
+    check_streamlit()
+    # Import time is not part of any rerun (see startup_report.py for that)
+    import plotly.express  # noqa: F401
+    import streamlit.testing.v1  # noqa: F401
+
+    recorder = Recorder()
+    timeline, stop = [], threading.Event()
+    sampler = threading.Thread(target=_sample_memory, args=(recorder, sample_interval, stop, timeline), daemon=True)
+    sampler.start()
+
+    def start_user(user):
+        # Users arrive evenly over the ramp
+        delay = ramp * user / max(users, 1) - recorder.elapsed()
+        if delay > 0:
+            time.sleep(delay)
+        simulate_user(user, recorder, actions, think, timeout, seed)
+
+    with _shared_test_runtime(), ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="user") as pool:
+        for future in [pool.submit(start_user, user) for user in range(users)]:
+            future.result()
+    wall_s = recorder.elapsed()
+    stop.set()
+    sampler.join()
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"users": users, "concurrency": concurrency, "actions": actions, "think_s": think,
+                     "ramp_s": ramp, "seed": seed},
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+        "summary": summarize(recorder, timeline, wall_s),
+        "notes": [FULL_RERUN_NOTE],
+        "timeline": timeline,
+        "errors": recorder.errors[:20],
+    }
+
+
+def print_report(results):
+    summary = results["summary"]
+    print(f"{summary['reruns']} reruns in {summary['wall_s']:.1f}s "
+          f"({summary['throughput_per_s']:.1f}/s), {summary['errors']} errors")
+    print(f"{'':58} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    rows = [("all reruns", summary["latency"])] + list(summary["pages"].items()) + list(summary["actions"].items())
+    for name, stats in rows:
+        if not stats["count"]:
+            continue
+        print(f"{name:58} {stats['count']:6d} " + " ".join(
+            f"{stats[key]:8.3f}" for key in ("p50_s", "p95_s", "p99_s", "max_s")))
+    memory = summary["memory"]
+    print(f"Worker RSS: {memory['start_rss'] / 2**20:.0f} MB at start, "
+          f"{memory['peak_rss'] / 2**20:.0f} MB peak, {memory['end_rss'] / 2**20:.0f} MB at end")
+    for note in results["notes"]:
+        print(f"Note: {note}")
+    for error in results["errors"][:5]:
+        print(f"  error in {error['page']} ({error['action']}): {error['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the dashboard pages with concurrent simulated sessions.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=None, help="Users active at once (default: all of them)")
+    parser.add_argument("--actions", type=int, default=5, help="Widget changes per page and user")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean seconds between a user's changes")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which users arrive")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds before a single rerun fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between memory samples")
+    parser.add_argument("--outlets", type=int, default=None,
+                        help="Run against synthetic data scaled by this outlet factor (see synthetic_data.py)")
+    parser.add_argument("--crises", type=int, default=1)
+    parser.add_argument("--months", type=int, default=1)
+    parser.add_argument("--data-dir", default=None, help="Where to write the synthetic data (a temporary directory by default)")
+    parser.add_argument("--out", default="loadtest.json")
+    args = parser.parse_args()
+
+    if args.outlets:
+        import synthetic_data
+
+        data_dir = args.data_dir or tempfile.mkdtemp(prefix="iml-loadtest-")
+        synthetic_data.generate(data_dir, outlets=args.outlets, crises=args.crises, months=args.months)
+        # loaders.py reads this when first imported, which is after this point
+        os.environ["IML_RESULTS_DIR"] = data_dir
+
+    results = run(args.users, args.concurrency or args.users, args.actions, args.think, args.ramp,
+                  args.timeout, args.seed, args.sample_interval)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=4)
+    print_report(results)
+    print(f"Wrote {args.out}")
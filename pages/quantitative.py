@@ -1,21 +1,29 @@
-import pandas as pd
-
 import streamlit as st
 
-from plots import (plot_coverage, plot_coverage_by_disposition,
+import snapshots
+from bundle import bundled_figure
+from comparisons import coverage_matrix
+from confidence import CONFIDENCE
+from loaders import load_csv, prefetch
+from payloads import dataframe, plotly_chart
+from plots import (NORMALIZATIONS, plot_coverage, plot_coverage_by_disposition,
+                   plot_coverage_timeseries, plot_crisis_coverage_vs_urgency,
                    plot_interactive_grouped_coverage_by_country,
-                   plot_monthly_crisis_coverage, plot_spider_chart)
+                   plot_spider_chart, plot_urgency_sensitivity)
+from timeseries import DEFAULT_POINTS
+from timewindow import coverage_windows, window_frame
+
+# Read every results file of this run from one snapshot, even if a new one is published meanwhile
+snapshots.pin_run()
+
+# Start parsing the files this page uses in the background; each one is loaded
+# where it is first needed (parsed once per process and shared across sessions)
+prefetch(load_csv, 'chart1_overall_coverage_bar.csv', 'chart2_coverage_by_country.csv',
+         'chart3_monthly_coverage.csv', 'chart4_spider_chart.csv', 'chart5_attention_vs_urgency.csv',
+         'chart6_coverage_by_disposition.csv', 'outlets.csv')
 
-# Load data (assuming CSVs are in the same directory)
-chart1_df = pd.read_csv('results/chart1_overall_coverage_bar.csv')
-chart2_df = pd.read_csv('results/chart2_coverage_by_country.csv')
-chart3_df = pd.read_csv('results/chart3_monthly_coverage.csv')
-chart4_df = pd.read_csv('results/chart4_spider_chart.csv')
-chart5_df = pd.read_csv('results/chart5_attention_vs_urgency.csv')
-chart6_df = pd.read_csv('results/chart6_coverage_by_disposition.csv')
-outlets_df = pd.read_csv('results/outlets.csv')
-gaza_df = pd.read_csv("results/gaza_vs_crises.csv")
-ukraine_df = pd.read_csv("results/ukraine_vs_crises.csv")
+GAZA = "Gaza and the Occupied Palestinian Territories"
+UKRAINE = "Ukraine"
 
 
 # Initialize Streamlit app with a title
@@ -24,91 +32,163 @@ st.title("Quantitative Analysis")
 # Create a dropdown on the main page (not in the sidebar)
 normalization = st.selectbox(
     'Select normalization method:',
-    ('per_day', 'per_funding', 'per_people', 'raw'),
+    NORMALIZATIONS,
     index=0  # Default is per_day
 )
 
 # Creating a page for "Quantitative Analysis"
 st.header("Quantitative Analysis")
 
+# Coverage period; the overall, per-country, per-outlet and per-disposition coverage
+# below is re-derived for it from monthly prefix sums (the full period uses the files as they are)
+windows = coverage_windows()
+period = st.select_slider('Coverage period:', options=windows.months,
+                          value=(windows.months[0], windows.months[-1]))
+lo, hi = windows.month_range(*period)
+full_period = windows.is_full(lo, hi)
+if not windows.exact and not full_period:
+    st.caption("Coverage per outlet and per country within the period is estimated "
+               "from each crisis' monthly totals.")
+
+
+def period_figure(func, *args, **kwargs):
+    # Bundles are rendered for the full period only; a narrower period is plotted from its own frame
+    if full_period:
+        return bundled_figure(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
 # Chart 1: Overall Coverage
 st.subheader("Overall Coverage")
-fig1 = plot_coverage(chart1_df, normalization=normalization)
-st.plotly_chart(fig1)
+chart1_df = window_frame('chart1_overall_coverage_bar.csv', lo, hi)
+fig1 = period_figure(plot_coverage, chart1_df, normalization=normalization)
+plotly_chart(fig1, 'quantitative/overall_coverage')
 
 # Chart 2: Coverage by Country
 st.subheader("Coverage by Country")
-fig2 = plot_interactive_grouped_coverage_by_country(chart2_df, normalization=normalization)
-st.plotly_chart(fig2)
+chart2_df = window_frame('chart2_coverage_by_country.csv', lo, hi)
+fig2 = period_figure(plot_interactive_grouped_coverage_by_country, chart2_df, normalization=normalization)
+plotly_chart(fig2, 'quantitative/coverage_by_country')
 
 # Chart 3: Monthly Crisis Coverage
 st.subheader("Monthly Crisis Coverage")
-fig3 = plot_monthly_crisis_coverage(chart3_df)
-st.plotly_chart(fig3)
+chart3_df = load_csv('chart3_monthly_coverage.csv')
+# Series are downsampled per crisis on the server, so the points sent stay flat as history grows.
+# The chart follows the coverage period; the full period is passed as an open window so it
+# matches the pre-rendered view
+max_points = st.select_slider('Points per crisis:', options=[100, 250, 500, 1000, 2000], value=DEFAULT_POINTS)
+start = None if lo == 0 else windows.months[lo]
+end = None if hi == len(windows.months) else windows.months[hi - 1]
+fig3 = bundled_figure(plot_coverage_timeseries, chart3_df, max_points=max_points, start=start, end=end)
+plotly_chart(fig3, 'quantitative/coverage_over_time')
 
 # Chart 4: bar Chart (Outlet Selection)
 st.subheader("Media Outlet Focus Across Crises")
-outlet_name = st.selectbox('Select an outlet:', chart4_df['matched_outlet'].unique())
-fig4 = plot_spider_chart(chart4_df[chart4_df['matched_outlet'] == outlet_name], outlet_name, normalization)
-st.plotly_chart(fig4)
+chart4_df = window_frame('chart4_spider_chart.csv', lo, hi)
+outlet_name = st.selectbox('Select an outlet:', load_csv('chart4_spider_chart.csv')['matched_outlet'].unique())
+fig4 = period_figure(plot_spider_chart, chart4_df, outlet_name, normalization)
+plotly_chart(fig4, 'quantitative/outlet_focus')
 
-import json
-with open("results/dashboard_results.json", "r") as f:
-    dashboard_data = json.load(f)
+# Outlet x crisis coverage matrix behind the questions below
+matrix = coverage_matrix(chart4_df)
+crisis_names = matrix.crises
 
 
 st.subheader("🟦 Answers to questions regarding how outlets covered the crises 🟦")
-st.write("Note that the results are normalized to coverage per day")
-
-# 1️⃣ Outlets that covered Ukraine more than Gaza
-st.subheader("Outlets that Covered Ukraine More Than Gaza")
-st.write("These outlets gave more coverage to Ukraine compared to Gaza.")
-if dashboard_data["outlets_more_ukraine"]:
-    st.write(", ".join(dashboard_data["outlets_more_ukraine"]))
+col1, col2, col3 = st.columns(3)
+crisis = col1.selectbox('Crisis:', crisis_names,
+                        index=crisis_names.index(UKRAINE) if UKRAINE in crisis_names else 0)
+baseline = col2.selectbox('Compared with:', crisis_names,
+                          index=crisis_names.index(GAZA) if GAZA in crisis_names else min(1, len(crisis_names) - 1))
+threshold = col3.slider('Similarity threshold (%):', min_value=0, max_value=50, value=5) / 100
+st.write(f"Note that the results are normalized to coverage {normalization.replace('_', ' ')}")
+
+# 1️⃣ Outlets that covered the crisis more than the baseline
+st.subheader(f"Outlets that Covered {crisis} More Than {baseline}")
+st.write(f"These outlets gave more coverage to {crisis} compared to {baseline}.")
+outlets_more = matrix.more_than(crisis, baseline, normalization)
+if outlets_more:
+    st.write(", ".join(outlets_more))
 else:
     st.write("No outlets met this criterion.")
 
-# 2️⃣ Outlets that covered Ukraine & Gaza similarly
-st.subheader("⚖️ Outlets that Covered Ukraine & Gaza Proportionally")
-if dashboard_data["outlets_similar_ukraine_gaza"]:
-    st.write(", ".join(dashboard_data["outlets_similar_ukraine_gaza"]))
+# 2️⃣ Outlets that covered both crises similarly
+st.subheader(f"⚖️ Outlets that Covered {crisis} & {baseline} Proportionally")
+st.write(f"Outlets whose coverage of the two crises differs by at most {threshold:.0%}.")
+outlets_similar = matrix.similar(crisis, baseline, threshold, normalization)
+if outlets_similar:
+    st.write(", ".join(outlets_similar))
 else:
     st.write("No outlets met this criterion.")
 
-# 3️⃣ Outlets that covered another crisis more than Ukraine & Gaza
-st.subheader("Outlets that Prioritized Other Crises Over Ukraine & Gaza")
-st.write("The only crisis that was covered more than Gaza by some outlets was Ukraine. The following are the outlets covered a crisis more than Ukraine (excluding Gaza) ")
-if dashboard_data["outlets_other_crisis"]:
-    for outlet, crises in dashboard_data["outlets_other_crisis"].items():
-        st.write(f"**{outlet}**: {', '.join(crises)}")
+# 3️⃣ Outlets that covered another crisis more than the selected crisis
+st.subheader(f"Outlets that Prioritized Other Crises Over {crisis} & {baseline}")
+st.write(f"Outlets that covered a crisis more than {crisis} (excluding {baseline})")
+outlets_other = matrix.other_crises_over(crisis, [baseline], normalization)
+if outlets_other:
+    for outlet, other_crises in outlets_other.items():
+        st.write(f"**{outlet}**: {', '.join(other_crises)}")
 else:
     st.write("No outlets met this criterion.")
 
 # 4️⃣ Most balanced outlets
 st.subheader("📊 Most Balanced Outlets Across All Crises")
-st.write("Outlets That Covered the Other 8 Crises the Most")
-if dashboard_data["most_balanced_outlets"]:
-    st.write(", ".join(dashboard_data["most_balanced_outlets"]))
+st.write(f"Outlets That Covered the Other {len(crisis_names) - len({crisis, baseline})} Crises the Most")
+most_balanced = matrix.most_balanced([crisis, baseline], 10, normalization)
+if most_balanced:
+    st.write(", ".join(most_balanced))
 else:
     st.write("No outlets met this criterion.")
 
 
 # Chart 5: Crisis Attention vs Urgency
-# st.subheader("Crisis Attention vs Urgency")
-# fig5 = plot_crisis_coverage_vs_urgency(chart5_df)
-# st.plotly_chart(fig5)
+st.subheader("Crisis Attention vs Urgency")
+chart5_df = load_csv('chart5_attention_vs_urgency.csv')
+with st.expander("Urgency scenario"):
+    # Scenarios are not pre-rendered; each one is evaluated (and its figure cached) once per process
+    fund_weight = st.slider('Weight of funding required in urgency:', min_value=0.0, max_value=1.0,
+                            value=0.5, step=0.05)
+    scenario_df = st.data_editor(
+        chart5_df[['crisis_name', 'fund_required', 'people_affected']],
+        hide_index=True, disabled=['crisis_name'], key='urgency_scenario',
+        column_config={
+            'fund_required': st.column_config.NumberColumn('Funding required', min_value=0.0, format="%.2f"),
+            'people_affected': st.column_config.NumberColumn('People affected', min_value=0.0, format="%.1f"),
+        })
+fund_required = tuple(scenario_df['fund_required'].astype(float))
+people_affected = tuple(scenario_df['people_affected'].astype(float))
+fig_urgency = plot_crisis_coverage_vs_urgency(chart5_df, fund_weight=fund_weight, people_weight=1.0 - fund_weight,
+                                              fund_required=fund_required, people_affected=people_affected,
+                                              normalization=normalization)
+plotly_chart(fig_urgency, 'quantitative/attention_vs_urgency')
+fig_sensitivity = plot_urgency_sensitivity(chart5_df, fund_required=fund_required, people_affected=people_affected,
+                                           normalization=normalization)
+plotly_chart(fig_sensitivity, 'quantitative/urgency_sensitivity')
 
 
 # Chart 5: Coverage by outlets political dispositions
 st.subheader("Overall Coverage")
+chart6_df = window_frame('chart6_coverage_by_disposition.csv', lo, hi)
+outlets_df = load_csv('outlets.csv')
 disposition = st.selectbox('Select a disposition:', outlets_df['disposition'].unique())
-fig5 = plot_coverage_by_disposition(chart6_df,outlets_df, disposition, normalization=normalization)
-st.plotly_chart(fig5)
+fig5 = period_figure(plot_coverage_by_disposition, chart6_df, outlets_df, disposition, normalization=normalization)
+plotly_chart(fig5, 'quantitative/disposition')
+
+
+def ratio_table(table_baseline):
+    table = matrix.ratio_table(table_baseline, normalization)
+    ratio_column = table.columns[2]
+    dataframe(table, f'quantitative/ratio_table[{table_baseline}]', hide_index=True, column_config={
+        "Coverage": st.column_config.NumberColumn(f"Coverage ({normalization.replace('_', ' ')})", format="%.3f"),
+        ratio_column: st.column_config.NumberColumn(ratio_column, format="%.2fX"),
+        "CI Low": st.column_config.NumberColumn(f"{CONFIDENCE:.0%} CI Low", format="%.2fX"),
+        "CI High": st.column_config.NumberColumn(f"{CONFIDENCE:.0%} CI High", format="%.2fX"),
+    })
 
 
-st.subheader("How Many Times More Gaza Was Covered?")
-st.dataframe(gaza_df)
+st.subheader(f"How Many Times More {baseline} Was Covered?")
+ratio_table(baseline)
 
-# Display Ukraine vs. Other Crises
-st.subheader("How Many Times More Ukraine Was Covered?")
-st.dataframe(ukraine_df)
\ No newline at end of file
+# Display the selected crisis vs. other crises
+st.subheader(f"How Many Times More {crisis} Was Covered?")
+ratio_table(crisis)
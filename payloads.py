@@ -0,0 +1,232 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from loaders import frame_key
+
+# Compact payloads for the figures and tables the pages send to the browser.
+#
+# Floats in figures are rounded to FLOAT_DIGITS significant digits (enough for
+# every count and ratio the charts show), long float arrays are sent as float32,
+# and each figure only carries the parts of its template that apply to it: Plotly
+# templates such as plotly_dark hold defaults for every trace type and for 3D, map
+# and polar axes, which is most of the JSON of a small bar chart. Tables already
+# travel as Arrow; their float columns are rounded to the decimals Streamlit
+# displays and sent as float32 where that keeps those decimals.
+#
+# The bytes sent for each chart and table are recorded; `payload_info()` reports
+# them. Set IML_COMPACT_PAYLOADS=0 to send everything as before.
+#
+# Figures from the figure cache and the bundle carry the key they were cached
+# under, and their compacted copy and byte counts are kept per key, so a figure
+# is only serialized and compacted the first time it is sent. Table sizes are
+# measured again whenever a table's content changes.
+COMPACT = os.environ.get("IML_COMPACT_PAYLOADS", "1") != "0"
+FLOAT_DIGITS = int(os.environ.get("IML_FLOAT_DIGITS", 6))
+# Decimals st.dataframe shows for a float column without a format
+TABLE_DECIMALS = 4
+# Float arrays up to this length are sent as JSON numbers, which are shorter than
+# their base64 float32 encoding
+SHORT_ARRAY = 16
+PAYLOAD_CACHE_SIZE = int(os.environ.get("IML_PAYLOAD_CACHE_SIZE", 256))
+
+# Template layout keys that only apply to axes and widgets the charts never use
+_UNUSED_LAYOUT = {"polar", "ternary", "scene", "geo", "mapbox", "map", "updatemenudefaults", "sliderdefaults"}
+# Trace properties holding numbers to quantize
+_NUMERIC_KEYS = {"x", "y", "z", "base", "width", "customdata", "size", "text", "values", "r", "theta",
+                 "lat", "lon", "open", "high", "low", "close", "error_x", "error_y", "array", "arrayminus"}
+
+_stats = {}
+_stats_lock = threading.Lock()
+# Figure key -> (figure to send, bytes sent, bytes before compaction)
+_figure_payloads = OrderedDict()
+# Table name -> (content key, bytes sent, bytes before compaction)
+_table_sizes = {}
+
+
+def quantize(values, digits=FLOAT_DIGITS):
+    """Rounds floats to `digits` significant digits; other values are returned unchanged."""
+    array = np.asarray(values)
+    if array.dtype.kind != "f":
+        return values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.where(np.isfinite(array) & (array != 0), np.floor(np.log10(np.abs(array))), 0)
+        scale = 10.0 ** (digits - 1 - magnitude)
+        rounded = np.where(np.isfinite(array), np.round(array * scale) / scale, array)
+    if rounded.ndim == 1 and len(rounded) <= SHORT_ARRAY:
+        return [None if np.isnan(v) else float(f"{v:.{digits}g}") for v in rounded.tolist()]
+    return rounded.astype(np.float32)
+
+
+def _short_dates(values):
+    # Monthly and daily series are sent as "2024-01-01" rather than "2024-01-01T00:00:00.000000000"
+    days = values.astype("datetime64[D]")
+    if (days == values).all():
+        return np.datetime_as_string(days).astype(object)
+    return values
+
+
+def _decode(value):
+    # Plotly 6 serializes numpy arrays as {"dtype": ..., "bdata": ...}; figures loaded
+    # back from JSON (the figure cache, the bundle) hold them in that form
+    if isinstance(value, dict) and "bdata" in value and "dtype" in value:
+        import base64
+
+        array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"])
+        if "shape" not in value:
+            return array
+        # 2D arrays (heatmap z) carry their shape as "rows, columns"
+        shape = value["shape"]
+        return array.reshape([int(n) for n in shape.split(",")] if isinstance(shape, str) else shape)
+    return value
+
+
+def _compact_trace(trace, digits):
+    for key, value in trace.items():
+        value = _decode(value)
+        if isinstance(value, dict):
+            _compact_trace(value, digits)
+        elif key in _NUMERIC_KEYS and isinstance(value, np.ndarray) and value.dtype.kind == "M":
+            trace[key] = _short_dates(value)
+        elif key in _NUMERIC_KEYS and isinstance(value, (list, tuple, np.ndarray)):
+            trace[key] = quantize(value, digits)
+        elif isinstance(value, float):
+            trace[key] = float(f"{value:.{digits}g}")
+
+
+def compact_template(template, trace_types, colorscales=False):
+    """
+    Keeps the parts of a template (as a dict) that a figure with `trace_types` uses.
+
+    Args:
+        template (dict): e.g. `fig.layout.template.to_plotly_json()`.
+        trace_types (set): The figure's trace types, e.g. {"bar"}.
+        colorscales (bool): Whether the figure uses continuous color scales.
+    """
+    unused = set(_UNUSED_LAYOUT)
+    if not colorscales:
+        unused |= {"colorscale", "coloraxis"}
+    layout = {key: value for key, value in template.get("layout", {}).items() if key not in unused}
+    data = {key: value for key, value in template.get("data", {}).items() if key in trace_types}
+    return {"data": data, "layout": layout}
+
+
+def compact_figure(fig, digits=FLOAT_DIGITS):
+    """Returns a copy of `fig` with quantized numbers and a template trimmed to what it uses."""
+    import plotly.graph_objects as go
+
+    spec = fig.to_plotly_json()
+    for trace in spec["data"]:
+        _compact_trace(trace, digits)
+    template = spec["layout"].get("template")
+    if template:
+        trace_types = {trace.get("type", "scatter") for trace in spec["data"]}
+        colorscales = "coloraxis" in spec["layout"] or any(
+            "colorscale" in trace or "colorscale" in trace.get("marker", {}) for trace in spec["data"])
+        spec["layout"]["template"] = compact_template(template, trace_types, colorscales)
+    return go.Figure(spec, _validate=False)
+
+
+def compact_table(df, decimals=TABLE_DECIMALS):
+    """
+    Returns `df` with float columns rounded to `decimals`.
+
+    Columns whose values stay below 1000 are stored as float32, whose 7 significant
+    digits still hold every displayed decimal.
+    """
+    floats = [column for column in df.columns if df[column].dtype.kind == "f"]
+    if not floats:
+        return df
+    columns = {}
+    for column in floats:
+        values = np.round(df[column].to_numpy(), decimals)
+        small = np.nanmax(np.abs(values), initial=0) < 1000
+        columns[column] = values.astype(np.float32) if small else values
+    return df.assign(**columns)
+
+
+def _record(name, kind, sent, original):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {"kind": kind, "renders": 0, "bytes": 0, "original_bytes": 0})
+        stats["renders"] += 1
+        stats["bytes"] = sent
+        stats["original_bytes"] = original
+
+
+def _figure_payload(fig):
+    import plotly.io as pio
+
+    original = len(pio.to_json(fig, validate=False))
+    if not COMPACT:
+        return fig, original, original
+    fig = compact_figure(fig)
+    return fig, len(pio.to_json(fig, validate=False)), original
+
+
+def plotly_chart(fig, name, container=None, **kwargs):
+    """
+    Sends a figure with `st.plotly_chart`, compacted, and records its size.
+
+    Args:
+        fig (go.Figure): The figure.
+        name (str): The chart's name in `payload_info()`.
+        container: A Streamlit container or column; `st` by default.
+        **kwargs: Passed to `plotly_chart`.
+    """
+    import streamlit as st
+
+    # Set by plots.cached_figure and bundle.get_figure; the figure is unchanged since
+    key = getattr(fig, "_figure_key", None)
+    payload = None
+    if key is not None:
+        with _stats_lock:
+            payload = _figure_payloads.get(key)
+            if payload is not None:
+                _figure_payloads.move_to_end(key)
+    if payload is None:
+        payload = _figure_payload(fig)
+        if key is not None:
+            with _stats_lock:
+                _figure_payloads[key] = payload
+                while len(_figure_payloads) > PAYLOAD_CACHE_SIZE:
+                    _figure_payloads.popitem(last=False)
+    # The cached figure is shared by sessions; Streamlit only reads it
+    fig, sent, original = payload
+    _record(name, "figure", sent, original)
+    return (container or st).plotly_chart(fig, **kwargs)
+
+
+def dataframe(df, name, container=None, **kwargs):
+    """Sends a table with `st.dataframe`, compacted, and records its Arrow size."""
+    import streamlit as st
+    from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
+
+    if COMPACT:
+        compacted = compact_table(df)
+    # A version tag or content hash; hashing is much cheaper than serializing twice
+    content = frame_key(df)
+    with _stats_lock:
+        sizes = _table_sizes.get(name)
+    if sizes is None or sizes[0] != content:
+        original = len(convert_pandas_df_to_arrow_bytes(df))
+        sent = len(convert_pandas_df_to_arrow_bytes(compacted)) if COMPACT else original
+        sizes = (content, sent, original)
+        with _stats_lock:
+            _table_sizes[name] = sizes
+    _record(name, "table", sizes[1], sizes[2])
+    return (container or st).dataframe(compacted if COMPACT else df, **kwargs)
+
+
+def payload_info():
+    """Returns, per chart and table, its kind, renders and the bytes of its last render (and before compaction)."""
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def clear_payload_info():
+    with _stats_lock:
+        _stats.clear()
+        _figure_payloads.clear()
+        _table_sizes.clear()
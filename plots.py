@@ -1,13 +1,141 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import functools
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
-import seaborn as sns
-import plotly.express as px
+import pandas as pd
+# plotly.express takes a few hundred milliseconds to import, so the plotting
+# functions import it themselves; it is only needed on a figure cache miss.
 import plotly.graph_objects as go
 
+import snapshots
+from confidence import CONFIDENCE, error_bars, rate_table, with_intervals
+from dimensions import coverage_facts
+from rollups import rollup_cube
+from timeseries import DEFAULT_POINTS, coverage_series
+from urgency import QUADRANTS, urgency_model
+
+# Normalization options offered by the quantitative page, default first
+NORMALIZATIONS = ("per_day", "per_funding", "per_people", "raw")
+
+# Figures are cached per worker process (and therefore shared by every session)
+# as serialized JSON, keyed on the function, the version of its input data and
+# its remaining arguments.
+FIGURE_CACHE_SIZE = int(os.environ.get("IML_FIGURE_CACHE_SIZE", 256))
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+_figure_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _cache_key_part(value):
+    if isinstance(value, pd.DataFrame):
+        return _data_version(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key_part(v) for v in value)
+    # Datasets derived from loaded frames (e.g. OutletSimilarity) carry the versions of their inputs
+    version = getattr(value, "version", None)
+    if version is not None:
+        return (type(value).__name__, version)
+    return value
+
+
+def _data_version(df):
+    # Frames from loaders.py carry a version tag; the index hash tells apart
+    # different subsets (e.g. one outlet's rows) of the same file.
+    index_hash = int(pd.util.hash_pandas_object(df.index).sum())
+    version = df.attrs.get("version")
+    if version is None:
+        version = int(pd.util.hash_pandas_object(df, index=False).sum())
+    return (version, tuple(df.columns), index_hash)
+
+
+def cached_figure(func):
+    """
+    Memoizes a plotting function on (function, data version, other arguments).
+
+    Each call returns a fresh `go.Figure` tagged with its cache key, which lets
+    `payloads.plotly_chart` reuse the figure's compacted payload. Callers that
+    update the figure should send a copy (`go.Figure(fig)`), which is untagged.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__,) + tuple(
+            (name, _cache_key_part(value)) for name, value in bound.arguments.items()
+        )
+
+        with _figure_cache_lock:
+            payload = _figure_cache.get(key)
+            if payload is not None:
+                _figure_cache.move_to_end(key)
+                _figure_cache_stats["hits"] += 1
+            else:
+                _figure_cache_stats["misses"] += 1
 
+        if payload is None:
+            fig = func(*args, **kwargs)
+            payload = "null" if fig is None else fig.to_json()
+            with _figure_cache_lock:
+                _figure_cache[key] = payload
+                while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                    _figure_cache.popitem(last=False)
+                    _figure_cache_stats["evictions"] += 1
+        elif payload == "null":
+            return None
+        else:
+            # The payload was produced by a validated figure, so validation can be skipped
+            fig = go.Figure(json.loads(payload), _validate=False)
+        if fig is not None:
+            fig._figure_key = key
+        return fig
 
+    return wrapper
+
+
+def figure_cache_info():
+    """Returns hit/miss/eviction counters and the number of cached figures."""
+    with _figure_cache_lock:
+        return dict(_figure_cache_stats, entries=len(_figure_cache), max_entries=FIGURE_CACHE_SIZE)
+
+
+def clear_figure_cache():
+    with _figure_cache_lock:
+        _figure_cache.clear()
+
+
+def _key_tags(part):
+    # Every string in a (nested) cache key, which includes the version tags of its inputs
+    if isinstance(part, str):
+        yield part
+    elif isinstance(part, tuple):
+        for item in part:
+            yield from _key_tags(item)
+
+
+def invalidate_figures(stale):
+    """Drops the cached figures drawn from an input whose version tag is in `stale`."""
+    with _figure_cache_lock:
+        dropped = [key for key in _figure_cache if any(snapshots.is_stale(tag, stale) for tag in _key_tags(key))]
+        for key in dropped:
+            del _figure_cache[key]
+    return len(dropped)
+
+
+# After a snapshot swap, figures of files that did not change stay cached
+snapshots.add_listener(lambda changed, old, new: invalidate_figures(snapshots.stale_versions(changed, old)))
+
+
+@cached_figure
 def plot_coverage(df, normalization="per_day"):
+    import plotly.express as px
+
     normalization_map = {
         "raw": "raw_coverage",
         "per_day": "coverage_per_day",
@@ -40,7 +168,10 @@ def plot_coverage(df, normalization="per_day"):
     return fig
 
 
+@cached_figure
 def plot_interactive_grouped_coverage_by_country(df, normalization="per_day"):
+    import plotly.express as px
+
     normalization_map = {
         "raw": "raw_coverage",
         "per_day": "coverage_per_day",
@@ -73,8 +204,11 @@ def plot_interactive_grouped_coverage_by_country(df, normalization="per_day"):
 
     return fig
 
+@cached_figure
 def plot_monthly_crisis_coverage(monthly_coverage_df):
-    monthly_coverage_df["year_month"] = monthly_coverage_df["year_month"].astype(str)
+    import plotly.express as px
+
+    monthly_coverage_df = monthly_coverage_df.assign(year_month=monthly_coverage_df["year_month"].astype(str))
     fig = px.line(monthly_coverage_df, 
                   x="year_month", 
                   y="coverage_count", 
@@ -93,21 +227,53 @@ def plot_monthly_crisis_coverage(monthly_coverage_df):
 
     return fig
 
+@cached_figure
+def plot_coverage_timeseries(coverage_df, max_points=DEFAULT_POINTS, start=None, end=None, time_column="year_month"):
+    """
+    Plots coverage over time per crisis with WebGL traces, downsampled on the server.
+
+    Args:
+        coverage_df (pd.DataFrame): One row per crisis and period, with `time_column` and coverage_count.
+        max_points (int): Points drawn per crisis; longer series are reduced with LTTB.
+        start, end (str): Optional window (inclusive) to zoom into; None for the full history.
+        time_column (str): The period column, e.g. "year_month" or a daily "date".
+    """
+    series = coverage_series(coverage_df, time_column).downsample(max_points, start, end)
+
+    fig = go.Figure([
+        go.Scattergl(x=times, y=counts, mode="lines", name=crisis, legendgroup=crisis)
+        for crisis, (times, counts) in series.items() if len(times)
+    ])
+    monthly = time_column == "year_month"
+    fig.update_layout(
+        title="Monthly Crisis Coverage" if monthly else "Crisis Coverage Over Time",
+        xaxis_title="Month" if monthly else "Date",
+        yaxis_title="Coverage Count",
+        legend_title_text="crisis_name",
+        template="plotly_dark",
+        showlegend=True
+    )
+
+    return fig
+
+@cached_figure
 def plot_spider_chart(coverage_df, outlet_name, normalization="per_day"):
     normalization_map = {
-        "raw": "raw_coverage",
+        "raw": "coverage_count",
         "per_day": "coverage_per_day",
         "per_funding": "coverage_per_funding",
         "per_people": "coverage_per_people",
     }
     column = normalization_map[normalization]
     
-    # Sort the dataframe by the specified coverage column
-    sorted_df = coverage_df.sort_values(by=column, ascending=False).reset_index()
-    outlet_data = sorted_df[sorted_df['matched_outlet'] == outlet_name]
-    
-    # Sort the data to ensure we have a consistent order (e.g., based on crisis_name)
-    outlet_data = outlet_data.sort_values('crisis_name')
+    # The outlet's rows are a contiguous block of the integer-coded fact table,
+    # already ordered by crisis_name
+    facts = coverage_facts(coverage_df)
+    rows = facts.outlet_rows(outlet_name)
+    outlet_data = pd.DataFrame({
+        "crisis_name": facts.crises[facts.crisis_codes[rows]],
+        column: facts.values(column, rows),
+    })
 
     # Prepare the data for the Bar Chart
     categories = outlet_data['crisis_name'].tolist()  # List of crises
@@ -134,40 +300,75 @@ def plot_spider_chart(coverage_df, outlet_name, normalization="per_day"):
     return fig
 
 
-def plot_crisis_coverage_vs_urgency(df):
-    # Normalize the data for consistency in scale
-    df['normalized_coverage'] = df['coverage_count'] / df['coverage_count'].max()
-    df['normalized_fund'] = df['fund_required'] / df['fund_required'].max()
-    df['normalized_people'] = df['people_affected'] / df['people_affected'].max()
-
-    # Combine fund_required and people_affected to get urgency
-    df['normalized_urgency'] = (df['normalized_fund'] + df['normalized_people']) / 2
-    
-    # Create the scatter plot
-    fig = px.scatter(df, 
-                     x='normalized_coverage', 
-                     y='normalized_fund', 
-                     color='crisis_name', 
-                     hover_name='crisis_name', 
-                     size='coverage_count', 
-                     size_max=20, 
-                     title="Crisis Attention vs. Humanitarian Urgency",
-                     labels={'normalized_coverage': 'Normalized Media Coverage', 
-                             'normalized_fund': 'Normalized Urgency'},
-                     template='plotly_dark')
-    
+@cached_figure
+def plot_crisis_coverage_vs_urgency(df, fund_weight=0.5, people_weight=0.5, fund_required=None,
+                                    people_affected=None, normalization="raw"):
+    """
+    Plots each crisis' media attention against its humanitarian urgency.
+
+    Args:
+        df (pd.DataFrame): chart5_attention_vs_urgency.csv; it is not modified.
+        fund_weight, people_weight (float): Weights of funding required and people affected in urgency.
+        fund_required, people_affected (tuple): Optional per-crisis scenario values, in the order of the file.
+        normalization (str): Coverage measure on the attention axis (see NORMALIZATIONS).
+    """
+    model = urgency_model(df)
+    scenario = model.evaluate(fund_weight, people_weight, fund_required, people_affected, normalization)
+
+    # One trace per crisis, sized by coverage count like the other charts' bubbles
+    size_ref = 2.0 * model.coverage.max() / 20 ** 2
+    fig = go.Figure([
+        go.Scatter(
+            x=[scenario["attention"][i]], y=[scenario["urgency"][i]], mode="markers", name=crisis,
+            marker=dict(size=[model.coverage[i]], sizemode="area", sizeref=size_ref, sizemin=4),
+            hovertemplate=(f"<b>{crisis}</b><br>Attention: %{{x:.3f}}<br>Urgency: %{{y:.3f}}"
+                           f"<br>{QUADRANTS[scenario['quadrant'][i]]}<extra></extra>"),
+        )
+        for i, crisis in enumerate(model.crises)
+    ])
+
     # Add quadrant lines
     fig.add_vline(x=0.5, line=dict(color="gray", dash="dash"))
     fig.add_hline(y=0.5, line=dict(color="gray", dash="dash"))
 
     fig.update_layout(
-        xaxis_title="Media Coverage (Normalized)",
+        title="Crisis Attention vs. Humanitarian Urgency",
+        xaxis_title=f"Media Coverage (Normalized, {normalization.replace('_', ' ')})",
         yaxis_title="Urgency (Normalized)",
+        legend_title_text="crisis_name",
+        template="plotly_dark",
         showlegend=True
     )
 
     return fig
 
+@cached_figure
+def plot_urgency_sensitivity(df, fund_required=None, people_affected=None, normalization="raw", steps=21):
+    """
+    Plots each crisis' urgency as the weight moves from people affected (0) to funding required (1).
+
+    The points where a crisis crosses the dashed line are the weightings at which it changes quadrant.
+    """
+    model = urgency_model(df)
+    fund_weights, sweep = model.weight_sweep(
+        steps, fund_required=fund_required, people_affected=people_affected, normalization=normalization)
+
+    fig = go.Figure([
+        go.Scatter(x=fund_weights, y=sweep["urgency"][:, i], mode="lines", name=crisis)
+        for i, crisis in enumerate(model.crises)
+    ])
+    fig.add_hline(y=0.5, line=dict(color="gray", dash="dash"))
+    fig.update_layout(
+        title="Urgency Sensitivity to the Funding Weight",
+        xaxis_title="Weight of Funding Required (1 - weight of People Affected)",
+        yaxis_title="Urgency (Normalized)",
+        legend_title_text="crisis_name",
+        template="plotly_dark",
+    )
+
+    return fig
+
+@cached_figure
 def plot_coverage_by_disposition(df, outlets_df, disposition, normalization="per_day"):
     """
     Plots coverage per crisis filtered by media disposition.
@@ -181,7 +382,8 @@ def plot_coverage_by_disposition(df, outlets_df, disposition, normalization="per
             - "per_funding" (coverage per required funding)
             - "per_people" (coverage per affected people)
     """
-    
+    import plotly.express as px
+
     # Define normalization mapping
     normalization_map = {
         "raw": "coverage_count",
@@ -197,15 +399,16 @@ def plot_coverage_by_disposition(df, outlets_df, disposition, normalization="per
     # Select the correct column
     column = normalization_map[normalization]
     
-    # Filter dataframe by disposition
-    filtered_df = df[df["matched_outlet"].isin(outlets_df[outlets_df["disposition"] == disposition]["outlet_name"])]
+    # Outlets of one disposition have consecutive codes, so their rows are one contiguous block
+    facts = coverage_facts(df, outlets_df)
+    rows = facts.disposition_rows(disposition)
     
-    if filtered_df.empty:
+    if rows.start == rows.stop:
         print(f"No data available for disposition: {disposition}")
         return
     
     # Sort by coverage for better visualization
-    sorted_df = filtered_df.groupby("crisis_name")[column].sum().reset_index()
+    sorted_df = facts.crisis_totals(rows, column)
     sorted_df = sorted_df.sort_values(by=column, ascending=False)
     
     # Plot using Plotly
@@ -227,4 +430,260 @@ def plot_coverage_by_disposition(df, outlets_df, disposition, normalization="per
         margin=dict(r=100)  # Space for legend
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+
+# Charts on the qualitative page (Step 3), shared with prerender.py
+ASSOCIATION_CHARTS = [
+    (["Putin", "Netanyahu"], "human_rights", "Human Rights: Putin vs. Netanyahu"),
+    (["Putin", "Zelensky"], "human_rights", "Human Rights: Putin vs. Zelensky"),
+    (["Putin", "Netanyahu"], "casualties", "Casualties: Putin vs. Netanyahu"),
+    (["Putin", "Zelensky"], "casualties", "Casualties: Putin vs. Zelensky"),
+    (["Netanyahu", "Hamas"], "human_rights", "Human Rights: Netanyahu vs. Hamas"),
+    (["Netanyahu", "Hamas"], "casualties", "Casualties: Netanyahu vs. Hamas"),
+]
+FRAMING_CHARTS = [
+    ("Ukraine", "Framing Narrative: Ukraine"),
+    ("Gaza and the Occupied Palestinian Territories", "Framing Narrative: Gaza"),
+]
+SENTIMENT_TITLE = "Comparative Sentiment: Leaders"
+VICTIM_CAUSOR_CHARTS = [
+    ("victim", "Victim Framing (Q7)"),
+    ("causor", "Conflict Cause Framing (Q8)"),
+]
+
+
+# Hover labels of the confidence interval bounds on the per-article charts
+INTERVAL_LABELS = {"ci_lower": f"{CONFIDENCE:.0%} CI low", "ci_upper": f"{CONFIDENCE:.0%} CI high"}
+
+
+def _interval_options(plot_df):
+    # Error bars and hover values of the confidence intervals, for px.bar
+    upper, lower = error_bars(plot_df)
+    return dict(error_y=upper, error_y_minus=lower, hover_data={"ci_lower": ":.3f", "ci_upper": ":.3f"})
+
+
+# Function to plot associations (human rights or casualties)
+@cached_figure
+def plot_associations(df, figures, assoc_type, title, outlet):
+    import plotly.express as px
+
+    if outlet == "All Outlets":
+        # Total mentions over total articles across outlets, from the precomputed rollup cube
+        df = with_intervals(rollup_cube(df, "associations").query())
+    else:
+        # Intervals of every outlet's rates are computed together, once per version of the file
+        df = rate_table(df, "associations")
+        df = df[df["outlet"] == outlet]
+    plot_df = df[(df["figure"].isin(figures)) & (df["assoc_type"] == assoc_type)]
+    
+    if plot_df.empty:
+        return None
+    
+    fig = px.bar(
+        plot_df,
+        x="figure",
+        y="mentions_per_article",
+        color="figure",
+        title=title,
+        labels={"figure": "Figure", "mentions_per_article": f"{assoc_type.capitalize()} Mentions per Article",
+                **INTERVAL_LABELS},
+        text=plot_df["mentions_per_article"].round(2).astype(str),
+        **_interval_options(plot_df)
+    )
+    fig.update_layout(
+        xaxis_title="Figure",
+        yaxis_title=f"{assoc_type.capitalize()} Mentions per Article",
+        legend_title="Figure",
+        showlegend=False,
+        margin=dict(r=100)
+    )
+    fig.update_traces(textposition="auto")
+    return fig
+
+
+# Function to plot framing by crisis
+@cached_figure
+def plot_framing(df, crisis_name, title, outlet):
+    import plotly.express as px
+
+    if outlet == "All Outlets":
+        # Total mentions over total articles across outlets, from the precomputed rollup cube
+        df = with_intervals(rollup_cube(df, "framing").query())
+    else:
+        # Intervals of every outlet's rates are computed together, once per version of the file
+        df = rate_table(df, "framing")
+        df = df[df["outlet"] == outlet]
+    plot_df = df[df["crisis_name"] == crisis_name].sort_values("mentions_per_article", ascending=False)
+    
+    if plot_df.empty:
+        return None
+    
+    fig = px.bar(
+        plot_df,
+        x="framing",
+        y="mentions_per_article",
+        color="framing",
+        title=title,
+        labels={"framing": "Framing Type", "mentions_per_article": "Mentions per Article", **INTERVAL_LABELS},
+        text=plot_df["mentions_per_article"].round(2).astype(str),
+        **_interval_options(plot_df)
+    )
+    fig.update_layout(
+        xaxis_title="Framing Type",
+        yaxis_title="Mentions per Article",
+        legend_title="Framing",
+        showlegend=False,
+        xaxis_tickangle=45,
+        margin=dict(r=100)
+    )
+    fig.update_traces(textposition="auto")
+    return fig
+
+
+# Function to plot sentiment for leaders
+@cached_figure
+def plot_sentiment(df, title, outlet):
+    import plotly.express as px
+
+    if outlet == "All Outlets":
+        # Total mentions over total articles across outlets, from the precomputed rollup cube
+        df = with_intervals(rollup_cube(df, "sentiment").query())
+    else:
+        # Intervals of every outlet's rates are computed together, once per version of the file
+        df = rate_table(df, "sentiment")
+        df = df[df["outlet"] == outlet]
+    if df.empty:
+        return None
+    
+    color_map = {"positive": "#00FF00", "neutral": "#808080", "negative": "#FF0000"}
+    
+    fig = px.bar(
+        df,
+        x="entity",
+        y="mentions_per_article",
+        color="sentiment",
+        title=title,
+        labels={"entity": "Leader", "mentions_per_article": "Mentions per Article", "sentiment": "Sentiment",
+                **INTERVAL_LABELS},
+        category_orders={"sentiment": ["positive", "neutral", "negative"]},
+        text=df["mentions_per_article"].round(2).astype(str),
+        color_discrete_map=color_map,
+        **_interval_options(df)
+    )
+    fig.update_layout(
+        xaxis_title="Leader",
+        yaxis_title="Mentions per Article",
+        legend_title="Sentiment",
+        xaxis_tickangle=45,
+        barmode="stack",
+        margin=dict(r=100)
+    )
+    fig.update_traces(textposition="inside")
+    return fig
+
+
+# Function to plot victim/causor framing
+@cached_figure
+def plot_victim_causor(df, framing_type, title, outlet):
+    import plotly.express as px
+
+    if outlet == "All Outlets":
+        # Total mentions over total articles across outlets, from the precomputed rollup cube
+        df = rollup_cube(df, "victim_causor").query()
+    else:
+        df = df[df["outlet"] == outlet]
+    plot_df = df[df["framing_type"] == framing_type]
+    
+    if plot_df.empty:
+        return None
+    
+    fig = px.bar(
+        plot_df,
+        x="group",
+        y="mentions_per_article",
+        color="group",
+        title=title,
+        labels={"group": "Group", "mentions_per_article": "Mentions per Article"},
+        text=plot_df["mentions_per_article"].round(2).astype(str)
+    )
+    fig.update_layout(
+        xaxis_title="Group",
+        yaxis_title="Mentions per Article",
+        legend_title="Group",
+        showlegend=False,
+        xaxis_tickangle=45,
+        margin=dict(r=100)
+    )
+    fig.update_traces(textposition="auto")
+    return fig
+
+
+@cached_figure
+def plot_outlet_similarity(similarity, clusters=None):
+    """
+    Plots the cosine similarity of every pair of outlets, in dendrogram order.
+
+    Args:
+        similarity (OutletSimilarity): As returned by `similarity.outlet_similarity`.
+        clusters (int): If given, outlines the clusters of a cut of the tree into this many clusters.
+    """
+    order = similarity.order
+    names = [similarity.outlets[i] for i in order]
+    fig = go.Figure(go.Heatmap(
+        z=similarity.similarity[np.ix_(order, order)],
+        x=names,
+        y=names,
+        zmin=0,
+        zmax=1,
+        colorscale="Viridis",
+        colorbar=dict(title="Similarity"),
+        hovertemplate="%{y} / %{x}<br>Similarity: %{z:.3f}<extra></extra>",
+    ))
+    if clusters:
+        # Clusters are numbered in dendrogram order, so each one is a square on the diagonal
+        labels = similarity.clusters(clusters).to_numpy()[order]
+        edges = np.flatnonzero(np.diff(labels)) + 1
+        for start, stop in zip(np.concatenate([[0], edges]), np.concatenate([edges, [len(labels)]])):
+            fig.add_shape(type="rect", x0=start - 0.5, x1=stop - 0.5, y0=start - 0.5, y1=stop - 0.5,
+                          line=dict(color="white", width=2))
+    fig.update_layout(
+        title="Outlet Similarity (Frames, Framing and Keywords)",
+        xaxis=dict(tickangle=45),
+        yaxis=dict(autorange="reversed"),
+        height=max(500, 14 * len(names)),
+    )
+    return fig
+
+
+@cached_figure
+def plot_outlet_dendrogram(similarity):
+    """Plots the average-linkage clustering of outlets by the distance (1 - similarity) of their profiles."""
+    linkage = similarity.linkage
+    n = len(similarity.outlets)
+    if n < 2:
+        return None
+
+    # Leaves sit at 0, 1, ... in dendrogram order; a merged cluster sits between its two children
+    positions = np.empty(2 * n - 1)
+    positions[similarity.order] = np.arange(n)
+    heights = np.zeros(2 * n - 1)
+    for i, (left, right, distance, _) in enumerate(linkage):
+        positions[n + i] = (positions[int(left)] + positions[int(right)]) / 2
+        heights[n + i] = distance
+
+    # One U per merge, separated by gaps, all in a single trace
+    left, right = linkage[:, 0].astype(int), linkage[:, 1].astype(int)
+    gap = np.full(len(linkage), np.nan)
+    x = np.column_stack([positions[left], positions[left], positions[right], positions[right], gap]).ravel()
+    y = np.column_stack([heights[left], linkage[:, 2], linkage[:, 2], heights[right], gap]).ravel()
+
+    fig = go.Figure(go.Scatter(x=x, y=y, mode="lines", line=dict(width=1.5), hoverinfo="skip"))
+    fig.update_layout(
+        title="Outlet Clustering (Average Linkage)",
+        xaxis=dict(tickmode="array", tickvals=np.arange(n), ticktext=[similarity.outlets[i] for i in similarity.order],
+                   tickangle=45),
+        yaxis_title="Distance (1 - Cosine Similarity)",
+        showlegend=False,
+    )
+    return fig
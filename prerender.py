@@ -0,0 +1,207 @@
+"""
+Pre-renders every chart and table the dashboard's selectboxes can produce.
+
+Each view is written as JSON (read by the Streamlit pages through `bundle.py`)
+and as standalone HTML, together with a manifest and an index page, so the
+bundle can also be served by a plain static file server.
+
+Usage:
+    python prerender.py [--out bundle] [--workers 4]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bundle
+import loaders
+import snapshots
+from frame_table import FRAME_FILES, load_frame_table
+from keywords import ALL_OUTLETS, keyword_tables, outlet_keywords
+from loaders import load_csv, load_keyword_summary, load_records
+from plots import (ASSOCIATION_CHARTS, FRAMING_CHARTS, NORMALIZATIONS,
+                   SENTIMENT_TITLE, VICTIM_CAUSOR_CHARTS, plot_associations,
+                   plot_coverage, plot_coverage_by_disposition, plot_framing,
+                   plot_coverage_timeseries,
+                   plot_interactive_grouped_coverage_by_country,
+                   plot_sentiment, plot_spider_chart, plot_victim_causor)
+
+KEYWORDS_FILE = "pillar2/crisis_keyword_summary_with_outlets.csv"
+# Results files the views are rendered from; the manifest records their content hashes
+INPUT_FILES = [
+    "chart1_overall_coverage_bar.csv", "chart2_coverage_by_country.csv", "chart3_monthly_coverage.csv",
+    "chart4_spider_chart.csv", "chart6_coverage_by_disposition.csv", "outlets.csv", KEYWORDS_FILE,
+    "pillar2/associations_per_article.json", "pillar2/framing_per_article.json",
+    "pillar2/sentiment_per_article.json", "pillar2/victim_causor_per_article.json", *FRAME_FILES.values(),
+]
+# Rendered bundles kept besides the one in use, for sessions still reading them
+KEEP_BUILDS = 1
+
+
+def _figure(func, *args, **kwargs):
+    return bundle.figure_key(func, *args, **kwargs), "figure", func(*args, **kwargs)
+
+
+def _quantitative(view, normalization=None, outlet=None, disposition=None):
+    if view == "coverage":
+        return _figure(plot_coverage, load_csv("chart1_overall_coverage_bar.csv"), normalization=normalization)
+    if view == "coverage_by_country":
+        df = load_csv("chart2_coverage_by_country.csv")
+        return _figure(plot_interactive_grouped_coverage_by_country, df, normalization=normalization)
+    if view == "monthly_coverage":
+        return _figure(plot_coverage_timeseries, load_csv("chart3_monthly_coverage.csv"))
+    if view == "outlet_focus":
+        df = load_csv("chart4_spider_chart.csv")
+        return _figure(plot_spider_chart, df, outlet, normalization)
+    if view == "disposition":
+        df, outlets_df = load_csv("chart6_coverage_by_disposition.csv"), load_csv("outlets.csv")
+        return _figure(plot_coverage_by_disposition, df, outlets_df, disposition, normalization=normalization)
+    raise ValueError(f"Unknown quantitative view: {view}")
+
+
+def _qualitative(view, outlet, **params):
+    if view == "keyword_tables":
+        selected = outlet_keywords(load_keyword_summary(KEYWORDS_FILE), outlet)
+        return bundle.view_key(view, outlet=outlet, **params), "tables", keyword_tables(selected, params["crisis"])
+    if view == "frame_percentages":
+        table = load_frame_table().percentages(outlet, params["crisis"], params["attribute"])
+        return bundle.view_key(view, outlet=outlet, **params), "tables", {"table": table}
+    if view == "associations":
+        figures, assoc_type, title = ASSOCIATION_CHARTS[params["chart"]]
+        df = load_records("pillar2/associations_per_article.json")
+        return _figure(plot_associations, df, figures, assoc_type, title, outlet)
+    if view == "framing":
+        crisis_name, title = FRAMING_CHARTS[params["chart"]]
+        return _figure(plot_framing, load_records("pillar2/framing_per_article.json"), crisis_name, title, outlet)
+    if view == "sentiment":
+        return _figure(plot_sentiment, load_records("pillar2/sentiment_per_article.json"), SENTIMENT_TITLE, outlet)
+    if view == "victim_causor":
+        framing_type, title = VICTIM_CAUSOR_CHARTS[params["chart"]]
+        df = load_records("pillar2/victim_causor_per_article.json")
+        return _figure(plot_victim_causor, df, framing_type, title, outlet)
+    raise ValueError(f"Unknown qualitative view: {view}")
+
+
+def enumerate_views():
+    """Returns every (page, params) combination reachable from the pages' selectboxes."""
+    outlets = load_csv("chart4_spider_chart.csv")['matched_outlet'].unique().tolist()
+    dispositions = load_csv("outlets.csv")['disposition'].unique().tolist()
+    tasks = [("quantitative", {"view": "monthly_coverage"})]
+    for normalization in NORMALIZATIONS:
+        tasks.append(("quantitative", {"view": "coverage", "normalization": normalization}))
+        tasks.append(("quantitative", {"view": "coverage_by_country", "normalization": normalization}))
+        tasks += [("quantitative", {"view": "outlet_focus", "normalization": normalization, "outlet": outlet})
+                  for outlet in outlets]
+        tasks += [("quantitative", {"view": "disposition", "normalization": normalization, "disposition": disposition})
+                  for disposition in dispositions]
+
+    keywords = load_keyword_summary(KEYWORDS_FILE)
+    qualitative_outlets = list(dict.fromkeys([ALL_OUTLETS] + sorted(keywords['outlet'].unique().tolist())))
+    crises = keywords['crisis_name'].unique().tolist()
+    frame_data = load_frame_table().data
+    frame_crises = frame_data.index.get_level_values("crisis_name").unique().tolist()
+    attributes = frame_data.index.get_level_values("attribute").unique().tolist()
+    for outlet in qualitative_outlets:
+        tasks += [("qualitative", {"view": "keyword_tables", "outlet": outlet, "crisis": crisis}) for crisis in crises]
+        tasks += [("qualitative", {"view": "frame_percentages", "outlet": outlet, "crisis": crisis, "attribute": attribute})
+                  for crisis in frame_crises for attribute in attributes]
+        tasks += [("qualitative", {"view": "associations", "outlet": outlet, "chart": i}) for i in range(len(ASSOCIATION_CHARTS))]
+        tasks += [("qualitative", {"view": "framing", "outlet": outlet, "chart": i}) for i in range(len(FRAMING_CHARTS))]
+        tasks.append(("qualitative", {"view": "sentiment", "outlet": outlet}))
+        tasks += [("qualitative", {"view": "victim_causor", "outlet": outlet, "chart": i}) for i in range(len(VICTIM_CAUSOR_CHARTS))]
+    return tasks
+
+
+def _write(out_dir, relpath, text):
+    path = os.path.join(out_dir, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _render_batch(tasks, out_dir, build):
+    entries = {}
+    for page, params in tasks:
+        render = _quantitative if page == "quantitative" else _qualitative
+        key, kind, value = render(**params)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        entry = {"page": page, "kind": kind, "empty": value is None}
+        if kind == "figure" and value is not None:
+            entry["json"], entry["html"] = f"{build}/figures/{name}.json", f"{build}/figures/{name}.html"
+            _write(out_dir, entry["json"], value.to_json())
+            _write(out_dir, entry["html"], value.to_html(full_html=True, include_plotlyjs="cdn"))
+        elif kind == "tables" and value is not None:
+            entry["json"], entry["html"] = f"{build}/tables/{name}.json", f"{build}/tables/{name}.html"
+            _write(out_dir, entry["json"], json.dumps(
+                {table_name: json.loads(table.to_json(orient="split", index=False)) for table_name, table in value.items()}))
+            _write(out_dir, entry["html"], "\n".join(
+                f"<h3>{table_name}</h3>\n{table.to_html(index=False)}" for table_name, table in value.items()))
+        entries[key] = entry
+    return entries
+
+
+def _index_html(views):
+    links = "\n".join(
+        f'<li><a href="{entry["html"]}">{key}</a></li>' for key, entry in sorted(views.items()) if not entry["empty"]
+    )
+    return f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Dashboard bundle</title></head>\n<body><ul>\n{links}\n</ul></body></html>\n"
+
+
+def prerender(out_dir=bundle.BUNDLE_DIR, workers=None, batch_size=50):
+    """
+    Renders every view into a static bundle.
+
+    Args:
+        out_dir (str): Directory the bundle is written to.
+        workers (int): Number of worker processes (defaults to the CPU count).
+        batch_size (int): Views rendered per task sent to a worker.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    started = time.perf_counter()
+    snapshot = snapshots.current_snapshot(loaders.RESULTS_DIR)
+    inputs = bundle.input_versions(INPUT_FILES)
+    tasks = enumerate_views()
+    batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+
+    # Every render goes to a fresh build directory, so the files of the bundle in use
+    # are never rewritten under the sessions reading them
+    os.makedirs(out_dir, exist_ok=True)
+    build = os.path.basename(tempfile.mkdtemp(prefix=time.strftime("build-%Y%m%dT%H%M%S-"), dir=out_dir))
+    views = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for entries in pool.map(_render_batch, batches, [out_dir] * len(batches), [build] * len(batches)):
+            views.update(entries)
+
+    manifest = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "snapshot": snapshot and snapshot.id,
+                "inputs": inputs, "code": bundle.code_fingerprint(), "build": build, "views": views}
+    _write(out_dir, "index.html.tmp", _index_html(views))
+    os.replace(os.path.join(out_dir, "index.html.tmp"), os.path.join(out_dir, "index.html"))
+    # The manifest is written last and swapped in atomically, so pages never see a partial bundle
+    _write(out_dir, f"{bundle.MANIFEST_NAME}.tmp", json.dumps(manifest, indent=1))
+    os.replace(os.path.join(out_dir, f"{bundle.MANIFEST_NAME}.tmp"), os.path.join(out_dir, bundle.MANIFEST_NAME))
+    _remove_old_builds(out_dir, build)
+    print(f"Rendered {len(views)} views into {os.path.join(out_dir, build)} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def _remove_old_builds(out_dir, current, keep=KEEP_BUILDS):
+    builds = sorted(name for name in os.listdir(out_dir)
+                    if name.startswith("build-") and name != current and os.path.isdir(os.path.join(out_dir, name)))
+    for name in builds[:max(len(builds) - keep, 0)]:
+        shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+    # Bundles written before builds were versioned
+    for name in ("figures", "tables"):
+        shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard view into a static bundle.")
+    parser.add_argument("--out", default=bundle.BUNDLE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    prerender(args.out, args.workers)
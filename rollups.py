@@ -0,0 +1,123 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from loaders import derived, load_csv, load_records
+
+ALL_OUTLETS = "All Outlets"
+
+# Outlet attributes the cube can be filtered on, in addition to crisis_name
+DIMENSIONS = ["outlet", "disposition", "country"]
+
+# Item columns of each per-article file
+ITEM_DIMENSIONS = {
+    "associations": ["figure", "assoc_type"],
+    "framing": ["framing"],
+    "sentiment": ["entity", "sentiment"],
+    "victim_causor": ["group", "framing_type"],
+}
+
+FRAMING_FILE = "pillar2/framing_per_article.json"
+
+
+def article_counts(df, fallback):
+    # Only framing_per_article.json stores article_count. For the other files it is
+    # recovered from raw_count / mentions_per_article, falling back to the framing
+    # counts for (outlet, crisis) pairs without a single mention.
+    if "article_count" in df.columns:
+        return df.groupby(["outlet", "crisis_name"])["article_count"].max()
+    mentioned = df[df["mentions_per_article"] > 0]
+    estimated = (mentioned["raw_count"] / mentioned["mentions_per_article"]).round()
+    counts = estimated.groupby([mentioned["outlet"], mentioned["crisis_name"]]).median()
+    pairs = pd.MultiIndex.from_frame(df[["outlet", "crisis_name"]].drop_duplicates())
+    counts = counts.reindex(pairs).fillna(fallback.reindex(pairs)).fillna(0)
+    return counts.astype("int64")
+
+
+class RollupCube:
+    """
+    Pre-aggregated raw_count and article_count sums for one per-article file.
+
+    Numerators (raw_count) are summed per item, crisis and every subset of the
+    outlet dimensions; denominators (article_count) are summed per crisis over the
+    same subsets, so an outlet without a row for some item still counts towards the
+    articles it was measured against. Queries pick the matching grouping set and
+    return a weighted mentions_per_article = sum(raw_count) / sum(article_count).
+    """
+
+    def __init__(self, rows, articles, item_dims):
+        self.item_dims = list(item_dims)
+        self.cells = {}
+        for size in range(len(DIMENSIONS) + 1):
+            for dims in combinations(DIMENSIONS, size):
+                numerators = rows.groupby(list(dims) + ["crisis_name"] + self.item_dims, as_index=False)["raw_count"].sum()
+                denominators = articles.groupby(list(dims) + ["crisis_name"], as_index=False)["article_count"].sum()
+                self.cells[dims] = (numerators, denominators)
+
+    @property
+    def nbytes(self):
+        return int(sum(n.memory_usage(deep=True).sum() + d.memory_usage(deep=True).sum()
+                       for n, d in self.cells.values()))
+
+    def query(self, **filters):
+        """
+        Returns weighted mentions per article for a filter combination.
+
+        Args:
+            **filters: Values for any of outlet, disposition, country and crisis_name;
+                each may be a single value or a list of values.
+
+        Returns:
+            pd.DataFrame: One row per crisis_name and item with raw_count, article_count
+            and mentions_per_article.
+        """
+        dims = tuple(dim for dim in DIMENSIONS if filters.get(dim) is not None)
+        numerators, denominators = self.cells[dims]
+        for dim, value in filters.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            numerators = numerators[numerators[dim].isin(values)]
+            denominators = denominators[denominators[dim].isin(values)]
+
+        # Multi-valued filters span several cells, which are summed here
+        numerators = numerators.groupby(["crisis_name"] + self.item_dims, as_index=False)["raw_count"].sum()
+        denominators = denominators.groupby("crisis_name")["article_count"].sum()
+        result = numerators.assign(article_count=numerators["crisis_name"].map(denominators).fillna(0).astype("int64"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = result["raw_count"] / result["article_count"]
+        return result.assign(mentions_per_article=ratio.where(result["article_count"] > 0, 0.0))
+
+
+def build_rollup_cube(df, item_dims, outlets_df, framing_df):
+    """
+    Builds a `RollupCube` from a per-article file.
+
+    Args:
+        df (pd.DataFrame): One of the `pillar2/*_per_article.json` files.
+        item_dims (list[str]): The item columns of that file.
+        outlets_df (pd.DataFrame): `outlets.csv`, for each outlet's disposition and country.
+        framing_df (pd.DataFrame): `framing_per_article.json`, for fallback article counts.
+    """
+    df = df[df["outlet"] != ALL_OUTLETS]
+    fallback = framing_df.groupby(["outlet", "crisis_name"])["article_count"].max()
+    attributes = outlets_df.set_index("outlet_name")[["disposition", "country"]]
+    attributes = attributes[~attributes.index.duplicated()]
+
+    def with_attributes(frame):
+        joined = frame.join(attributes, on="outlet")
+        joined[["disposition", "country"]] = joined[["disposition", "country"]].fillna("Unknown")
+        return joined
+
+    articles = article_counts(df, fallback).rename("article_count").reset_index()
+    rows = df[["outlet", "crisis_name"] + list(item_dims) + ["raw_count"]]
+    return RollupCube(with_attributes(rows), with_attributes(articles), item_dims)
+
+
+def rollup_cube(df, dataset):
+    """Returns the `RollupCube` for a per-article file, built once per version of its inputs."""
+    outlets_df, framing_df = load_csv("outlets.csv"), load_records(FRAMING_FILE)
+    item_dims = ITEM_DIMENSIONS[dataset]
+    return derived(f"rollup_cube:{dataset}", [df, outlets_df, framing_df],
+                   lambda *inputs: build_rollup_cube(inputs[0], item_dims, *inputs[1:]))
@@ -0,0 +1,253 @@
+"""
+Builds the search index over frame items and keywords of every outlet.
+
+The index maps every item of the four frame result files and every keyword of
+the keyword summary to its postings: one (outlet, crisis, attribute, raw_count,
+mentions_per_article) row per place it was found. Items are looked up by a
+case-insensitive prefix of the whole item or of any of its words, so "civ"
+finds "Ukrainian civilians". The index is written next to the results
+(results/search_index/) and rebuilt by the pages only when a source changed.
+
+Usage:
+    python search_index.py [--results-dir results]
+"""
+import argparse
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import loaders
+from frame_table import FRAME_FILES, load_frame_table
+from loaders import load_keyword_summary
+
+INDEX_DIRNAME = "search_index"
+KEYWORDS_FILE = "pillar2/crisis_keyword_summary_with_outlets.csv"
+KEYWORDS_FRAME = "keywords"
+ALL_OUTLETS = "All Outlets"
+SOURCES = list(FRAME_FILES.values()) + [KEYWORDS_FILE]
+POSTING_COLUMNS = ["outlet", "crisis_name", "frame", "attribute", "raw_count", "mentions_per_article"]
+
+WORD_START_RE = re.compile(r"(?<!\w)\w")
+
+_loaded = {"key": None, "index": None}
+_loaded_lock = threading.Lock()
+
+
+def index_dir():
+    return loaders.results_path(INDEX_DIRNAME)
+
+
+def _fingerprints():
+    fingerprints = {}
+    for name in SOURCES:
+        try:
+            stat = os.stat(loaders.results_path(name))
+        except FileNotFoundError:
+            continue
+        fingerprints[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return fingerprints
+
+
+def _search_keys(item):
+    # The whole item, and what follows the start of each later word
+    lowered = item.lower()
+    return [lowered[match.start():] for match in WORD_START_RE.finditer(lowered)] or [lowered]
+
+
+class SearchIndex:
+    """
+    Postings sorted by item and, within an item, by mentions per article (descending).
+
+    The postings of item `i` are rows `offsets[i]:offsets[i + 1]`. `keys` holds the
+    sorted lowercase search keys and `key_items` the item each key belongs to, so a
+    prefix lookup is two binary searches.
+    """
+
+    def __init__(self, items, keys, key_items, postings):
+        self.items = np.asarray(items, dtype=object)
+        self.keys = np.asarray(keys, dtype=str)
+        self.key_items = np.asarray(key_items, dtype=np.int32)
+        self.postings = postings
+        item_ids = postings["item_id"].to_numpy()
+        self.offsets = np.searchsorted(item_ids, np.arange(len(self.items) + 1))
+        self._ranked_columns = {column: postings[column].to_numpy() for column in POSTING_COLUMNS}
+
+    @classmethod
+    def from_frames(cls, frame_data, keywords):
+        """
+        Args:
+            frame_data (pd.DataFrame): `FrameTable.data` of all four frame files.
+            keywords (pd.DataFrame): The keyword summary as returned by `load_keyword_summary`.
+        """
+        frames = frame_data.reset_index()
+        postings = pd.concat([
+            pd.DataFrame({
+                "item": frames["item"].astype(str),
+                "outlet": frames["outlet"].astype(str),
+                "crisis_name": frames["crisis_name"].astype(str),
+                "frame": frames["frame"].astype(str),
+                "attribute": frames["attribute"].astype(str),
+                "raw_count": frames["raw_count"].astype(np.int64),
+                "mentions_per_article": frames["mentions_per_article"].astype(np.float64),
+            }),
+            pd.DataFrame({
+                "item": keywords["keyword"].astype(str),
+                "outlet": keywords["outlet"].astype(str),
+                "crisis_name": keywords["crisis_name"].astype(str),
+                "frame": KEYWORDS_FRAME,
+                "attribute": KEYWORDS_FRAME,
+                "raw_count": keywords["total_count"].astype(np.int64),
+                "mentions_per_article": keywords["average_count"].astype(np.float64),
+            }),
+        ], ignore_index=True)
+
+        item_ids, items = pd.factorize(postings["item"], sort=True)
+        postings = postings.drop(columns="item").assign(item_id=item_ids.astype(np.int32))
+        postings = postings.sort_values(["item_id", "mentions_per_article"], ascending=[True, False], kind="stable")
+        for column in ["outlet", "crisis_name", "frame", "attribute"]:
+            postings[column] = postings[column].astype("category")
+
+        pairs = sorted((key, item_id) for item_id, item in enumerate(items) for key in _search_keys(item))
+        keys = [key for key, _ in pairs]
+        key_items = [item_id for _, item_id in pairs]
+        return cls(items, keys, key_items, postings.reset_index(drop=True))
+
+    @property
+    def nbytes(self):
+        return (self.keys.nbytes + self.key_items.nbytes + self.offsets.nbytes
+                + int(self.postings.memory_usage(index=True).sum()))
+
+    def matching_items(self, query):
+        """Returns the ids of the items whose text, or one of whose words, starts with `query` (any case)."""
+        prefix = query.strip().lower()
+        if not prefix:
+            return np.array([], dtype=np.int32)
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        hi = np.searchsorted(self.keys, prefix + "\U0010ffff", side="left")
+        return np.unique(self.key_items[lo:hi])
+
+    def search(self, query, limit=50, include_all_outlets=False, frames=None):
+        """
+        Finds the outlets that mention the items matching `query` most.
+
+        Args:
+            query (str): A case-insensitive prefix of an item or of one of its words.
+            limit (int): Number of results to return.
+            include_all_outlets (bool): Whether to include the "All Outlets" aggregate rows.
+            frames (iterable): Only return postings of these frames (e.g. "humanitarian", "keywords").
+
+        Returns:
+            pd.DataFrame: item, outlet, crisis_name, frame, attribute, raw_count and
+                mentions_per_article; exact item matches first, then by mentions per article.
+        """
+        item_ids = self.matching_items(query)
+        starts, stops = self.offsets[item_ids], self.offsets[item_ids + 1]
+        lengths = stops - starts
+        # Row numbers of every posting of the matching items, without a Python loop
+        rows = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        row_items = np.repeat(item_ids, lengths)
+
+        keep = np.ones(len(rows), dtype=bool)
+        if not include_all_outlets:
+            keep &= self._ranked_columns["outlet"][rows] != ALL_OUTLETS
+        if frames is not None:
+            keep &= np.isin(self._ranked_columns["frame"][rows], list(frames))
+        rows, row_items = rows[keep], row_items[keep]
+
+        prefix = query.strip().lower()
+        exact_items = [item_id for item_id in item_ids if self.items[item_id].lower() == prefix]
+        exact = np.isin(row_items, exact_items)
+        mentions = self._ranked_columns["mentions_per_article"][rows]
+        order = np.lexsort((-self._ranked_columns["raw_count"][rows], -mentions, ~exact))[:limit]
+        result = {"item": self.items[row_items[order]]}
+        for column in POSTING_COLUMNS:
+            result[column] = self._ranked_columns[column][rows[order]]
+        return pd.DataFrame(result)
+
+
+def build_index():
+    """Builds the index from the loaded frame results and keyword summary."""
+    return SearchIndex.from_frames(load_frame_table().data, load_keyword_summary(KEYWORDS_FILE))
+
+
+def _write_table(df, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(f"{path}.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(f"{path}.tmp", path)
+
+
+def save_index(index, out_dir=None):
+    """Writes the index, with the fingerprints of the sources it was built from."""
+    out_dir = out_dir or index_dir()
+    os.makedirs(out_dir, exist_ok=True)
+    _write_table(index.postings, os.path.join(out_dir, "postings.arrow"))
+    _write_table(pd.DataFrame({"key": index.keys, "item_id": index.key_items}), os.path.join(out_dir, "keys.arrow"))
+    _write_table(pd.DataFrame({"item": index.items}), os.path.join(out_dir, "items.arrow"))
+    # Written last: an index without an up-to-date sources.json is rebuilt
+    sources_path = os.path.join(out_dir, "sources.json")
+    with open(f"{sources_path}.tmp", "w") as f:
+        json.dump(_fingerprints(), f, indent=4)
+    os.replace(f"{sources_path}.tmp", sources_path)
+
+
+def _read_table(path):
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all().to_pandas()
+
+
+def read_index(in_dir=None):
+    """Reads a saved index, or returns None if there is none or its sources changed since."""
+    in_dir = in_dir or index_dir()
+    try:
+        with open(os.path.join(in_dir, "sources.json"), "r") as f:
+            if json.load(f) != _fingerprints():
+                return None
+        keys = _read_table(os.path.join(in_dir, "keys.arrow"))
+        items = _read_table(os.path.join(in_dir, "items.arrow"))["item"]
+        postings = _read_table(os.path.join(in_dir, "postings.arrow"))
+    except FileNotFoundError:
+        return None
+    return SearchIndex(items, keys["key"], keys["item_id"], postings)
+
+
+def load_search_index():
+    """
+    Returns the search index, shared by every session of the process.
+
+    Reads the saved index; if it is missing or stale, builds it from the sources and
+    tries to save it for the next process.
+    """
+    key = tuple(sorted((name, f["size"], f["mtime_ns"]) for name, f in _fingerprints().items()))
+    with _loaded_lock:
+        if _loaded["key"] != key:
+            index = read_index()
+            if index is None:
+                index = build_index()
+                try:
+                    save_index(index)
+                except OSError:
+                    # A read-only results directory only costs a rebuild per process
+                    pass
+            _loaded["key"], _loaded["index"] = key, index
+        return _loaded["index"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the search index over frame items and keywords.")
+    parser.add_argument("--results-dir", default=loaders.RESULTS_DIR)
+    args = parser.parse_args()
+
+    loaders.RESULTS_DIR = args.results_dir
+    index = build_index()
+    save_index(index)
+    print(f"Indexed {len(index.items)} items ({len(index.keys)} search keys, {len(index.postings)} postings) "
+          f"in {index_dir()}")
@@ -0,0 +1,316 @@
+"""
+Publishes the compiled Arrow tables to shared memory once per host.
+
+`loaders.py` memory-maps the compiled tables under results/compiled/. When the
+tables are also published to a tmpfs (/dev/shm by default), every Streamlit
+worker on the host maps the same pages instead of reading its own copy: the
+first process to publish a given manifest copies the tables under an exclusive
+lock file, into a staging directory renamed into place when complete, and the
+others wait for it, then attach. Numeric columns are handed
+to pandas without copying, so they appear as shared memory (RssShmem) in each
+worker rather than as private memory.
+
+`process_memory()` and `session_memory()` report what a worker and a session
+hold, to check the saving.
+
+Usage:
+    python shared_store.py publish [--results-dir results]
+    python shared_store.py status
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SHM_ROOT = os.environ.get("IML_SHM_DIR", "/dev/shm")
+STORE_PREFIX = "iml-results-"
+READY_NAME = "READY"
+LOCK_NAME = "publish.lock"
+# How long to wait for another process to finish publishing before reading the
+# compiled tables directly; a lock older than this is assumed to be left by a crash
+PUBLISH_TIMEOUT_S = float(os.environ.get("IML_SHM_TIMEOUT", 30))
+
+_published = {}
+_published_lock = threading.Lock()
+
+
+def enabled():
+    return bool(SHM_ROOT) and os.path.isdir(SHM_ROOT) and os.access(SHM_ROOT, os.W_OK)
+
+
+def _source_prefix(compiled_dir):
+    # Stores of different results directories on the same host are kept apart
+    return f"{STORE_PREFIX}{hashlib.sha1(os.path.abspath(compiled_dir).encode()).hexdigest()[:8]}-"
+
+
+def store_dir(compiled_dir, manifest_name="manifest.json"):
+    """The shared directory for one version of a compiled store, named after its manifest's content."""
+    with open(os.path.join(compiled_dir, manifest_name), "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    return os.path.join(SHM_ROOT, f"{_source_prefix(compiled_dir)}{digest}")
+
+
+def _copy_tables(compiled_dir, target):
+    os.makedirs(target, exist_ok=True)
+    for name in sorted(os.listdir(compiled_dir)):
+        if name.endswith(".arrow"):
+            shutil.copyfile(os.path.join(compiled_dir, name), os.path.join(target, name))
+
+
+def _staging_prefix(compiled_dir):
+    # Hidden, so a store being copied is never taken for a published one
+    return f".staging-{_source_prefix(compiled_dir)}"
+
+
+def remove_stores(compiled_dir, keep=None):
+    """Removes the shared stores of `compiled_dir`, except `keep`, and abandoned staging directories."""
+    # Workers still mapping an older store keep its pages until they unmap them;
+    # unlinking only stops new processes from attaching to it
+    prefix, staging = _source_prefix(compiled_dir), _staging_prefix(compiled_dir)
+    for name in os.listdir(SHM_ROOT):
+        path = os.path.join(SHM_ROOT, name)
+        if name.startswith(prefix) and os.path.isdir(path) and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.startswith(staging):
+            # Live publishers touch their staging directory while copying
+            try:
+                abandoned = time.time() - os.stat(path).st_mtime > PUBLISH_TIMEOUT_S
+            except FileNotFoundError:
+                continue
+            if abandoned:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _heartbeat(paths, stop):
+    # Keeps a live publisher's lock (and staging directory) from looking abandoned
+    while not stop.wait(PUBLISH_TIMEOUT_S / 3):
+        for path in paths:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+
+def _release(lock, token):
+    # The lock may have been taken over (or removed) meanwhile; only ours is removed
+    try:
+        with open(lock, "rb") as f:
+            if f.read() != token:
+                return
+        os.unlink(lock)
+    except FileNotFoundError:
+        pass
+
+
+def publish(compiled_dir, manifest_name="manifest.json"):
+    """
+    Makes sure the compiled tables in `compiled_dir` are published to shared memory.
+
+    The tables are copied into a private staging directory that is renamed to the
+    store's name when complete, so a store is either absent or whole, even if two
+    processes end up copying it at the same time.
+
+    Args:
+        compiled_dir (str): The compiled store, e.g. results/compiled.
+        manifest_name (str): Its manifest file.
+
+    Returns:
+        str or None: The shared directory, or None if there is no compiled store, shared
+            memory is unavailable, or another process did not finish publishing in time.
+    """
+    manifest_path = os.path.join(compiled_dir, manifest_name)
+    if not enabled() or not os.path.exists(manifest_path):
+        return None
+    target = store_dir(compiled_dir, manifest_name)
+    ready = os.path.join(target, READY_NAME)
+    lock = os.path.join(SHM_ROOT, f"{os.path.basename(target)}.{LOCK_NAME}")
+    token = f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}".encode()
+
+    deadline = time.monotonic() + PUBLISH_TIMEOUT_S
+    while not os.path.exists(ready):
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > PUBLISH_TIMEOUT_S:
+                    os.unlink(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.05)
+            continue
+
+        try:
+            os.write(fd, token)
+        finally:
+            os.close(fd)
+        staging = os.path.join(SHM_ROOT, f"{_staging_prefix(compiled_dir)}{os.path.basename(target)}-{token.decode()}")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=([lock, staging], stop), daemon=True)
+        heartbeat.start()
+        try:
+            if not os.path.exists(ready):
+                try:
+                    _copy_tables(compiled_dir, staging)
+                    open(os.path.join(staging, READY_NAME), "w").close()
+                    os.rename(staging, target)
+                except OSError:
+                    # Published by another process meanwhile, which may also have removed
+                    # this staging directory; a store left incomplete is replaced
+                    if not os.path.exists(ready):
+                        shutil.rmtree(target, ignore_errors=True)
+                        if time.monotonic() > deadline:
+                            return None
+                        continue
+                remove_stores(compiled_dir, keep=target)
+        finally:
+            stop.set()
+            heartbeat.join()
+            shutil.rmtree(staging, ignore_errors=True)
+            _release(lock, token)
+    return target
+
+
+def shared_path(compiled_dir, table_path, manifest_name="manifest.json"):
+    """
+    Returns the shared-memory copy of a compiled table, publishing the store on first use.
+
+    Falls back to `table_path` itself when the store cannot be published.
+    """
+    manifest_path = os.path.join(compiled_dir, manifest_name)
+    try:
+        key = (os.path.abspath(manifest_path), os.stat(manifest_path).st_mtime_ns)
+    except FileNotFoundError:
+        return table_path
+    with _published_lock:
+        if key not in _published:
+            _published[key] = publish(compiled_dir, manifest_name)
+        target = _published[key]
+    if target is None:
+        return table_path
+    shared = os.path.join(target, os.path.basename(table_path))
+    return shared if os.path.exists(shared) else table_path
+
+
+def _status_kb(pid="self"):
+    # The kB fields of /proc/<pid>/status, e.g. VmRSS, RssAnon, RssFile, RssShmem
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return fields
+
+
+def process_memory(pid="self"):
+    """
+    Returns a process' resident memory in bytes (Linux only; zeros elsewhere).
+
+    Returns:
+        dict: rss, anon (private heap), file (mapped files) and shmem (shared memory,
+            including the published tables) bytes.
+    """
+    fields = _status_kb(pid)
+    return {
+        "rss": fields.get("VmRSS", 0) * 1024,
+        "anon": fields.get("RssAnon", 0) * 1024,
+        "file": fields.get("RssFile", 0) * 1024,
+        "shmem": fields.get("RssShmem", 0) * 1024,
+    }
+
+
+def _private_bytes(value):
+    # Read-only arrays belong to the shared loader cache; only what a session built
+    # for itself is counted against it
+    if isinstance(value, pd.DataFrame):
+        total = value.index.nbytes
+        for column in value.columns:
+            array = value[column].array
+            data = np.asarray(array) if isinstance(value[column].dtype, np.dtype) else None
+            if data is None or data.flags.writeable:
+                total += int(array.nbytes)
+        return total
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes) if value.flags.writeable else 0
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_private_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(_private_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def session_memory(session_state):
+    """
+    Estimates the memory a session holds in its session state.
+
+    Args:
+        session_state (dict): e.g. `st.session_state.to_dict()`.
+
+    Returns:
+        dict: key -> private bytes, plus "total".
+    """
+    sizes = {str(key): _private_bytes(value) for key, value in session_state.items()}
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def _store_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def mapping_processes(path):
+    """Returns {pid: process_memory} for every process that maps a file under `path`."""
+    processes = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/maps", "r") as f:
+                if any(path in line for line in f):
+                    processes[int(pid)] = process_memory(pid)
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return processes
+
+
+def status():
+    """Prints every published store and the memory of the processes attached to it."""
+    if not enabled():
+        print(f"{SHM_ROOT!r} is not available; tables are read from the compiled store")
+        return
+    stores = sorted(name for name in os.listdir(SHM_ROOT)
+                    if name.startswith(STORE_PREFIX) and os.path.isdir(os.path.join(SHM_ROOT, name)))
+    if not stores:
+        print(f"No store published under {SHM_ROOT}")
+    for name in stores:
+        path = os.path.join(SHM_ROOT, name)
+        ready = "ready" if os.path.exists(os.path.join(path, READY_NAME)) else "incomplete"
+        print(f"{path}  {_store_size(path) / 2**20:.1f} MB  {ready}")
+        for pid, memory in sorted(mapping_processes(path).items()):
+            print(f"    pid {pid:>7}  rss {memory['rss'] / 2**20:8.1f} MB  "
+                  f"private {memory['anon'] / 2**20:8.1f} MB  shared {memory['shmem'] / 2**20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish the compiled results to shared memory, or report on it.")
+    parser.add_argument("command", choices=["publish", "status"])
+    parser.add_argument("--results-dir", default=os.environ.get("IML_RESULTS_DIR", "results"))
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        import loaders
+
+        target = publish(os.path.join(args.results_dir, loaders.COMPILED_DIRNAME), loaders.MANIFEST_NAME)
+        print(f"Published to {target}" if target else "Nothing published (no compiled store or no shared memory)")
+    else:
+        status()
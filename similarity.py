@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+from frame_table import FRAME_FILES
+from loaders import derived, load_frame_results, load_keyword_summary, load_records
+
+FRAMING_FILE = "pillar2/framing_per_article.json"
+KEYWORDS_FILE = "pillar2/crisis_keyword_summary_with_outlets.csv"
+ALL_OUTLETS = "All Outlets"
+# Rows of the similarity matrix computed per matrix product; bounds the temporary
+# memory of a block to BLOCK_ROWS x outlets
+BLOCK_ROWS = 1024
+
+
+def _long_profiles(frames, framing, keywords):
+    # One (outlet, block, feature, value) row per mention rate, for every source
+    parts = [
+        pd.DataFrame({
+            "outlet": df["outlet"].astype(str),
+            "block": frame,
+            "feature": df["crisis_name"].astype(str) + "|" + df["attribute"].astype(str) + "|" + df["item"].astype(str),
+            "value": df["mentions_per_article"].astype(np.float64),
+        })
+        for frame, df in frames.items()
+    ]
+    parts.append(pd.DataFrame({
+        "outlet": framing["outlet"].astype(str),
+        "block": "framing",
+        "feature": framing["crisis_name"].astype(str) + "|" + framing["framing"].astype(str),
+        "value": framing["mentions_per_article"].astype(np.float64),
+    }))
+    parts.append(pd.DataFrame({
+        "outlet": keywords["outlet"].astype(str),
+        "block": "keywords",
+        "feature": keywords["crisis_name"].astype(str) + "|" + keywords["keyword"].astype(str),
+        "value": keywords["average_count"].astype(np.float64),
+    }))
+    long = pd.concat(parts, ignore_index=True)
+    return long[(long["outlet"] != ALL_OUTLETS) & long["value"].notna()]
+
+
+def normalize_rows(vectors):
+    """Scales every row to unit length; all-zero rows stay zero."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def cosine_similarity(vectors, block_rows=BLOCK_ROWS):
+    """
+    Returns the cosine similarity of every pair of rows of `vectors`.
+
+    The matrix is filled `block_rows` rows at a time, each block one matrix product
+    of the unit-length rows with all of them. Rows of zeros have similarity 0 to everything.
+    """
+    unit = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    similarity = np.empty((len(unit), len(unit)), dtype=np.float32)
+    for start in range(0, len(unit), block_rows):
+        np.matmul(unit[start:start + block_rows], unit.T, out=similarity[start:start + block_rows])
+    return np.clip(similarity, -1.0, 1.0, out=similarity)
+
+
+def average_linkage(distances):
+    """
+    Clusters the rows of a distance matrix hierarchically with average linkage (UPGMA).
+
+    Uses the nearest-neighbour chain algorithm: every step is one vectorized pass over
+    a row of the matrix, and the Lance-Williams update of a merged cluster's distances
+    is a weighted sum of two rows, so the whole clustering is O(n^2).
+
+    Args:
+        distances (np.ndarray): A symmetric (n, n) matrix of distances.
+
+    Returns:
+        np.ndarray: A linkage matrix in SciPy's layout: row i merges clusters Z[i, 0]
+            and Z[i, 1] (ids below n are rows, n + j the cluster formed in row j) at
+            distance Z[i, 2] into a cluster of Z[i, 3] rows.
+    """
+    n = len(distances)
+    d = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(d, np.inf)
+    sizes = np.ones(n)
+    # (slot, slot, distance, size), in the order the chain finds them
+    merges = np.empty((max(n - 1, 0), 4))
+    chain = []
+    for step in range(n - 1):
+        if not chain:
+            chain.append(int(np.argmax(sizes > 0)))
+        while True:
+            a = chain[-1]
+            b = int(np.argmin(d[a]))
+            # Prefer the previous link on ties, which keeps the chain from cycling
+            if len(chain) > 1 and d[a, chain[-2]] <= d[a, b]:
+                break
+            chain.append(b)
+        b, a = chain.pop(), chain.pop()
+        merges[step] = (a, b, d[a, b], sizes[a] + sizes[b])
+
+        # The merged cluster takes slot b; slot a is retired
+        merged = (sizes[a] * d[a] + sizes[b] * d[b]) / (sizes[a] + sizes[b])
+        d[b, :] = merged
+        d[:, b] = merged
+        d[a, :] = np.inf
+        d[:, a] = np.inf
+        d[b, b] = np.inf
+        sizes[b] += sizes[a]
+        sizes[a] = 0
+
+    # Sort by distance and give every merged cluster its id (one find per merge)
+    merges = merges[np.argsort(merges[:, 2], kind="stable")]
+    parent = np.arange(2 * n - 1)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        parent[x] = root
+        return root
+
+    linkage = merges.copy()
+    for i, (a, b, _, _) in enumerate(merges):
+        roots = sorted((find(int(a)), find(int(b))))
+        linkage[i, :2] = roots
+        parent[roots] = n + i
+    return linkage
+
+
+def leaf_order(linkage):
+    """Returns the rows in the order of the dendrogram's leaves, left to right."""
+    n = len(linkage) + 1
+    order, stack = [], [2 * n - 2]
+    while stack:
+        node = stack.pop()
+        if node < n:
+            order.append(node)
+        else:
+            left, right = linkage[node - n, :2].astype(int)
+            stack += [right, left]
+    return np.array(order)
+
+
+def cut_tree(linkage, clusters):
+    """
+    Returns the cluster (1 to `clusters`) of every row when the tree is cut into `clusters` clusters.
+
+    Clusters are numbered in the order they appear along the dendrogram.
+    """
+    n = len(linkage) + 1
+    clusters = min(max(clusters, 1), n)
+    parent = np.arange(2 * n - 1)
+    kept = linkage[:n - clusters, :2].astype(int)
+    parent[kept[:, 0]] = n + np.arange(len(kept))
+    parent[kept[:, 1]] = n + np.arange(len(kept))
+    # Pointer jumping: every row reaches the root of its cluster in O(log n) passes
+    while True:
+        jumped = parent[parent]
+        if np.array_equal(jumped, parent):
+            break
+        parent = jumped
+    roots = parent[:n]
+    first_seen = pd.unique(roots[leaf_order(linkage)])
+    return pd.Index(first_seen).get_indexer(roots) + 1
+
+
+class OutletSimilarity:
+    """
+    How alike outlets are in what they mention, and a hierarchical clustering of them.
+
+    Each outlet's profile is one dense vector of mentions per article: of every
+    (crisis, attribute, item) of the four frame files, of every (crisis, framing) of
+    framing_per_article.json and (as the average count per article) of every
+    (crisis, keyword) of the keyword summary. Each of these six sources is scaled to
+    unit length per outlet, so a source with more or larger values does not outweigh
+    the others, and the similarity of two outlets is the cosine of their profiles.
+    Distances for the clustering are 1 - similarity.
+    """
+
+    def __init__(self, outlets, blocks, features, vectors, version=None):
+        self.outlets = list(outlets)
+        self.blocks = list(blocks)
+        self.features = features
+        self.vectors = vectors
+        self.version = version
+        self.similarity = cosine_similarity(vectors)
+        self.linkage = average_linkage(1.0 - self.similarity) if len(self.outlets) > 1 else np.empty((0, 4))
+        self.order = leaf_order(self.linkage) if len(self.outlets) > 1 else np.arange(len(self.outlets))
+
+    @classmethod
+    def from_frames(cls, frames, framing, keywords, version=None):
+        """
+        Args:
+            frames (dict): Frame name -> frame results as returned by `load_frame_results`.
+            framing (pd.DataFrame): framing_per_article.json as returned by `load_records`.
+            keywords (pd.DataFrame): The keyword summary as returned by `load_keyword_summary`.
+            version: Identifies the inputs, for the figure cache.
+        """
+        long = _long_profiles(frames, framing, keywords)
+        outlet_codes, outlets = pd.factorize(long["outlet"], sort=True)
+        # Features sorted by block, so every block is a contiguous range of columns
+        features = pd.MultiIndex.from_arrays([long["block"], long["feature"]])
+        feature_codes, features = pd.factorize(features, sort=True)
+        vectors = np.zeros((len(outlets), len(features)), dtype=np.float32)
+        np.add.at(vectors, (outlet_codes, feature_codes), long["value"].to_numpy(np.float32))
+
+        block_names = features.get_level_values(0)
+        blocks = pd.unique(block_names)
+        starts = np.searchsorted(block_names, blocks)
+        stops = np.append(starts[1:], len(features))
+        for start, stop in zip(starts, stops):
+            vectors[:, start:stop] = normalize_rows(vectors[:, start:stop])
+        return cls(outlets, blocks, features, vectors, version)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + self.similarity.nbytes + self.linkage.nbytes + self.order.nbytes
+
+    def clusters(self, count):
+        """Returns an outlet -> cluster (1 to `count`, in dendrogram order) series."""
+        if len(self.outlets) < 2:
+            return pd.Series(1, index=self.outlets, name="cluster")
+        return pd.Series(cut_tree(self.linkage, count), index=self.outlets, name="cluster")
+
+    def most_similar(self, outlet, count=5):
+        """Returns the `count` outlets most similar to `outlet`, most similar first."""
+        row = self.similarity[self.outlets.index(outlet)].copy()
+        row[self.outlets.index(outlet)] = -np.inf
+        top = np.argsort(-row, kind="stable")[:count]
+        return pd.Series(row[top], index=[self.outlets[i] for i in top], name="similarity")
+
+
+def outlet_similarity():
+    """Returns the `OutletSimilarity` of the results directory, built once per version of its inputs."""
+    frames = {}
+    for frame, name in FRAME_FILES.items():
+        try:
+            frames[frame] = load_frame_results(name)
+        except FileNotFoundError:
+            continue
+    inputs = [*frames.values(), load_records(FRAMING_FILE), load_keyword_summary(KEYWORDS_FILE)]
+
+    def build(*inputs):
+        version = tuple((df.attrs.get("version"), len(df)) for df in inputs)
+        return OutletSimilarity.from_frames(dict(zip(frames, inputs)), inputs[-2], inputs[-1], version)
+
+    return derived(f"outlet_similarity:{','.join(frames)}", inputs, build)
@@ -0,0 +1,364 @@
+"""
+Publishes results as versioned snapshots and switches the dashboard to them atomically.
+
+A snapshot is an immutable copy of the results files under
+results/snapshots/<id>/ with a snapshot.json manifest of their content hashes;
+results/current is a symlink to the live one and is replaced with a single
+rename, so a reader sees either the old or the new snapshot, never a mix. Files
+unchanged since the previous snapshot are hard-linked rather than copied.
+
+Each script run pins the snapshot that is current when it starts (`pin_run()`,
+and `fragment` for fragment reruns), so a rerun reads all its files from one
+snapshot even if a new one is published meanwhile. Loaded files are versioned
+by content hash, so after a swap only the files whose hash changed are parsed
+again; a watcher on results/current tells the registered listeners (the loader
+and figure caches) which files changed, so they drop those entries and reload
+them in the background before sessions ask for them.
+
+Without results/current, the results directory is read as before.
+
+Usage:
+    python snapshots.py publish [--source results] [--results-dir results] [--compile] [--keep 3]
+    python snapshots.py status [--results-dir results]
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+SNAPSHOTS_DIRNAME = "snapshots"
+CURRENT_NAME = "current"
+MANIFEST_NAME = "snapshot.json"
+# Snapshots kept besides the current one, for runs still pinned to them
+KEEP = 3
+# Directories of a results tree that are derived from it rather than published
+SKIP_DIRS = {SNAPSHOTS_DIRNAME, "compiled", "search_index"}
+
+logger = logging.getLogger(__name__)
+
+_pinned = contextvars.ContextVar("iml_snapshot", default=None)
+_manifests = {}
+_manifests_lock = threading.Lock()
+_listeners = []
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+class Snapshot:
+    """One published snapshot: its id, directory and content hash per file."""
+
+    def __init__(self, root, snapshot_id, path, files):
+        self.root = root
+        self.id = snapshot_id
+        self.path = path
+        self.files = files
+
+    def content_hash(self, name):
+        entry = self.files.get(name.replace(os.sep, "/"))
+        return entry["sha256"] if entry else None
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_files(results_dir):
+    """Yields the published files of a results tree, relative to it."""
+    for root, dirs, files in os.walk(results_dir):
+        if root == results_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            if os.path.islink(path) or (root == results_dir and file_name == CURRENT_NAME):
+                continue
+            yield os.path.relpath(path, results_dir).replace(os.sep, "/")
+
+
+def _read_snapshot(root, snapshot_id):
+    path = os.path.join(root, SNAPSHOTS_DIRNAME, snapshot_id)
+    key = os.path.abspath(path)
+    with _manifests_lock:
+        snapshot = _manifests.get(key)
+    if snapshot is None:
+        # Snapshots never change once published, so each manifest is read once
+        with open(os.path.join(path, MANIFEST_NAME), "r") as f:
+            files = json.load(f)["files"]
+        snapshot = Snapshot(root, snapshot_id, path, files)
+        with _manifests_lock:
+            _manifests[key] = snapshot
+    return snapshot
+
+
+def current_snapshot(root):
+    """Returns the snapshot results/current points to, or None when `root` has no snapshots."""
+    try:
+        target = os.readlink(os.path.join(root, CURRENT_NAME))
+    except (FileNotFoundError, OSError):
+        return None
+    return _read_snapshot(root, os.path.basename(os.path.normpath(target)))
+
+
+def pinned_snapshot(root):
+    """Returns the snapshot pinned for this run, or else the current one (None without snapshots)."""
+    snapshot = _pinned.get()
+    if snapshot is not None and snapshot.root == root:
+        return snapshot
+    return current_snapshot(root)
+
+
+def results_dir(root):
+    """Returns the directory results are read from: the pinned snapshot's, or `root` itself."""
+    snapshot = pinned_snapshot(root)
+    return snapshot.path if snapshot is not None else root
+
+
+def content_hash(root, name):
+    """Returns the content hash of a results file in the pinned snapshot, or None without snapshots."""
+    snapshot = pinned_snapshot(root)
+    return snapshot.content_hash(name) if snapshot is not None else None
+
+
+def version(name, sha256):
+    """The version tag of a loaded file in snapshot mode, e.g. "outlets.csv@0123456789abcdef"."""
+    return f"{name}@{sha256[:16]}"
+
+
+def stale_versions(changed, old):
+    """Returns the version tags, in snapshot `old`, of the files in `changed`."""
+    return {version(name, old.content_hash(name)) for name in changed if old.content_hash(name)}
+
+
+def is_stale(tag, stale):
+    # Subsets of a file (e.g. a coverage window) extend its tag with "[...]"
+    return isinstance(tag, str) and tag.split("[", 1)[0] in stale
+
+
+def pin(snapshot):
+    """Pins `snapshot` for reads in the current context (thread or script run)."""
+    _pinned.set(snapshot)
+
+
+def pin_run(root=None):
+    """
+    Pins the current snapshot for the rest of this script run.
+
+    Called at the top of each page; every read through `loaders.py` in the run then
+    comes from the same snapshot. Also starts the watcher of `root` (once per process).
+    """
+    import loaders
+
+    root = root or loaders.RESULTS_DIR
+    snapshot = current_snapshot(root)
+    pin(snapshot)
+    if snapshot is not None:
+        watch(root)
+    return snapshot
+
+
+def fragment(func):
+    """
+    `st.fragment` for the pages: a fragment rerun pins the current snapshot first.
+
+    When the fragment runs as part of a full run, it keeps the snapshot the page pinned.
+    """
+    import functools
+
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        if ctx is not None and ctx.fragment_ids_this_run:
+            pin_run()
+        return func(*args, **kwargs)
+
+    return st.fragment(wrapper)
+
+
+def add_listener(listener):
+    """
+    Registers `listener(changed, old, new)`, called when results/current moves to another snapshot.
+
+    `changed` is the set of file names whose content differs between the two snapshots
+    (including added and removed files); `old` and `new` are `Snapshot`s.
+    """
+    _listeners.append(listener)
+
+
+def changed_files(old, new):
+    names = set(old.files) | set(new.files)
+    return {name for name in names if old.content_hash(name) != new.content_hash(name)}
+
+
+def _notify(old, new):
+    changed = changed_files(old, new)
+    logger.info("Results snapshot %s -> %s: %d files changed", old.id, new.id, len(changed))
+    for listener in list(_listeners):
+        try:
+            listener(changed, old, new)
+        except Exception:
+            logger.exception("Snapshot listener %r failed", listener)
+
+
+class _Watcher:
+    # Tracks the target of results/current; any event on the link triggers a check
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = current_snapshot(root)
+        self.lock = threading.Lock()
+
+    def check(self):
+        with self.lock:
+            new = current_snapshot(self.root)
+            old, self.snapshot = self.snapshot, new
+        if old is not None and new is not None and old.id != new.id:
+            _notify(old, new)
+
+
+def watch(root):
+    """Starts a watchdog observer on `root` that notifies the listeners of each snapshot swap."""
+    key = os.path.abspath(root)
+    with _watchers_lock:
+        if key in _watchers:
+            return _watchers[key]
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = _Watcher(root)
+        current = os.path.join(key, CURRENT_NAME)
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = {os.path.abspath(event.src_path), os.path.abspath(getattr(event, "dest_path", "") or "")}
+                if current in paths:
+                    watcher.check()
+
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(Handler(), key, recursive=False)
+        observer.start()
+        _watchers[key] = (watcher, observer)
+        return _watchers[key]
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def publish(source, root, compile_tables=False, keep=KEEP):
+    """
+    Publishes the files of `source` as a new snapshot of `root` and makes it current.
+
+    Args:
+        source (str): A results tree to publish (e.g. results/ after copying new files in).
+        root (str): The results directory holding snapshots/ and current.
+        compile_tables (bool): Also compile the snapshot's Arrow tables (compile_results.py).
+        keep (int): Older snapshots to keep besides the new one.
+
+    Returns:
+        Snapshot: The new current snapshot, or the current one if nothing changed.
+    """
+    files = {}
+    for name in iter_files(source):
+        path = os.path.join(source, name)
+        files[name] = {"sha256": file_hash(path), "size": os.path.getsize(path)}
+
+    previous = current_snapshot(root)
+    if previous is not None and {n: f["sha256"] for n, f in previous.files.items()} == \
+            {n: f["sha256"] for n, f in files.items()}:
+        return previous
+
+    digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:8]
+    snapshot_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{digest}"
+    snapshots_dir = os.path.join(root, SNAPSHOTS_DIRNAME)
+    staging = os.path.join(snapshots_dir, f".staging-{snapshot_id}")
+    for name, entry in files.items():
+        target = os.path.join(staging, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if previous is not None and previous.content_hash(name) == entry["sha256"]:
+            _link_or_copy(os.path.join(previous.path, name), target)
+        else:
+            shutil.copy2(os.path.join(source, name), target)
+
+    if compile_tables:
+        import compile_results
+
+        compile_results.compile_results(staging)
+
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump({"id": snapshot_id, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "source": os.path.abspath(source), "files": files}, f, indent=4)
+    final = os.path.join(snapshots_dir, snapshot_id)
+    os.rename(staging, final)
+
+    # The swap: a new link renamed over the old one is atomic
+    link = os.path.join(root, f".{CURRENT_NAME}-{snapshot_id}")
+    os.symlink(os.path.join(SNAPSHOTS_DIRNAME, snapshot_id), link)
+    os.replace(link, os.path.join(root, CURRENT_NAME))
+
+    prune(root, keep)
+    return current_snapshot(root)
+
+
+def list_snapshots(root):
+    """Returns the ids of the published snapshots, oldest first."""
+    try:
+        names = os.listdir(os.path.join(root, SNAPSHOTS_DIRNAME))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if not name.startswith("."))
+
+
+def prune(root, keep=KEEP):
+    """Removes all but the current snapshot and the `keep` newest others, with their shared-memory tables."""
+    import shared_store
+
+    current = current_snapshot(root)
+    older = [s for s in list_snapshots(root) if current is None or s != current.id]
+    for snapshot_id in older[:max(len(older) - keep, 0)]:
+        path = os.path.join(root, SNAPSHOTS_DIRNAME, snapshot_id)
+        if shared_store.enabled():
+            shared_store.remove_stores(os.path.join(path, "compiled"))
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import loaders
+
+    parser = argparse.ArgumentParser(description="Publish results as versioned snapshots.")
+    parser.add_argument("command", choices=["publish", "status"])
+    parser.add_argument("--results-dir", default=loaders.RESULTS_DIR)
+    parser.add_argument("--source", default=None, help="Results tree to publish (default: the results directory)")
+    parser.add_argument("--compile", action="store_true", help="Compile the snapshot's Arrow tables")
+    parser.add_argument("--keep", type=int, default=KEEP)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        before = current_snapshot(args.results_dir)
+        snapshot = publish(args.source or args.results_dir, args.results_dir, args.compile, args.keep)
+        if before is not None and before.id == snapshot.id:
+            print(f"No changes; {snapshot.id} stays current")
+        else:
+            changed = changed_files(before, snapshot) if before is not None else set(snapshot.files)
+            print(f"Published {snapshot.id} ({len(snapshot.files)} files, {len(changed)} changed)")
+    else:
+        current = current_snapshot(args.results_dir)
+        for snapshot_id in list_snapshots(args.results_dir):
+            marker = "*" if current is not None and snapshot_id == current.id else " "
+            print(f"{marker} {snapshot_id}")
+        if current is None:
+            print("No current snapshot; the results directory is read directly")
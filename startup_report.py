@@ -0,0 +1,117 @@
+"""
+Reports where the time goes when a dashboard page is first rendered by a fresh worker.
+
+Each page runs in its own subprocess, so imports and file loads are cold. The
+report breaks the time down into the page's imports (from `python -X importtime`),
+the files parsed by loaders.py, and the total time to render the page, and gives
+the worker's resident memory and the bytes sent per chart and table.
+
+Usage:
+    python startup_report.py [pages/quantitative.py ...] [--top 10]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+PAGES = ["app.py", "pages/quantitative.py", "pages/qualitative.py"]
+
+_RUN_PAGE = """
+import json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import loaders, payloads, shared_store
+at = AppTest.from_file({page!r}, default_timeout=600)
+rendered = time.perf_counter()
+at.run()
+print(json.dumps({{
+    "harness_s": rendered - started,
+    "render_s": time.perf_counter() - rendered,
+    "files": loaders.load_timings(),
+    "exceptions": [str(e.value) for e in at.exception],
+    "memory": shared_store.process_memory(),
+    "session": shared_store.session_memory(at.session_state.filtered_state)["total"],
+    "payloads": payloads.payload_info(),
+}}))
+"""
+
+
+def _env():
+    # Pages import the repository's modules from the working directory
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+
+
+def import_times(page):
+    """
+    Measures the cumulative import time of each top-level module the page imports.
+
+    Returns:
+        list[tuple]: (module, seconds), slowest first.
+    """
+    with open(page, "r", encoding="utf-8") as f:
+        source = f.read()
+    # Run only the page's top-level imports, without rendering anything
+    nodes = [node for node in ast.parse(source).body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    imports = "\n".join(ast.get_source_segment(source, node) for node in nodes)
+    modules = {node.module if isinstance(node, ast.ImportFrom) else alias.name
+               for node in nodes for alias in node.names}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", imports],
+                            capture_output=True, text=True, env=_env())
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the modules of {page} failed:\n{result.stderr}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only modules imported directly by the page; their dependencies are included in the cumulative time
+        if name.strip() in modules and not name.startswith("  "):
+            times.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(times, key=lambda item: -item[1])
+
+
+def page_times(page):
+    """Renders the page once in a fresh process and returns its timings."""
+    result = subprocess.run([sys.executable, "-c", _RUN_PAGE.format(page=page)],
+                            capture_output=True, text=True, env=_env())
+    if result.returncode != 0:
+        raise RuntimeError(f"Rendering {page} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(pages=PAGES, top=10):
+    for page in pages:
+        timings = page_times(page)
+        print(f"== {page}: first render {timings['render_s']:.2f}s (harness start {timings['harness_s']:.2f}s)")
+        memory = timings["memory"]
+        print(f"  memory: rss {memory['rss'] / 2**20:.1f} MB (private {memory['anon'] / 2**20:.1f} MB, "
+              f"shared {memory['shmem'] / 2**20:.1f} MB), session state {timings['session'] / 1024:.1f} KB")
+        print("  imports (cumulative):")
+        for name, seconds in import_times(page)[:top]:
+            print(f"    {seconds:8.3f}s  {name}")
+        print("  files parsed:")
+        files = sorted(timings["files"].items(), key=lambda item: -item[1])
+        for name, seconds in files[:top]:
+            print(f"    {seconds:8.3f}s  {name}")
+        if len(files) > top:
+            print(f"    ... and {len(files) - top} more ({sum(s for _, s in files[top:]):.3f}s)")
+        payloads = sorted(timings["payloads"].items(), key=lambda item: -item[1]["bytes"])
+        if payloads:
+            sent = sum(stats["bytes"] for _, stats in payloads)
+            original = sum(stats["original_bytes"] for _, stats in payloads)
+            print(f"  payload sent: {sent / 1024:.1f} KB in {len(payloads)} charts and tables "
+                  f"({original / 1024:.1f} KB before compaction)")
+            for name, stats in payloads[:top]:
+                print(f"    {stats['bytes'] / 1024:8.1f} KB  {name} ({stats['kind']})")
+        for exception in timings["exceptions"]:
+            print(f"  exception: {exception}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Break down a cold page render by import and by file.")
+    parser.add_argument("pages", nargs="*", default=PAGES)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    report(args.pages, args.top)
@@ -0,0 +1,178 @@
+"""
+Generates a scaled, synthetic copy of every file in results/.
+
+Outlets and crises are replicated under new names ("BBC #2", "Ukraine #3", ...)
+with their counts randomly perturbed, and the monthly coverage history is
+extended backwards, so the pages and plots.py can be exercised at sizes beyond
+the real data. The original names are kept as the first copy, so the pages'
+hard-coded crises and defaults keep working.
+
+Usage:
+    python synthetic_data.py OUT_DIR [--outlets 10] [--crises 10] [--months 30]
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+ALL_OUTLETS = "All Outlets"
+
+# Files in results/ with their outlet and crisis columns (None if absent)
+CSV_FILES = {
+    "chart1_overall_coverage_bar.csv": (None, "crisis_name"),
+    "chart2_coverage_by_country.csv": (None, "crisis_name"),
+    "chart3_monthly_coverage.csv": (None, "crisis_name"),
+    "chart4_spider_chart.csv": ("matched_outlet", "crisis_name"),
+    "chart5_attention_vs_urgency.csv": (None, "crisis_name"),
+    "chart6_coverage_by_disposition.csv": ("matched_outlet", "crisis_name"),
+    "outlets.csv": ("outlet_name", None),
+    "gaza_vs_crises.csv": (None, "Crisis"),
+    "ukraine_vs_crises.csv": (None, "Crisis"),
+    "pillar2/crisis_keyword_summary.csv": (None, "crisis_name"),
+    "pillar2/crisis_keyword_summary_with_outlets.csv": ("outlet", "crisis_name"),
+}
+RECORD_FILES = [
+    "pillar2/associations_per_article.json",
+    "pillar2/framing_per_article.json",
+    "pillar2/sentiment_per_article.json",
+    "pillar2/victim_causor_per_article.json",
+]
+FRAME_FILES = [
+    "pillar2/humanitarian_frame_results",
+    "pillar2/political_accountability_frame_results",
+    "pillar2/geopolitics_frame_results",
+    "pillar2/historical_legacy_frame_results",
+]
+COPIED_FILES = ["dashboard_results.json"]
+
+
+def copy_name(name, copy):
+    """Name of the `copy`-th replica of an outlet or crisis; copy 0 keeps the original name."""
+    if copy == 0 or name == ALL_OUTLETS:
+        return name
+    return f"{name} #{copy + 1}"
+
+
+def _perturb(df, rng):
+    df = df.copy()
+    for column in df.select_dtypes("number").columns:
+        factor = rng.uniform(0.5, 1.5, len(df))
+        values = df[column].to_numpy() * factor
+        df[column] = np.round(values).astype(df[column].dtype) if df[column].dtype.kind in "iu" else values
+    return df
+
+
+def scale_frame(df, outlet_column, crisis_column, outlets=1, crises=1, rng=None):
+    """Replicates every row for each (outlet copy, crisis copy), perturbing the counts of new copies."""
+    rng = rng or np.random.default_rng(0)
+    frames = []
+    for outlet_copy in range(outlets if outlet_column else 1):
+        for crisis_copy in range(crises if crisis_column else 1):
+            copy = df if outlet_copy == crisis_copy == 0 else _perturb(df, rng)
+            if outlet_column and outlet_copy > 0:
+                # "All Outlets" rows are not replicated per outlet copy
+                copy = copy[copy[outlet_column] != ALL_OUTLETS]
+            if outlet_column:
+                copy = copy.assign(**{outlet_column: copy[outlet_column].map(lambda n: copy_name(n, outlet_copy))})
+            if crisis_column:
+                copy = copy.assign(**{crisis_column: copy[crisis_column].map(lambda n: copy_name(n, crisis_copy))})
+            frames.append(copy)
+    return pd.concat(frames, ignore_index=True)
+
+
+def extend_months(df, months=1, rng=None):
+    """Extends each crisis' monthly coverage `months` times further back in time."""
+    if months <= 1:
+        return df
+    rng = rng or np.random.default_rng(0)
+    frames = []
+    for crisis, group in df.groupby("crisis_name", sort=False):
+        group = group.sort_values("year_month")
+        last = pd.Period(group["year_month"].iloc[-1], freq="M")
+        length = len(group) * months
+        periods = pd.period_range(end=last, periods=length, freq="M")
+        counts = np.tile(group["coverage_count"].to_numpy(), months) * rng.uniform(0.5, 1.5, length)
+        frames.append(pd.DataFrame({
+            "crisis_name": crisis,
+            "year_month": periods.strftime("%Y-%m"),
+            "coverage_count": np.round(counts).astype("int64"),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _scale_nested(data, outlets, crises, per_outlet):
+    # {outlet: {crisis: ...}} or {crisis: ...}; replicas share the original's item counts
+    def scale_crises(by_crisis):
+        return {copy_name(crisis, copy): values for copy in range(crises) for crisis, values in by_crisis.items()}
+
+    if not per_outlet:
+        return scale_crises(data)
+    scaled = {}
+    for copy in range(outlets):
+        for outlet, by_crisis in data.items():
+            scaled.setdefault(copy_name(outlet, copy), scale_crises(by_crisis))
+    return scaled
+
+
+def generate(out_dir, source_dir="results", outlets=1, crises=1, months=1, seed=0):
+    """
+    Writes a scaled copy of every results/ file to `out_dir`.
+
+    Args:
+        out_dir (str): Directory to write to; used as IML_RESULTS_DIR by the benchmarks.
+        source_dir (str): The real results directory the copies are made from.
+        outlets, crises, months (int): Replication factors.
+        seed (int): Seed for the perturbations.
+
+    Returns:
+        dict: Relative file name -> number of rows (or top-level keys) written.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(out_dir, "pillar2"), exist_ok=True)
+    sizes = {}
+
+    for name, (outlet_column, crisis_column) in CSV_FILES.items():
+        # chart6 has always been written with its index as the first column
+        index = name.startswith("chart6_")
+        df = pd.read_csv(os.path.join(source_dir, name), index_col=0 if index else None)
+        df = scale_frame(df, outlet_column, crisis_column, outlets, crises, rng)
+        if name.startswith("chart3_"):
+            df = extend_months(df, months, rng)
+        df.to_csv(os.path.join(out_dir, name), index=index)
+        sizes[name] = len(df)
+
+    for name in RECORD_FILES:
+        df = pd.read_json(os.path.join(source_dir, name))
+        df = scale_frame(df, "outlet", "crisis_name", outlets, crises, rng)
+        df.to_json(os.path.join(out_dir, name), orient="records")
+        sizes[name] = len(df)
+
+    for stem in FRAME_FILES:
+        for suffix, per_outlet in (("_outlets.json", True), (".json", False)):
+            with open(os.path.join(source_dir, stem + suffix), "r") as f:
+                data = _scale_nested(json.load(f), outlets, crises, per_outlet)
+            with open(os.path.join(out_dir, stem + suffix), "w") as f:
+                json.dump(data, f)
+            sizes[stem + suffix] = len(data)
+
+    for name in COPIED_FILES:
+        shutil.copyfile(os.path.join(source_dir, name), os.path.join(out_dir, name))
+
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a scaled, synthetic copy of results/.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--source", default="results")
+    parser.add_argument("--outlets", type=int, default=1, help="Outlet replication factor, e.g. 10 or 100")
+    parser.add_argument("--crises", type=int, default=1, help="Crisis replication factor")
+    parser.add_argument("--months", type=int, default=1, help="Monthly history length factor")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for name, rows in generate(args.out_dir, args.source, args.outlets, args.crises, args.months, args.seed).items():
+        print(f"{name}: {rows}")
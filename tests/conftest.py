@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the top of the repository, next to app.py, and read results/ from there
+sys.path.insert(0, ROOT)
+os.environ.setdefault("IML_RESULTS_DIR", os.path.join(ROOT, "results"))
@@ -0,0 +1,24 @@
+import numpy as np
+
+import loaders
+from confidence import rate_table
+
+DATASETS = {
+    "associations": "pillar2/associations_per_article.json",
+    "framing": "pillar2/framing_per_article.json",
+    "sentiment": "pillar2/sentiment_per_article.json",
+}
+
+
+def test_rate_tables_stay_cached_side_by_side():
+    frames = {dataset: loaders.load_records(name) for dataset, name in DATASETS.items()}
+    first = {dataset: rate_table(df, dataset) for dataset, df in frames.items()}
+    before = loaders.cache_info()
+    second = {dataset: rate_table(df, dataset) for dataset, df in frames.items()}
+    after = loaders.cache_info()
+    assert after["misses"] == before["misses"]
+    assert after["hits"] - before["hits"] >= len(DATASETS)
+    for dataset, table in second.items():
+        assert table is first[dataset]
+        assert len(table) == len(frames[dataset])
+        assert np.all(table["ci_lower"].fillna(0) <= table["ci_upper"].fillna(0))
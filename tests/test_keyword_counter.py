@@ -0,0 +1,49 @@
+import re
+
+import numpy as np
+import pytest
+
+from keyword_counter import TOKEN_RE, KeywordAutomaton
+from keywords import KEYWORDS
+
+VOCABULARY = ["war", "crime", "crimes", "civilian", "civilians", "casualties", "aid", "famine", "the", "of"]
+SEPARATORS = [" ", "  ", ", ", ". ", "-", "\n", "; "]
+# Overlapping, nested and repeated-word keywords, which the failure links have to handle
+KEYWORDS_UNDER_TEST = ["war", "war crime", "war crimes", "crime", "civilian casualties", "casualties",
+                       "aid", "war war", "the war of", "famine aid famine"]
+
+
+def regex_counts(keywords, text):
+    # Whole-word matches, any non-word characters between the words, overlaps counted
+    counts = []
+    for keyword in keywords:
+        words = TOKEN_RE.findall(keyword.lower())
+        pattern = re.compile(r"(?=\b" + r"\W+".join(map(re.escape, words)) + r"\b)")
+        counts.append(len(pattern.findall(text.lower())))
+    return np.array(counts)
+
+
+def random_text(rng, words):
+    tokens = rng.choice(VOCABULARY, size=words)
+    separators = rng.choice(SEPARATORS, size=words)
+    return "".join(f"{token.upper() if rng.random() < 0.1 else token}{sep}" for token, sep in zip(tokens, separators))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_counts_match_regex(seed):
+    rng = np.random.default_rng(seed)
+    automaton = KeywordAutomaton(KEYWORDS_UNDER_TEST)
+    text = random_text(rng, int(rng.integers(0, 300)))
+    np.testing.assert_array_equal(automaton.count(text), regex_counts(KEYWORDS_UNDER_TEST, text))
+
+
+def test_tracked_keywords_match_regex():
+    rng = np.random.default_rng(0)
+    words = [w for keyword in KEYWORDS for w in TOKEN_RE.findall(keyword.lower())] + VOCABULARY
+    text = " ".join(rng.choice(words, size=2000)) + " " + ". ".join(KEYWORDS)
+    np.testing.assert_array_equal(KeywordAutomaton(KEYWORDS).count(text), regex_counts(KEYWORDS, text))
+
+
+def test_whole_words_only():
+    automaton = KeywordAutomaton(["victim", "war crime"])
+    assert automaton.count("victims of war crimes; a Victim, war-crime").tolist() == [1, 1]
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from keywords import ALL_OUTLETS, keyword_matrix
+from loaders import load_keyword_summary
+
+SUMMARY_FILE = "pillar2/crisis_keyword_summary_with_outlets.csv"
+
+
+@pytest.mark.parametrize("subset", [None, 1, 3])
+def test_totals_match_groupby(subset):
+    summary = load_keyword_summary(SUMMARY_FILE)
+    matrix = keyword_matrix(summary)
+    per_outlet = summary[summary["outlet"] != ALL_OUTLETS]
+    outlets = None if subset is None else matrix.outlets[::3][:subset]
+    if outlets is not None:
+        per_outlet = per_outlet[per_outlet["outlet"].isin(outlets)]
+
+    totals, articles = matrix.totals(outlets)
+    expected = (per_outlet.groupby(["crisis_name", "keyword"])["total_count"].sum()
+                .unstack(fill_value=0).reindex(index=matrix.crises, columns=matrix.keywords, fill_value=0))
+    np.testing.assert_array_equal(totals, expected.to_numpy())
+    expected_articles = (per_outlet.drop_duplicates(["outlet", "crisis_name"])
+                         .groupby("crisis_name")["article_count"].sum().reindex(matrix.crises, fill_value=0))
+    np.testing.assert_array_equal(articles, expected_articles.to_numpy())
+    assert totals.dtype == articles.dtype == np.int64
@@ -0,0 +1,41 @@
+import pandas as pd
+
+import loaders
+
+
+def tagged(version, rows):
+    df = pd.DataFrame({"value": range(rows)})
+    df.attrs["version"], df.attrs["rows"] = version, rows
+    return df
+
+
+def derived_keys(name):
+    return sorted(key[2] for key in loaders._cache if key[:2] == ("derived", name))
+
+
+def test_derived_entries_of_other_inputs_are_kept():
+    inputs = [tagged("a.csv@1", 3), tagged("b.csv@1", 3), tagged("a.csv@1[2020-01:2020-03]", 3),
+              tagged("a.csv@1", 3).iloc[[0, 2]], tagged("a.csv@1", 3).iloc[[1, 2]]]
+    for df in inputs + inputs:
+        loaders.derived("test_kept", [df], len)
+    assert len(derived_keys("test_kept")) == len(inputs)
+
+
+def test_older_version_of_the_same_input_is_dropped():
+    loaders.derived("test_dropped", [tagged("a.csv@1", 3), tagged("b.csv@1", 2)], lambda *dfs: len(dfs))
+    loaders.derived("test_dropped", [tagged("a.csv@1[2020-01:2020-03]", 3)], len)
+    loaders.derived("test_dropped", [tagged("a.csv@2", 4), tagged("b.csv@1", 2)], lambda *dfs: len(dfs))
+    assert derived_keys("test_dropped") == sorted([(("a.csv@2", 4), ("b.csv@1", 2)),
+                                                   (("a.csv@1[2020-01:2020-03]", 3),)])
+
+
+def test_coverage_facts_of_both_files_stay_cached():
+    from comparisons import coverage_matrix
+    from dimensions import coverage_facts
+
+    chart4, chart6 = loaders.load_csv("chart4_spider_chart.csv"), loaders.load_csv("chart6_coverage_by_disposition.csv")
+    assert loaders.source_name(chart4) == "chart4_spider_chart.csv"
+    first = coverage_facts(chart4), coverage_facts(chart6), coverage_matrix(chart4)
+    misses = loaders.cache_info()["misses"]
+    assert (coverage_facts(chart4), coverage_facts(chart6), coverage_matrix(chart4)) == first
+    assert loaders.cache_info()["misses"] == misses
@@ -0,0 +1,63 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from similarity import average_linkage, cosine_similarity, cut_tree, leaf_order
+
+
+def random_distances(seed, n):
+    points = np.random.default_rng(seed).normal(size=(n, 3))
+    return np.linalg.norm(points[:, None] - points[None, :], axis=2)
+
+
+def naive_upgma(distances):
+    # Merges the closest pair of clusters, by mean distance between their rows, until one is left
+    clusters = [frozenset([i]) for i in range(len(distances))]
+    merges, partitions = [], [set(clusters)]
+    while len(clusters) > 1:
+        a, b = min(itertools.combinations(clusters, 2),
+                   key=lambda pair: distances[np.ix_(list(pair[0]), list(pair[1]))].mean())
+        merges.append((distances[np.ix_(list(a), list(b))].mean(), len(a) + len(b)))
+        clusters = [c for c in clusters if c not in (a, b)] + [a | b]
+        partitions.append(set(clusters))
+    return merges, partitions
+
+
+def partition(labels):
+    return {frozenset(np.flatnonzero(labels == label)) for label in np.unique(labels)}
+
+
+@pytest.mark.parametrize("seed, n", [(0, 2), (1, 5), (2, 12), (3, 25)])
+def test_merge_heights_match_naive(seed, n):
+    distances = random_distances(seed, n)
+    linkage = average_linkage(distances)
+    merges, _ = naive_upgma(distances)
+    np.testing.assert_allclose(linkage[:, 2], [height for height, _ in merges])
+    np.testing.assert_array_equal(linkage[:, 3], [size for _, size in merges])
+    # Every cluster id is used once, and only after the row that forms it
+    ids = linkage[:, :2].astype(int).ravel()
+    assert sorted(ids) == list(range(2 * n - 2))
+    assert all(linkage[i, :2].max() < n + i for i in range(n - 1))
+
+
+@pytest.mark.parametrize("seed, n", [(4, 8), (5, 20)])
+def test_cut_tree_matches_naive(seed, n):
+    distances = random_distances(seed, n)
+    linkage = average_linkage(distances)
+    _, partitions = naive_upgma(distances)
+    order = leaf_order(linkage)
+    assert sorted(order) == list(range(n))
+    for clusters in range(1, n + 1):
+        labels = cut_tree(linkage, clusters)
+        assert partition(labels) == partitions[n - clusters]
+        # Numbered in the order the clusters appear along the dendrogram
+        seen = labels[order]
+        assert seen[np.r_[True, seen[1:] != seen[:-1]]].tolist() == list(range(1, clusters + 1))
+
+
+def test_cosine_similarity_blocks():
+    vectors = np.random.default_rng(6).random((37, 9))
+    vectors[4] = 0
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-300)
+    np.testing.assert_allclose(cosine_similarity(vectors, block_rows=8), unit @ unit.T, atol=1e-6)
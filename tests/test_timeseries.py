@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from timeseries import lttb
+
+
+def naive_lttb(x, y, threshold):
+    # Direct transcription of the algorithm, one bucket and one candidate at a time
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    kept, previous = [0], 0
+    for bucket in range(threshold - 2):
+        start = int(np.floor(bucket * every)) + 1
+        end = int(np.floor((bucket + 1) * every)) + 1
+        next_end = min(int(np.floor((bucket + 2) * every)) + 1, n)
+        next_x = sum(x[end:next_end]) / (next_end - end)
+        next_y = sum(y[end:next_end]) / (next_end - end)
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((x[previous] - next_x) * (y[i] - y[previous]) - (x[previous] - x[i]) * (next_y - y[previous]))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        previous = best
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (100, 7), (1000, 50), (1001, 500), (37, 36)])
+def test_matches_naive(n, threshold):
+    rng = np.random.default_rng(n + threshold)
+    x = np.cumsum(rng.uniform(0.5, 2.0, size=n))
+    y = rng.normal(size=n)
+    assert lttb(x, y, threshold).tolist() == naive_lttb(x.tolist(), y.tolist(), threshold)
+
+
+@pytest.mark.parametrize("n, threshold", [(50, 3), (500, 17), (5000, 499)])
+def test_endpoints_and_buckets(n, threshold):
+    rng = np.random.default_rng(threshold)
+    x = np.arange(n) * 86400.0 + 1e9
+    y = rng.poisson(5, size=n)
+    kept = lttb(x, y, threshold)
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    # One point from each bucket, in order
+    every = (n - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * every).astype(int) + 1
+    edges[-1] = n - 1
+    inner = kept[1:-1]
+    assert np.all((inner >= edges[:-1]) & (inner < edges[1:]))
+
+
+@pytest.mark.parametrize("threshold", [0, 2, 10, 11])
+def test_short_series_kept_whole(threshold):
+    x = np.arange(10)
+    assert lttb(x, x * 2, threshold).tolist() == list(range(10))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from timewindow import PrefixSums
+
+MONTHS = 24
+
+
+def random_counts(seed, rows=400):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "crisis": rng.integers(0, 5, size=rows),
+        "member": rng.choice(["a", "b", "c", "d", "e", "f"], size=rows),
+        "month": rng.integers(0, MONTHS, size=rows),
+        "count": rng.integers(0, 50, size=rows).astype(np.float64),
+    })
+
+
+def windows():
+    return [(0, MONTHS), (0, 1), (MONTHS - 1, MONTHS), (3, 17), (5, 5), (10, 11)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_exact_sums_match_groupby(seed):
+    counts = random_counts(seed)
+    sums = PrefixSums.from_counts(counts["crisis"].to_numpy(), counts["member"].to_numpy(object),
+                                  counts["month"].to_numpy(), counts["count"].to_numpy(), MONTHS)
+    cells = pd.MultiIndex.from_arrays([sums.crisis_codes, sums.members])
+    for lo, hi in windows():
+        in_window = counts[(counts["month"] >= lo) & (counts["month"] < hi)]
+        expected = in_window.groupby(["crisis", "member"])["count"].sum().reindex(cells, fill_value=0.0)
+        np.testing.assert_allclose(sums.totals(lo, hi), expected.to_numpy())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_shared_sums_split_crisis_totals(seed):
+    counts = random_counts(seed)
+    monthly = np.zeros((5, MONTHS + 1))
+    np.add.at(monthly, (counts["crisis"].to_numpy(), counts["month"].to_numpy() + 1), counts["count"].to_numpy())
+    cumulative = np.cumsum(monthly, axis=1)
+    cells = counts.groupby(["crisis", "member"])["count"].sum()
+    crisis_codes = cells.index.get_level_values(0).to_numpy()
+    sums = PrefixSums.from_shares(crisis_codes, cells.index.get_level_values(1).to_numpy(object),
+                                  cells.to_numpy(), cumulative)
+    crisis_totals = counts.groupby("crisis")["count"].sum()
+    for lo, hi in windows():
+        in_window = counts[(counts["month"] >= lo) & (counts["month"] < hi)]
+        crisis_window = in_window.groupby("crisis")["count"].sum().reindex(crisis_totals.index, fill_value=0.0)
+        share = (cells / crisis_totals.reindex(crisis_codes).to_numpy()).fillna(0.0)
+        expected = share.to_numpy() * crisis_window.reindex(crisis_codes).to_numpy()
+        np.testing.assert_allclose(sums.totals(lo, hi), expected)
+    # The full window gives every cell its own total back
+    np.testing.assert_allclose(sums.totals(0, MONTHS), cells.to_numpy())
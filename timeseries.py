@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from loaders import derived
+
+# Default number of points drawn per crisis; the page lets the reader pick another
+DEFAULT_POINTS = 500
+
+
+def lttb(x, y, threshold):
+    """
+    Downsamples a series with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point and, from each of `threshold - 2` equal-size
+    buckets in between, the point forming the largest triangle with the point kept
+    from the previous bucket and the mean of the next bucket, which preserves the
+    peaks and troughs a line chart would show.
+
+    Args:
+        x (np.ndarray): Increasing x values (numeric).
+        y (np.ndarray): y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Indices of the kept points, increasing.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64) - float(x[0])
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    edges = np.append(np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1, n)
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end, next_end = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+class CoverageSeries:
+    """
+    Coverage over time for every crisis, as one sorted array per column.
+
+    Points of crisis `crises[i]` are `times[offsets[i]:offsets[i + 1]]` (datetime64[ns],
+    increasing) and the matching `counts`, so a time window of one crisis is two
+    binary searches.
+    """
+
+    def __init__(self, crises, offsets, times, counts):
+        self.crises = list(crises)
+        self.offsets = offsets
+        self.times = times
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df, time_column="year_month", value_column="coverage_count"):
+        frame = pd.DataFrame({
+            "crisis_name": df["crisis_name"].to_numpy(),
+            "time": pd.to_datetime(df[time_column].astype(str)),
+            "count": df[value_column].to_numpy(dtype=np.float64),
+        }).sort_values(["crisis_name", "time"], kind="stable")
+        crisis_codes, crises = pd.factorize(frame["crisis_name"], sort=True)
+        offsets = np.searchsorted(crisis_codes, np.arange(len(crises) + 1))
+        return cls(crises, offsets, frame["time"].to_numpy(), frame["count"].to_numpy())
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.times.nbytes + self.counts.nbytes
+
+    @property
+    def extent(self):
+        """Returns the first and last timestamp over all crises."""
+        if not len(self.times):
+            return None, None
+        return pd.Timestamp(self.times.min()), pd.Timestamp(self.times.max())
+
+    def window(self, crisis_index, start=None, end=None):
+        """Returns the (times, counts) of one crisis between `start` and `end` (inclusive)."""
+        lo, hi = self.offsets[crisis_index], self.offsets[crisis_index + 1]
+        times = self.times[lo:hi]
+        first = 0 if start is None else np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side="left")
+        last = len(times) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side="right")
+        return times[first:last], self.counts[lo:hi][first:last]
+
+    def downsample(self, max_points=DEFAULT_POINTS, start=None, end=None):
+        """
+        Returns every crisis' points in a time window, downsampled to at most `max_points` each.
+
+        Returns:
+            dict: crisis_name -> (times, counts).
+        """
+        result = {}
+        for index, crisis in enumerate(self.crises):
+            times, counts = self.window(index, start, end)
+            kept = lttb(times.astype(np.int64), counts, max_points)
+            result[crisis] = (times[kept], counts[kept])
+        return result
+
+
+def coverage_series(df, time_column="year_month", value_column="coverage_count"):
+    """Returns the `CoverageSeries` of a coverage file, built once per version of the file."""
+    return derived(f"coverage_series:{time_column}:{value_column}", [df],
+                   lambda frame: CoverageSeries.from_frame(frame, time_column, value_column))
@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingest import MONTHLY_OUTLET_FILE, normalize_coverage, outlet_listings
+from loaders import derived, load_csv, results_path
+
+MONTHLY_FILE = "chart3_monthly_coverage.csv"
+METADATA_FILE = "chart1_overall_coverage_bar.csv"
+OUTLETS_FILE = "outlets.csv"
+# Counts an outlet once per listing in outlets.csv (see ingest.build_charts)
+LISTED_FILES = {"chart6_coverage_by_disposition.csv"}
+
+# Coverage files that can be re-derived for a date range, with their member column
+# (None for one row per crisis) and count column
+WINDOW_FILES = {
+    "chart1_overall_coverage_bar.csv": (None, "raw_coverage"),
+    "chart2_coverage_by_country.csv": ("country", "raw_coverage"),
+    "chart4_spider_chart.csv": ("matched_outlet", "coverage_count"),
+    "chart6_coverage_by_disposition.csv": ("matched_outlet", "coverage_count"),
+}
+# Column of monthly_outlet_coverage.csv behind each member column
+MONTHLY_MEMBER_COLUMNS = {"country": "country", "matched_outlet": "outlet"}
+
+
+class PrefixSums:
+    """
+    Cumulative monthly coverage of a set of (crisis, member) cells.
+
+    The coverage of cell `i` over months `lo:hi` is
+    `weights[i] * (cumulative[rows[i], hi] - cumulative[rows[i], lo])`: two lookups
+    per cell whatever the length of the window. With exact monthly counts every cell
+    has its own row of `cumulative` and a weight of 1; when only per-crisis monthly
+    totals are known, cells share their crisis' row and are weighted by their share
+    of the crisis' total coverage.
+    """
+
+    def __init__(self, crisis_codes, members, rows, weights, cumulative):
+        self.crisis_codes = crisis_codes
+        self.members = members
+        self.rows = rows
+        self.weights = weights
+        self.cumulative = cumulative
+
+    @classmethod
+    def from_counts(cls, crisis_codes, members, month_codes, counts, months):
+        """Builds exact prefix sums from counts per (crisis code, member, month code)."""
+        cells = pd.MultiIndex.from_arrays([crisis_codes, members])
+        cell_codes, cells = pd.factorize(cells)
+        monthly = np.zeros((len(cells), months + 1))
+        np.add.at(monthly, (cell_codes, month_codes + 1), counts)
+        return cls(cells.get_level_values(0).to_numpy(np.int64), cells.get_level_values(1).to_numpy(object),
+                   np.arange(len(cells)), np.ones(len(cells)), np.cumsum(monthly, axis=1))
+
+    @classmethod
+    def from_shares(cls, crisis_codes, members, counts, crisis_cumulative):
+        """Spreads each cell's total over the months in proportion to its crisis' monthly totals."""
+        totals = crisis_cumulative[crisis_codes, -1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = np.where(totals > 0, counts / totals, 0.0)
+        return cls(crisis_codes, members, crisis_codes, weights, crisis_cumulative)
+
+    @property
+    def nbytes(self):
+        return self.crisis_codes.nbytes + self.rows.nbytes + self.weights.nbytes + self.cumulative.nbytes
+
+    def totals(self, lo, hi):
+        """Returns the coverage of every cell over months `lo:hi`."""
+        return self.weights * (self.cumulative[self.rows, hi] - self.cumulative[self.rows, lo])
+
+
+class CoverageWindows:
+    """
+    Re-derives the overall, per-country and per-outlet coverage files for any range of months.
+
+    `months` are the calendar months ("YYYY-MM") from the first to the last month of
+    the monthly coverage; a window is the month indices `lo:hi`. Built from
+    monthly_outlet_coverage.csv (written by ingest.py) when it exists, which makes
+    every window exact; otherwise from chart3_monthly_coverage.csv, in which case
+    per-outlet and per-country coverage within a window is estimated (`exact` is False).
+    """
+
+    def __init__(self, months, crises, metadata, sums, sources, exact):
+        self.months = months
+        self.crises = crises
+        self.metadata = metadata
+        self.sums = sums
+        self.sources = sources
+        self.exact = exact
+
+    @classmethod
+    def from_frames(cls, metadata, monthly, sources, monthly_outlets=None, outlets=None):
+        """
+        Args:
+            metadata (pd.DataFrame): chart1, for the crisis start dates, funding, people and days.
+            monthly (pd.DataFrame): chart3, coverage per (crisis, month).
+            sources (dict): File name -> the loaded file, for the files in WINDOW_FILES.
+            monthly_outlets (pd.DataFrame): Optional counts per (crisis, outlet, country, month).
+            outlets (pd.DataFrame): outlets.csv, for the listings of each outlet (with `monthly_outlets`).
+        """
+        exact = monthly_outlets is not None
+        counts = monthly_outlets if exact else monthly
+        periods = pd.PeriodIndex(counts["year_month"].astype(str), freq="M")
+        months = pd.period_range(periods.min(), periods.max(), freq="M")
+        month_codes = periods.asi8 - months[0].ordinal
+        crises = pd.Index(sorted(metadata["crisis_name"].unique()))
+        crisis_codes = crises.get_indexer(counts["crisis_name"])
+        known = crisis_codes >= 0
+        values = counts["coverage_count"].to_numpy(np.float64)
+
+        sums = {}
+        if exact:
+            for name, (member_column, _) in WINDOW_FILES.items():
+                members = (counts[MONTHLY_MEMBER_COLUMNS[member_column]].to_numpy(object) if member_column
+                           else np.full(len(counts), None, dtype=object))
+                cell_values = values
+                if name in LISTED_FILES and outlets is not None:
+                    cell_values = values * pd.Series(members).map(outlet_listings(outlets)).fillna(1).to_numpy()
+                sums[name] = PrefixSums.from_counts(crisis_codes[known], members[known], month_codes[known],
+                                                    cell_values[known], len(months))
+        else:
+            monthly_totals = np.zeros((len(crises), len(months) + 1))
+            np.add.at(monthly_totals, (crisis_codes[known], month_codes[known] + 1), values[known])
+            crisis_cumulative = np.cumsum(monthly_totals, axis=1)
+            for name, (member_column, count_column) in WINDOW_FILES.items():
+                df = sources[name]
+                codes = crises.get_indexer(df["crisis_name"])
+                members = df[member_column].to_numpy(object) if member_column else np.full(len(df), None, dtype=object)
+                keep = codes >= 0
+                sums[name] = PrefixSums.from_shares(codes[keep], members[keep],
+                                                    df[count_column].to_numpy(np.float64)[keep], crisis_cumulative)
+
+        metadata = metadata.drop_duplicates("crisis_name").set_index("crisis_name").reindex(crises)
+        starts = pd.to_datetime(metadata["start_date"], format="%m/%d/%Y")
+        metadata = pd.DataFrame({
+            "start_date": metadata["start_date"].to_numpy(),
+            "fund_required": metadata["fund_required"].to_numpy(),
+            "people_affected": metadata["people_affected"].to_numpy(),
+            "crisis_days": metadata["crisis_days"].to_numpy(),
+            "crisis_start": starts.to_numpy(),
+            "crisis_end": (starts + pd.to_timedelta(metadata["crisis_days"], unit="D")).to_numpy(),
+        }, index=crises)
+        # The layout and version of each file, for the frames handed out
+        sources = {name: (list(df.columns), df.attrs.get("version")) for name, df in sources.items()}
+        return cls(months.strftime("%Y-%m").tolist(), crises, metadata, sums, sources, exact)
+
+    @property
+    def nbytes(self):
+        return sum(sums.nbytes for sums in self.sums.values())
+
+    def month_range(self, start, end):
+        """Returns the (lo, hi) month indices of the window from month `start` to month `end` (inclusive)."""
+        return self.months.index(start), self.months.index(end) + 1
+
+    def is_full(self, lo, hi):
+        return lo == 0 and hi == len(self.months)
+
+    def crisis_days(self, lo, hi):
+        """
+        Returns the days of each crisis that fall within the window.
+
+        The window is open-ended at the first and last month of the data, so the full
+        range gives every crisis its full `crisis_days`.
+        """
+        start = self.metadata["crisis_start"]
+        end = self.metadata["crisis_end"]
+        if lo > 0:
+            start = start.clip(lower=pd.Timestamp(self.months[lo]))
+        if hi < len(self.months):
+            end = end.clip(upper=pd.Timestamp(self.months[hi]))
+        return (end - start).dt.days.clip(lower=0)
+
+    def window_frame(self, name, lo, hi):
+        """
+        Returns file `name` (one of WINDOW_FILES) re-derived for months `lo:hi`.
+
+        Every (crisis, member) row of the file is kept, with a count of 0 if it had no
+        coverage in the window. Per-day normalization uses the crisis days within the
+        window; crises with no days in it get NaN.
+        """
+        member_column, count_column = WINDOW_FILES[name]
+        sums = self.sums[name]
+        counts = np.rint(sums.totals(lo, hi)).astype(np.int64)
+        df = pd.DataFrame({"crisis_name": self.crises[sums.crisis_codes], count_column: counts})
+        if member_column:
+            df.insert(1, member_column, sums.members)
+
+        days = self.crisis_days(lo, hi)
+        metadata = self.metadata[["start_date", "fund_required", "people_affected"]].assign(
+            crisis_days=days.where(days > 0)).rename_axis("crisis_name").reset_index()
+        df = normalize_coverage(df, count_column, metadata)
+        df = df.sort_values([c for c in ("crisis_name", member_column) if c], kind="stable").reset_index(drop=True)
+        columns, version = self.sources[name]
+        df = df[[c for c in columns if c in df.columns]]
+        # Lets the figure and derived caches tell windows apart
+        df.attrs["version"] = f"{version}[{self.months[lo]}:{self.months[hi - 1]}]"
+        df.attrs["rows"] = len(df)
+        return df
+
+
+def coverage_windows():
+    """Returns the `CoverageWindows` of the results directory, built once per version of its inputs."""
+    sources = {name: load_csv(name) for name in WINDOW_FILES}
+    inputs = [load_csv(METADATA_FILE), load_csv(MONTHLY_FILE), *sources.values()]
+    if os.path.exists(results_path(MONTHLY_OUTLET_FILE)):
+        inputs += [load_csv(MONTHLY_OUTLET_FILE), load_csv(OUTLETS_FILE)]
+
+    def build(metadata, monthly, *frames):
+        monthly_outlets, outlets = frames[len(sources):] if len(frames) > len(sources) else (None, None)
+        return CoverageWindows.from_frames(metadata, monthly, dict(zip(sources, frames)), monthly_outlets, outlets)
+
+    return derived("coverage_windows", inputs, build)
+
+
+def window_frame(name, lo, hi):
+    """Returns a coverage file for months `lo:hi`, or the file itself for the full range."""
+    windows = coverage_windows()
+    if windows.is_full(lo, hi):
+        return load_csv(name)
+    return windows.window_frame(name, lo, hi)
@@ -0,0 +1,122 @@
+import numpy as np
+
+from loaders import derived
+
+# Quadrants of the attention vs. urgency chart, by code = 2 * high urgency + high attention
+QUADRANTS = [
+    "Low attention, low urgency",
+    "High attention, low urgency",
+    "Low attention, high urgency",
+    "High attention, high urgency",
+]
+
+
+def _frozen(values):
+    array = np.array(values, dtype=np.float64)
+    array.setflags(write=False)
+    return array
+
+
+def _normalize(values):
+    # Scales the last axis so its maximum is 1; an all-zero row stays zero
+    peak = np.max(values, axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peak > 0, values / peak, 0.0)
+
+
+class UrgencyModel:
+    """
+    Media attention against humanitarian urgency for each crisis of chart5.
+
+    Urgency is the weighted mean of the crisis' funding requirement and people
+    affected, each normalized by its maximum over the crises; attention is the
+    crisis' coverage under one of the page normalizations, normalized the same
+    way. A scenario changes the weights and, per crisis, `fund_required` and
+    `people_affected`. The base arrays are read-only and never copied: a scenario
+    is evaluated as a few array operations, and a batch of scenarios (one per row)
+    in the same operations, for sensitivity sweeps.
+    """
+
+    def __init__(self, crises, coverage, crisis_days, fund_required, people_affected):
+        self.crises = list(crises)
+        self.coverage = _frozen(coverage)
+        self.crisis_days = _frozen(crisis_days)
+        self.fund_required = _frozen(fund_required)
+        self.people_affected = _frozen(people_affected)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df["crisis_name"], df["coverage_count"], df["crisis_days"],
+                   df["fund_required"], df["people_affected"])
+
+    @property
+    def nbytes(self):
+        return self.coverage.nbytes + self.crisis_days.nbytes + self.fund_required.nbytes + self.people_affected.nbytes
+
+    def evaluate(self, fund_weight=0.5, people_weight=0.5, fund_required=None, people_affected=None,
+                 normalization="raw", attention_threshold=0.5, urgency_threshold=0.5):
+        """
+        Evaluates one scenario, or a batch of them.
+
+        Args:
+            fund_weight, people_weight (float or np.ndarray): Weights of the two urgency
+                components; arrays of shape (S,) evaluate S scenarios.
+            fund_required, people_affected (array-like): Per-crisis values replacing the
+                data, shape (C,) or (S, C); None keeps the data.
+            normalization (str): Coverage measure on the attention axis (raw, per_day,
+                per_funding or per_people), computed with the scenario's funding and people.
+            attention_threshold, urgency_threshold (float): Quadrant boundaries.
+
+        Returns:
+            dict: "coverage" (the measure), "attention", "fund", "people" and "urgency"
+                (normalized to [0, 1]) and "quadrant" (index into QUADRANTS), each of
+                shape (C,) for one scenario or (S, C) for a batch.
+        """
+        fund = self.fund_required if fund_required is None else np.asarray(fund_required, dtype=np.float64)
+        people = self.people_affected if people_affected is None else np.asarray(people_affected, dtype=np.float64)
+        fund_weight = np.asarray(fund_weight, dtype=np.float64)[..., None]
+        people_weight = np.asarray(people_weight, dtype=np.float64)[..., None]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if normalization == "raw":
+                coverage = self.coverage
+            elif normalization == "per_day":
+                coverage = self.coverage / self.crisis_days
+            elif normalization == "per_funding":
+                coverage = self.coverage / fund
+            elif normalization == "per_people":
+                coverage = self.coverage / people
+            else:
+                raise ValueError(f"Invalid normalization method '{normalization}'")
+            total_weight = fund_weight + people_weight
+            urgency = np.where(total_weight > 0,
+                               (fund_weight * _normalize(fund) + people_weight * _normalize(people)) / total_weight,
+                               0.0)
+
+        attention = _normalize(coverage)
+        # Broadcast every output to the batch shape
+        shape = np.broadcast_shapes(np.shape(attention), np.shape(urgency))
+        quadrant = 2 * (urgency >= urgency_threshold) + (attention >= attention_threshold)
+        return {
+            "coverage": np.broadcast_to(coverage, shape),
+            "attention": np.broadcast_to(attention, shape),
+            "fund": np.broadcast_to(_normalize(fund), shape),
+            "people": np.broadcast_to(_normalize(people), shape),
+            "urgency": np.broadcast_to(urgency, shape),
+            "quadrant": np.broadcast_to(quadrant, shape),
+        }
+
+    def weight_sweep(self, steps=21, **scenario):
+        """
+        Evaluates the scenario for fund weights from 0 to 1 (people weight 1 - fund weight).
+
+        Returns:
+            tuple: (fund weights of shape (steps,), the `evaluate` dict of shape (steps, C)).
+        """
+        fund_weights = np.linspace(0.0, 1.0, steps)
+        return fund_weights, self.evaluate(fund_weights, 1.0 - fund_weights, **scenario)
+
+
+def urgency_model(df):
+    """Returns the `UrgencyModel` of chart5_attention_vs_urgency.csv, built once per version of the file."""
+    return derived("urgency_model", [df], UrgencyModel.from_frame)